@@ -1,7 +1,10 @@
 from json import JSONDecodeError
 import logging
-from typing import Any, Dict, Optional, Union
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Union
 from flask import json
+import jinja2
+from markupsafe import Markup
 
 from app.utilsGame import LevelType, PhaseType, get_git_revision_hash, safe_join
 
@@ -19,6 +22,11 @@ from app.utilsGame import LevelType, PhaseType, get_git_revision_hash, safe_join
 LOGFILE_VERSION = "2.1.1" # Major.Milestone.Subversion
 
 PSEUDONYM_LENGTH = 32
+
+# Remember pseudonyms that are not in the database (e.g. bots or stale browser tabs) for
+# this long, so repeated requests are rejected without a database query
+UNKNOWN_PSEUDONYM_CACHE_SIZE = 4096
+UNKNOWN_PSEUDONYM_CACHE_TIME = 60 # [s]
 LEVEL_ENCODING = 'UTF-8' # was Windows-1252
 TIME_DRIFT_THRESHOLD = 200 # ms
 STALE_LOGFILE_TIME = 48 * 60 * 60 # close logfiles after 48h
@@ -71,6 +79,29 @@ __configStorage : Dict[str, Any] = {
 
 __instance_folder: Optional[str] = None
 
+
+class GlobalTimer(NamedTuple):
+	"""A global timer (`pause` or `timeLimit`) of a group, see `Participant.getGlobalTimerStart()`"""
+	startPhase: str # The timer starts with the first phase of this name
+	duration: int # [ms] or -6 if the duration is too small
+
+
+class CompiledGroup(NamedTuple):
+	"""Immutable, precomputed view on a group config for the request hot path.
+	
+	Built once by `loadGameConfig()`, use `getCompiledGroup()` to access it.
+	"""
+	name: str
+	phases: tuple[str, ...]
+	gamerules: Mapping[str, Any]
+	gamerulesJson: Markup # `htmlsafe_json_dumps(gamerules)` for the /welcome and /game templates
+	timers: Mapping[str, GlobalTimer] # Only the timers that are enabled in the gamerules
+
+__compiledGroups: Dict[str, CompiledGroup] = {}
+
+# Incremented every time the config is loaded, to invalidate caches that depend on it
+__configGeneration = 0
+
 def getDefaultGamerules() -> dict[str, Optional[Union[str, int, bool, dict[str, Any]]]]:
 	return {
 		"enableLogging": True,
@@ -131,7 +162,7 @@ def load_config(fileName: str, instanceFolder: str|None = None) -> dict[str, Any
 
 def loadGameConfig(configName: str = "conf/gameConfig.json", instanceFolder: str = 'instance'):
 	"""Read gameConfig.json into the config variable"""
-	global __configStorage, __instance_folder
+	global __configStorage, __instance_folder, __configGeneration
 	__instance_folder = instanceFolder
 
 	# load the config (groups, gamerules etc.)
@@ -185,6 +216,9 @@ def loadGameConfig(configName: str = "conf/gameConfig.json", instanceFolder: str
 				logging.warning("Missing config entry crashReportLevel, assuming 2!")
 				__configStorage['crashReportLevel'] = 2
 
+		compileGroups()
+		__configGeneration += 1
+
 		# Loading finished successfully, print log
 		logging.info("Config: Loaded " + str(len(__configStorage['groups'])) + " groups and " + str(len(__configStorage['gamerules'])) + " gamerules")
 
@@ -208,6 +242,36 @@ def loadGameConfig(configName: str = "conf/gameConfig.json", instanceFolder: str
 	except Exception as e:
 		raise e
 
+def compileGroups():
+	"""Precompute the phase list, gamerules and timers of all groups after they were validated."""
+	global __compiledGroups
+	compiledGroups: Dict[str, CompiledGroup] = {}
+
+	for name, group in __configStorage['groups'].items():
+		phases = tuple(group['phases'])
+		gamerules: Dict[str, Any] = group['config']
+
+		timers: Dict[str, GlobalTimer] = {}
+		for timerName in [TIMER_NAME_PAUSE, TIMER_NAME_GLOBAL_LIMIT]:
+			if timerName not in gamerules:
+				continue
+
+			settings = gamerules[timerName]
+			startPhase = phases[0] if settings['startEvent'] is None else settings['startEvent']
+			duration = settings['after'] * 1000 if settings['after'] >= 0.1 else -6
+			timers[timerName] = GlobalTimer(startPhase, duration)
+
+		compiledGroups[name] = CompiledGroup(
+			name=name,
+			phases=phases,
+			gamerules=MappingProxyType(gamerules),
+			gamerulesJson=jinja2.utils.htmlsafe_json_dumps(gamerules),
+			timers=MappingProxyType(timers)
+		)
+
+	__compiledGroups = compiledGroups
+
+
 def validatePauseTimer(group: str, gameruleName: str):
 	P_CONF = __configStorage['groups'][group]['config'][TIMER_NAME_PAUSE]
 	assert 'duration' in P_CONF and P_CONF['duration'] >= 0, 'Invalid pause duration in "' + gameruleName + '"'
@@ -268,6 +332,19 @@ def getGroup(group: str) -> Dict[str, Any]:
 		raise GroupNotFound("Could not find the requested group '" + group + "'!")
 	
 
+def getCompiledGroup(group: str) -> CompiledGroup:
+	"""The precomputed config of a group, see `CompiledGroup`"""
+	try:
+		return __compiledGroups[group]
+	except KeyError:
+		raise GroupNotFound("Could not find the requested group '" + group + "'!")
+
+
+def getConfigGeneration() -> int:
+	"""A number that changes every time the config is (re)loaded"""
+	return __configGeneration
+
+
 def getDefaultLang() -> str:
 	"""Get the default language configured for this game. 
 	
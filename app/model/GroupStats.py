@@ -1,13 +1,22 @@
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Any, ClassVar
 
-from sqlalchemy import String
+from sqlalchemy import String, update
 from sqlalchemy.orm import Mapped, mapped_column
 
 from sqlalchemy import select
-import sqlalchemy.sql.functions as func
 
 import app.config as gameConfig
 from app.storage.database import LEN_GROUP, db
 
+# Number of players that are assigned to a group in advance by `getAutomaticGroup()` and
+# the max time [s] this block is used, before the counters of the other workers are read
+AUTOMATIC_GROUP_BLOCK_SIZE = 16
+AUTOMATIC_GROUP_CACHE_TIME = 5
+
 
 class GroupStats(db.Model):
 	name: Mapped[str] = mapped_column(String(LEN_GROUP), primary_key=True)
@@ -17,6 +26,11 @@ class GroupStats(db.Model):
 	playersPostSurvey: Mapped[int] = mapped_column(default=0)
 	playersStartedDebugging: Mapped[int] = mapped_column(default=0)
 
+	# Per process block of reserved groups for `getAutomaticGroup()`
+	_automaticGroups: ClassVar[deque[str]] = deque()
+	_automaticGroupExpires: ClassVar[float] = 0.0
+	_automaticGroupLock: ClassVar[threading.Lock] = threading.Lock()
+
 
 	def __init__(self, name: str, initialCount: int = 0):
 		self.name = name
@@ -31,19 +45,16 @@ class GroupStats(db.Model):
 			GroupStats.createGroup(name, settings['ctr'])
 
 		db.session.commit()
+		GroupStats.invalidateAutomaticGroup()
 
 
 	@staticmethod
 	def increasePlayersStarted(name: str, isDebug: bool) -> int:
 		"""Increase the counter for how many player have started this group."""
-		g = db.session.get_one(GroupStats, name)
-
 		if not isDebug:
-			g.playersStarted += 1
+			return GroupStats._increment(name, GroupStats.playersStarted)
 		else:
-			g.playersStartedDebugging += 1
-
-		return g.playersStarted
+			return GroupStats._increment(name, GroupStats.playersStartedDebugging, GroupStats.playersStarted)
 	
 
 	@staticmethod
@@ -51,9 +62,9 @@ class GroupStats(db.Model):
 		"""Increase the counter for how many players have reached the FinalScene."""
 		if isDebug: return 0
 
-		g = db.session.get_one(GroupStats, name)
-		g.playersFinished += 1
-		return g.playersFinished
+		# The automatic group assignment is based on this counter
+		GroupStats.invalidateAutomaticGroup()
+		return GroupStats._increment(name, GroupStats.playersFinished)
 
 
 	@staticmethod
@@ -61,9 +72,22 @@ class GroupStats(db.Model):
 		"""Increase the counter for how many players clicked the Post Survey Button"""
 		if isDebug: return 0
 		
-		g = db.session.get_one(GroupStats, name)
-		g.playersPostSurvey += 1
-		return g.playersPostSurvey
+		return GroupStats._increment(name, GroupStats.playersPostSurvey)
+
+
+	@staticmethod
+	def _increment(name: str, column: Any, returning: Any = None) -> int:
+		"""Increment a counter with a single `UPDATE ... SET col = col + 1` statement, instead
+		of a read-modify-write through the ORM. 
+		
+		Returns the new value of the counter (or of the `returning` column if specified).
+		"""
+		stmt = (update(GroupStats)
+			.where(GroupStats.name == name)
+			.values({column: column + 1})
+			.returning(column if returning is None else returning)
+		)
+		return db.session.execute(stmt).scalar_one()
 
 
 	@staticmethod
@@ -84,12 +108,47 @@ class GroupStats(db.Model):
 		return False
 
 
+	@classmethod
+	def getAutomaticGroup(cls) -> str:
+		"""Return the group with the lowest player count (`ctr` + finished players)
+
+		The groups are allocated in blocks: Whenever the block of this process runs out, the
+		counters of all groups are read once and the next `AUTOMATIC_GROUP_BLOCK_SIZE` players
+		are distributed in advance, each one to the group with the lowest count including
+		the players already reserved in this block. The block is dropped when the finished
+		counter is increased, or after `AUTOMATIC_GROUP_CACHE_TIME` seconds to pick up the
+		counter changes of the other workers.
+		"""
+		with cls._automaticGroupLock:
+			if len(cls._automaticGroups) < 1 or time.monotonic() >= cls._automaticGroupExpires:
+				cls._automaticGroups = cls.reserveGroups(AUTOMATIC_GROUP_BLOCK_SIZE)
+				cls._automaticGroupExpires = time.monotonic() + AUTOMATIC_GROUP_CACHE_TIME
+
+			return cls._automaticGroups.popleft()
+
+
 	@staticmethod
-	def getAutomaticGroup() -> str:
-		"""Return the group with the lowest player count"""
-		stmtGroupSelect = select(GroupStats.name, func.min(GroupStats.initialCount + GroupStats.playersFinished))
-		group = db.session.execute(stmtGroupSelect).scalar_one()
-		return group
+	def reserveGroups(count: int) -> deque[str]:
+		"""Distribute the next `count` players onto the groups with the lowest player count"""
+		stmtCounts = select(GroupStats.name, GroupStats.initialCount + GroupStats.playersFinished).order_by(GroupStats.name)
+		counts: list[tuple[int, str]] = [(c, name) for name, c in db.session.execute(stmtCounts).tuples()]
+		assert len(counts) > 0, "No group counters found, was GroupStats.createGroupCounters() called?"
+
+		heapq.heapify(counts)
+		groups: deque[str] = deque()
+		for _ in range(count):
+			c, name = heapq.heappop(counts)
+			groups.append(name)
+			heapq.heappush(counts, (c + 1, name))
+
+		return groups
+
+
+	@classmethod
+	def invalidateAutomaticGroup(cls):
+		"""Read the group counters again on the next call to `getAutomaticGroup()`"""
+		with cls._automaticGroupLock:
+			cls._automaticGroups.clear()
 
 
 	@staticmethod
@@ -1,4 +1,5 @@
-from typing import Dict, NamedTuple
+import logging
+from typing import Dict, NamedTuple, Optional
 
 from sqlalchemy import ForeignKey, String
 from sqlalchemy.orm import Mapped, attribute_keyed_dict, mapped_column, relationship
@@ -11,6 +12,7 @@ from app.config import (
 	LEVEL_FILETYPES_WITH_TASK,
 	REMAP_LEVEL_TYPES,
 )
+from app.model.LevelLoader.Circuit import CircuitSolutions, getSolutions
 from app.model.SwitchState import SwitchState
 from app.model.TimerMixin import TimerMixin
 from app.storage.database import LEN_LEVEL_PATH, LEN_LEVEL_TYPE, db
@@ -29,6 +31,7 @@ CachedLevel = NamedTuple("CachedLevel", [
 class Level(db.Model, TimerMixin):
 	"""Model to store the player progress of each level. A level is either a task or an info screen/text"""
 	levelCache: Dict[str, CachedLevel] = {}
+	solutionCache: Dict[str, Optional[CircuitSolutions]] = {} # None if the circuit can not be simulated
 
 	id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 	phaseID: Mapped[int] = mapped_column(ForeignKey("phase.id"))
@@ -144,6 +147,19 @@ class Level(db.Model, TimerMixin):
 		return len(Level.getRandomSwitchIDs(self.fileName)) > 0
 
 
+	def calculateMinSwitchClicks(self) -> int:
+		"""Simulate the circuit to get the minimum number of switch clicks for this player.
+
+		Takes the rolled random switches into account. Returns -1 if the level has no
+		circuit, no solution or can not be simulated.
+		"""
+		if self.type != 'level':
+			return -1
+
+		solutions = Level.getSolutions(self.fileName)
+		return solutions.minSwitchClicks(self.getRandomSwitches()) if solutions is not None else -1
+
+
 	@staticmethod
 	def uniformName(fileName: str) -> str:
 		"""Used in places like the logfile. 
@@ -181,6 +197,23 @@ class Level(db.Model, TimerMixin):
 		return Level.levelCache[fileName].randomSwitches
 	
 
+	@staticmethod
+	def getSolutions(fileName: str) -> Optional[CircuitSolutions]:
+		"""Get the solutions of the level circuit, the level file is only read and solved once.
+
+		The levels are usually solved when the level list is loaded, see `LevelLoader` and
+		`LevelCacheIndex`. Returns `None` if the circuit can not be simulated.
+		"""
+		if fileName not in Level.solutionCache:
+			try:
+				Level.solutionCache[fileName] = getSolutions(safe_join(Level.getBasePath('level'), fileName))
+			except Exception as e:
+				logging.warning(f'Unable to simulate the circuit of "{fileName}": {e}')
+				Level.solutionCache[fileName] = None
+
+		return Level.solutionCache[fileName]
+
+
 	@staticmethod
 	def getBasePath(type: str) -> str:
 		"""Get the base path of a specific level type, or the level list path if no valid type was specified"""
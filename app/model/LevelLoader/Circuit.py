@@ -0,0 +1,212 @@
+import threading
+from collections import OrderedDict
+from typing import Mapping, NamedTuple, Optional
+
+from app.model.LevelLoader.LevelFile import LevelFile, loadLevelFile
+
+
+# Every signal is stored as a bit mask with one bit per switch combination, so the memory
+# grows with 2^n. 20 switches need 128 KiB per element.
+MAX_SWITCHES = 20
+
+# The number of solved circuits that are kept in memory
+MAX_CACHED_CIRCUITS = 1024
+
+
+class CircuitError(ValueError):
+	"""The circuit of a level file can not be evaluated, e.g. because of an unconnected input."""
+
+
+class CircuitSolutions(NamedTuple):
+	"""All switch combinations that solve a level.
+
+	A switch combination is an int, where bit `i` is the state of the switch `switchIDs[i]`.
+	The switches are ordered like in the level file, which is also the order of the game.
+	"""
+	switchIDs: tuple[int, ...]
+	initialStates: int # The switch states from the level file, random switches are open
+	solutions: int # Bit `k` is set if the switch combination `k` solves the level
+
+
+	def numSolutions(self) -> int:
+		return bin(self.solutions).count('1')
+
+
+	def minSwitchClicks(self, initialStates: Optional[Mapping[int, int]] = None) -> int:
+		"""The minimum number of switch clicks to solve the level, -1 if there is no solution.
+
+		This is the Hamming distance from the initial switch states to the closest solution.
+		`initialStates` maps a switch id to its state and overrides the states from the level
+		file, e.g. for the rolled random switches.
+		"""
+		if self.solutions == 0:
+			return -1
+
+		initial = self.initialStates
+		for i, switchID in enumerate(self.switchIDs):
+			if initialStates is not None and switchID in initialStates:
+				initial = initial | (1 << i) if initialStates[switchID] else initial & ~(1 << i)
+
+		# distance[d] is the mask of all combinations that differ from `initial` in d switches
+		allCombinations = _allCombinations(len(self.switchIDs))
+		distance = [allCombinations] + [0]*len(self.switchIDs)
+		for i in range(len(self.switchIDs)):
+			pattern = _switchPattern(i, len(self.switchIDs))
+			differs = pattern if not initial & (1 << i) else allCombinations ^ pattern
+			same = allCombinations ^ differs
+			for d in range(i + 1, 0, -1):
+				distance[d] = (distance[d] & same) | (distance[d - 1] & differs)
+			distance[0] &= same
+
+		return next(d for d, mask in enumerate(distance) if mask & self.solutions)
+
+
+_cache: OrderedDict[str, CircuitSolutions] = OrderedDict()
+_lock = threading.Lock()
+
+
+def getSolutions(path: str) -> CircuitSolutions:
+	"""Solve the circuit of the level file at `path`, see `solveLevel()`."""
+	return solveLevel(loadLevelFile(path))
+
+
+def solveLevel(levelFile: LevelFile) -> CircuitSolutions:
+	"""Find all switch combinations that turn on all light bulbs and turn off all danger signs.
+
+	Every combination is evaluated at once, since every signal is a bit mask over all switch
+	combinations. The result is cached by the content hash of the level file.
+	"""
+	with _lock:
+		solutions = _cache.get(levelFile.contentHash, None)
+		if solutions is not None:
+			_cache.move_to_end(levelFile.contentHash)
+			return solutions
+
+	solutions = _evaluate(levelFile)
+
+	if len(levelFile.contentHash) > 0:
+		with _lock:
+			_cache[levelFile.contentHash] = solutions
+			while len(_cache) > MAX_CACHED_CIRCUITS:
+				_cache.popitem(last=False)
+
+	return solutions
+
+
+def _evaluate(levelFile: LevelFile) -> CircuitSolutions:
+	switches = list(levelFile.elementsOfType('Switch'))
+	if len(switches) > MAX_SWITCHES:
+		raise CircuitError(f'The level has {len(switches)} switches, at most {MAX_SWITCHES} are supported')
+
+	allCombinations = _allCombinations(len(switches))
+	patterns = {s.id: _switchPattern(i, len(switches)) for i, s in enumerate(switches)}
+
+	# Invert the connections, the game ignores duplicate wires
+	inputs: dict[int, list[int]] = {}
+	for source, targets in levelFile.connections.items():
+		for target in targets:
+			if source not in inputs.setdefault(target, []):
+				inputs[target].append(source)
+	for gate, source in levelFile.effectiveConnections.items():
+		if source not in inputs.setdefault(gate, []):
+			inputs[gate].append(source)
+
+	signals: dict[int, int] = {}
+	visiting: set[int] = set()
+
+	def signal(id: int) -> int:
+		if id in signals:
+			return signals[id]
+		if id in visiting:
+			raise CircuitError(f'The circuit contains a loop at element {id}')
+		if id not in levelFile.elements:
+			raise CircuitError(f'Connection to the unknown element {id}')
+
+		visiting.add(id)
+		element = levelFile.elements[id]
+		ins = inputs.get(id, [])
+
+		def single() -> int:
+			if len(ins) < 1:
+				raise CircuitError(f'The input of {element.type} {id} is unconnected')
+			return signal(ins[0])
+
+		if element.type == 'VCC':
+			value = allCombinations
+		elif element.type == 'GND':
+			value = 0
+		elif element.type == 'Switch':
+			value = single() & patterns[id]
+		elif element.type == 'Inverter':
+			value = allCombinations ^ single()
+		elif element.type in ('Splitter', 'LightBulb', 'DangerSign'):
+			value = single()
+		elif element.type == 'AndGate':
+			value = _and([signal(i) for i in ins], allCombinations)
+		elif element.type == 'OrGate':
+			value = _or([signal(i) for i in ins])
+		elif element.type == 'CovertGate':
+			actualGate = element.params[1] if len(element.params) > 1 else ''
+			if actualGate in ('inverter', 'identity'):
+				if id not in levelFile.effectiveConnections:
+					raise CircuitError(f'The {actualGate} CovertGate {id} has no effective connection')
+				value = signal(levelFile.effectiveConnections[id])
+				if actualGate == 'inverter':
+					value = allCombinations ^ value
+			elif actualGate == 'and':
+				value = _and([signal(i) for i in ins], allCombinations)
+			elif actualGate == 'or':
+				value = _or([signal(i) for i in ins])
+			else:
+				raise CircuitError(f'Unknown actual gate "{actualGate}" of CovertGate {id}')
+		else:
+			raise CircuitError(f'{element.type} {id} has no output')
+
+		visiting.discard(id)
+		signals[id] = value
+		return value
+
+	# All bulbs must be on and all danger signs must be off
+	solutions = _and([signal(e.id) for e in levelFile.elementsOfType('LightBulb')], allCombinations)
+	solutions &= allCombinations ^ _or([signal(e.id) for e in levelFile.elementsOfType('DangerSign')])
+
+	initialStates = 0
+	for i, s in enumerate(switches):
+		if s.params[0:1] == ('true',):
+			initialStates |= 1 << i
+
+	return CircuitSolutions(
+		switchIDs=tuple(s.id for s in switches),
+		initialStates=initialStates,
+		solutions=solutions
+	)
+
+
+def _allCombinations(numSwitches: int) -> int:
+	return (1 << (1 << numSwitches)) - 1
+
+
+def _switchPattern(index: int, numSwitches: int) -> int:
+	"""The mask of all switch combinations where the switch `index` is closed."""
+	block = 1 << index
+	pattern = ((1 << block) - 1) << block
+	size = block << 1
+	while size < (1 << numSwitches):
+		pattern |= pattern << size
+		size <<= 1
+
+	return pattern
+
+
+def _and(values: list[int], allCombinations: int) -> int:
+	result = allCombinations
+	for v in values:
+		result &= v
+	return result
+
+
+def _or(values: list[int]) -> int:
+	result = 0
+	for v in values:
+		result |= v
+	return result
@@ -1,35 +1,54 @@
-from copy import deepcopy
+from json import JSONDecodeError
 import logging
+import os
 import random
+import sys
 from types import MappingProxyType
-from typing import Any, NamedTuple, cast
+from typing import Any, Iterable, Mapping, NamedTuple, Optional
 
 from app.model.Level import Level
 from app.model.LevelLoader.LevelLoader import LevelLoader
 from app.model.TutorialStatus import TutorialStatus
-from app.utilsGame import LevelType
-from app.config import load_config
+from app.utilsGame import LevelType, safe_join
+from app.config import ALL_LEVEL_TYPES, LEVEL_FILE_PATHS, REMAP_LEVEL_TYPES, load_config
 
 class LeanSlide(NamedTuple):
 	slideType: LevelType
 	fileName: str
 
 
+# A level group contains one version of a task for every difficulty, see `amount`
+LevelGroup = Mapping[str, LeanSlide]
+
+
+class CompiledLevelList(NamedTuple):
+	"""An immutable level list from `levelList.json`, validated and compiled once on startup.
+
+	`levels` contains only `LeanSlide`s if `amount` is an int or `None` (all levels), and 
+	only `LevelGroup`s if `amount` is a list of group names.
+	"""
+	shuffle: bool
+	amount: Optional[int|tuple[str, ...]]
+	eliminate: bool
+	shuffleAmount: bool
+	levels: tuple[LeanSlide|LevelGroup, ...]
+
+
 class JsonLevelList(LevelLoader):
 	CONFIG_KEY_LEVEL_LIST = 'pools'
-	singleton: dict[str, Any]|None = None
+	singleton: dict[str, CompiledLevelList]|None = None
 
 
 	def __init__(self,
 		phaseName: str,
 		phaseConfig: dict[str, Any],
 		tutorialStatus: dict[str, TutorialStatus],
-		levelList: dict[str, Any]
+		levelList: dict[str, CompiledLevelList]
 	) -> None:
 		super().__init__(phaseName, phaseConfig, tutorialStatus)
 
 		self.levelList = levelList
-		self.pool: dict[str, list[dict[str, Any]|list[dict[str, Any]]]] = {}
+		self.pool: dict[str, list[int]] = {} # Indices into `levels` of the compiled lists
 
 
 	def loadLevels(self) -> list[Level]:
@@ -51,116 +70,189 @@ class JsonLevelList(LevelLoader):
 		levels: list[Level] = []
 
 		for list_name in self._getLevelLists():
-			current_list = MappingProxyType(self.levelList[list_name])
-
-			for entry in current_list['levels']:
-				# If this is a list, add all levels that are contained in that list
-				if isinstance(entry, list):
-					for subEntry in cast(list[dict[str, str]], entry):
-						levels.append(Level(type=subEntry['type'], fileName=subEntry['name']))
-				# Else add the single level
-				else:
-					levels.append(Level(type=entry['type'], fileName=entry['name']))
+			for entry in self.levelList[list_name].levels:
+				# If this is a level group, add all levels that are contained in that group
+				slides = entry.values() if not isinstance(entry, LeanSlide) else [entry]
+				for slide in slides:
+					levels.append(Level(type=slide.slideType, fileName=slide.fileName))
 
 		return levels
 
 
 	def parse_list(self, list_name: str):
-		# read only, since this is loaded from a JSON and we wan't no side effects.
-		# But be careful, this is not a frozendict, children can still be modified
-		current_list = MappingProxyType(self.levelList[list_name])
-
-		# Load settings from current_list
-		amount: int|str|list[str] = current_list.get('amount', 'all')
-		shuffle: bool = current_list.get('shuffle', False)
-		eliminate: bool = current_list.get('eliminate', True)
-		shuffle_amount: bool = current_list.get('shuffle_amount', True)
-
-		# We are working on a copy of the current_list to allow for elimination of levels.
-		# We call this copy pool and we only store the actual level list
+		current_list = self.levelList[list_name]
+
+		# The pool contains the indices of the levels, that can still be drawn from this list.
+		# Shuffling the indices draws the same levels as shuffling the levels would.
 		if list_name not in self.pool:
-			self.pool[list_name] = deepcopy(current_list['levels'])
-		
+			self.pool[list_name] = list(range(len(current_list.levels)))
+
 		# Shuffle the pool if enabled
-		if shuffle:
+		if current_list.shuffle:
 			random.shuffle(self.pool[list_name])
 
-		# Set amount to length of pool if we wan't to load all levels (default)
-		if amount == 'all':
+		# Load all levels that remain in the pool (default)
+		amount = current_list.amount
+		if amount is None:
 			amount = len(self.pool[list_name])
 
 		if isinstance(amount, int):
-			self.load_entries(self.pool[list_name], list_name, amount, eliminate)
+			self.load_entries(current_list, self.pool[list_name], list_name, amount)
 
 		# Special case for when we need multiple versions/difficulties of the same task
 		# and the task group shall only be shown once
-		elif isinstance(amount, list):
-			assert eliminate, "This configuration only makes sense with eliminate enabled"
-			self.load_entries_multiversion(self.pool[list_name], list_name, amount, shuffle_amount)
-
 		else:
-			raise ValueError('An invalid value for amount has made it through the pre checks')
+			self.load_entries_multiversion(current_list, self.pool[list_name], list_name, amount)
 
 
 	def load_entries(self,
-			current_pool: list[dict[str, Any] | list[dict[str, Any]]],
+			current_list: CompiledLevelList,
+			current_pool: list[int],
 			list_name: str,
-			amount: int,
-			eliminate: bool
+			amount: int
 		):
 		# Check that the validator has caught all invalid edge cases
 		assert amount > 0, f'Amount of pool "{list_name}" must be > 0, got {amount}'
 		assert amount <= len(current_pool), f'Requested {amount} levels from pool "{list_name}" but the pool only contains {len(current_pool)} levels'
 
-		for i in range(0, amount):
-			entry = current_pool[0 if eliminate else i]
-			assert not isinstance(entry, list), "Level Groups are not allowed when the amount is an integer or 'all'!"
-			self._appendLevel(slideType=entry['type'], fileName=entry['name'])
+		for i in current_pool[0:amount]:
+			entry = current_list.levels[i]
+			assert isinstance(entry, LeanSlide), "Level Groups are not allowed when the amount is an integer or 'all'!"
+			self._appendLevel(slideType=entry.slideType, fileName=entry.fileName)
 			
-			# Remove entry from pool if it shall only be shown once
-			if eliminate:
-				current_pool.remove(entry)
+		# Remove the entries from the pool if they shall only be shown once
+		if current_list.eliminate:
+			del current_pool[0:amount]
 
 
 	def load_entries_multiversion(self,
-		current_pool: list[dict[str, Any] | list[dict[str, Any]]],
+		current_list: CompiledLevelList,
+		current_pool: list[int],
 		list_name: str,
-		amount: list[str],
-		shuffle_amount: bool
+		amount: tuple[str, ...]
 	):
-		group_order = amount.copy()
-		assert all(len(level_group) == len(group_order) for level_group in current_pool), f"Something in {list_name} slipped through the validator"
+		group_order = list(amount)
+		assert len(group_order) <= len(current_pool), f'Requested {len(group_order)} level groups from pool "{list_name}" but the pool only contains {len(current_pool)}'
 
 		# Shuffle the level group order if enabled
-		if shuffle_amount:
+		if current_list.shuffleAmount:
 			random.shuffle(group_order)
 
 		# Draw exactly one level of each group in the specified order (might be randomized)
-		for group_name in group_order:
-			level_group = current_pool.pop(0)
-			assert isinstance(level_group, list), "Please specify a list that contains one level of each group"
-			entry = [level for level in level_group if level['group'] == group_name]
-			assert len(entry) == 1, "There should be exactly one entry matching this group in the level_group"
-			self._appendLevel(slideType=entry[0]['type'], fileName=entry[0]['name'])
+		for i, group_name in zip(current_pool, group_order):
+			level_group = current_list.levels[i]
+			assert not isinstance(level_group, LeanSlide), "Please specify a list that contains one level of each group"
+			entry = level_group[group_name]
+			self._appendLevel(slideType=entry.slideType, fileName=entry.fileName)
+
+		del current_pool[0:len(group_order)]
 
 
 	@staticmethod
 	def fromFile(
 		fileName: str = 'conf/levelList.json',
 		instanceFolder: str = 'instance'
-	) -> dict[str, Any]:
-		"""Load all level lists from `conf/levelList.json` into a `dict`"""
-
+	) -> dict[str, CompiledLevelList]:
+		"""Load, validate and compile all level lists from `conf/levelList.json`.
+		
+		A missing file is not an error, since the level lists might be in the old txt 
+		format. Errors inside of the file stop the server directly on launch and not 
+		later when someone tries to load the first level.
+		"""
 		try:
 			conf = load_config(fileName=fileName, instanceFolder=instanceFolder)
+			assert isinstance(conf, dict), "Expected an object containing all level lists"
 
-			# TODO Run checks to catch any errors directly on launch and not later when
-			# someone tries to load the first level
+			slides: dict[LeanSlide, LeanSlide] = {}
+			levelLists = {name: JsonLevelList.compileList(name, levelList, slides) for name, levelList in conf.items()}
+			JsonLevelList.checkFiles(slides)
 
-			logging.info(f'Successfully loaded {len(conf)} level lists.')
-			return conf
-			
-		except Exception as e:
+			logging.info(f'Successfully loaded {len(levelLists)} level lists with {len(slides)} distinct slides.')
+			return levelLists
+
+		except OSError as e:
 			logging.info(f'No level lists loaded from "{fileName}".')
 			logging.debug(e)
 			return {}
+
+		except JSONDecodeError as e:
+			logging.exception(f'Syntax error in "{fileName}": {e}')
+			raise SystemExit
+
+		except AssertionError as e:
+			logging.exception(f'Level list: {e}')
+			raise SystemExit
+
+
+	@staticmethod
+	def compileList(name: str, levelList: Any, slides: dict[LeanSlide, LeanSlide]) -> CompiledLevelList:
+		"""Validate a level list and convert it into a `CompiledLevelList`.
+
+		Equal slides are only stored once in `slides` and shared by all lists.
+		"""
+		assert isinstance(levelList, dict), f'"{name}": Expected an object'
+		shuffle = levelList.get('shuffle', False)
+		amount = levelList.get('amount', 'all')
+		eliminate = levelList.get('eliminate', True)
+		shuffleAmount = levelList.get('shuffle_amount', True)
+		entries = levelList.get('levels', None)
+
+		for key, value in {'shuffle': shuffle, 'eliminate': eliminate, 'shuffle_amount': shuffleAmount}.items():
+			assert isinstance(value, bool), f'"{name}": "{key}" must be true or false'
+		assert isinstance(entries, list) and len(entries) > 0, f'"{name}": "levels" must be a non empty array'
+
+		def compileSlide(entry: Any) -> LeanSlide:
+			assert isinstance(entry, dict) and isinstance(entry.get('name'), str) and isinstance(entry.get('type'), str), \
+				f'"{name}": Every level needs a "name" and a "type", got {entry}'
+			slideType = REMAP_LEVEL_TYPES.get(entry['type'], entry['type'])
+			assert slideType in ALL_LEVEL_TYPES, f'"{name}": Unknown level type "{entry["type"]}"'
+
+			slide = LeanSlide(LevelType(slideType), sys.intern(entry['name']))
+			return slides.setdefault(slide, slide)
+
+		# A list of group names: Every entry is a level group with one level of each group
+		if isinstance(amount, list):
+			assert eliminate, f'"{name}": An array as "amount" only makes sense with "eliminate" enabled'
+			assert len(amount) > 0 and all(isinstance(g, str) for g in amount) and len(set(amount)) == len(amount), \
+				f'"{name}": "amount" must be "all", a number or an array of distinct group names'
+
+			levels: list[LeanSlide|LevelGroup] = []
+			for entry in entries:
+				assert isinstance(entry, list) and len(entry) == len(amount), \
+					f'"{name}": Every entry must be an array with one level of each group {amount}'
+				assert all(isinstance(e, dict) and isinstance(e.get('group'), str) for e in entry) \
+					and sorted(e['group'] for e in entry) == sorted(amount), \
+					f'"{name}": Every entry must contain exactly one level of each group {amount}'
+				levels.append(MappingProxyType({e['group']: compileSlide(e) for e in entry}))
+
+			return CompiledLevelList(shuffle, tuple(amount), eliminate, shuffleAmount, tuple(levels))
+
+		# 'all' or a number of levels
+		assert amount == 'all' or (isinstance(amount, int) and not isinstance(amount, bool)), \
+			f'"{name}": "amount" must be "all", a number or an array of group names'
+		assert amount == 'all' or 0 < amount <= len(entries), \
+			f'"{name}": "amount" must be between 1 and the number of levels ({len(entries)}), got {amount}'
+		assert not any(isinstance(e, list) for e in entries), \
+			f'"{name}": Level groups are only allowed if "amount" is an array of group names'
+
+		return CompiledLevelList(
+			shuffle, None if amount == 'all' else amount, eliminate, shuffleAmount, 
+			tuple(compileSlide(e) for e in entries)
+		)
+
+
+	@staticmethod
+	def checkFiles(slides: Iterable[LeanSlide]):
+		"""Warn about slides whose file does not exist.
+		
+		This is not an error, e.g. the statistics might run without the assets.
+		"""
+		for slide in slides:
+			if slide.slideType not in LEVEL_FILE_PATHS:
+				continue
+
+			try:
+				if not os.path.isfile(safe_join(Level.getBasePath(slide.slideType), slide.fileName)):
+					logging.warning(f'The {slide.slideType} "{slide.fileName}" from the level lists does not exist.')
+			except FileNotFoundError:
+				logging.warning(f'The {slide.slideType} "{slide.fileName}" from the level lists is outside of the asset folder.')
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple
+
+from app.config import LEVEL_ENCODING
+
+
+LEVEL_SEPARATOR = '§'
+
+# Increment when the parser changes, so that results stored on disk are discarded
+PARSER_VERSION = 2
+
+# The number of parsed level files that are kept in memory
+MAX_CACHED_LEVEL_FILES = 1024
+
+
+class Element(NamedTuple):
+	"""An `element§{id}§{type}§{rotation}§{xpos}§{ypos}§{params...}` line of a level file."""
+	id: int
+	type: str
+	rotation: int
+	x: int
+	y: int
+	params: tuple[str, ...] # Type specific, e.g. the switch state or the visual/actual covert gate
+
+
+class LevelFile(NamedTuple):
+	"""The circuit described by a level file, see `doc/Level.md`.
+
+	All collections are read-only, the same instance is shared by all callers.
+	"""
+	contentHash: str # SHA-256 of the file content
+	time: float # Time limit in seconds, 0 if disabled
+	elements: Mapping[int, Element]
+	connections: Mapping[int, tuple[int, ...]] # Element id -> ids of the elements connected to its output
+	effectiveConnections: Mapping[int, int] # Covert gate id -> id of its effective input
+	gateCovert: bool
+	gateCamouflage: bool
+	randomSwitches: tuple[int, ...] # Ids of the switches with a random initial state
+
+
+	def elementsOfType(self, type: str) -> Iterable[Element]:
+		return (e for e in self.elements.values() if e.type == type)
+
+
+_cache: OrderedDict[str, LevelFile] = OrderedDict()
+_lock = threading.Lock()
+
+
+def loadLevelFile(path: str) -> LevelFile:
+	"""Read and parse the level file at `path`.
+
+	The file is read on every call, but files with the same content are only parsed once.
+	Does not depend on the gameConfig, so it can be used in a worker process or a script.
+	"""
+	with open(path, 'rb') as f:
+		content = f.read()
+
+	contentHash = hashlib.sha256(content).hexdigest()
+	with _lock:
+		levelFile = _cache.get(contentHash, None)
+		if levelFile is not None:
+			_cache.move_to_end(contentHash)
+			return levelFile
+
+	try:
+		levelFile = parseLevel(content.decode(LEVEL_ENCODING).splitlines(), contentHash)
+	except ValueError as e:
+		raise ValueError(f'Invalid level file "{path}": {e}') from e
+
+	with _lock:
+		_cache[contentHash] = levelFile
+		while len(_cache) > MAX_CACHED_LEVEL_FILES:
+			_cache.popitem(last=False)
+
+	return levelFile
+
+
+def parseLevel(lines: Iterable[str], contentHash: str = '') -> LevelFile:
+	"""Parse the lines of a level file in a single pass.
+
+	Follows the parser of the game (`LogicElementManager.js`): Empty lines are ignored and the
+	outputs of multiple `connection` lines with the same source are merged. Unknown line types
+	are logged and skipped, a malformed line of a known type raises a `ValueError`.
+	"""
+	time = 0.0
+	elements: dict[int, Element] = {}
+	connections: dict[int, list[int]] = {}
+	effectiveConnections: dict[int, int] = {}
+	covert = False
+	camouflage = False
+	randomSwitches: list[int] = []
+
+	for lineNumber, line in enumerate(lines, start=1):
+		item = line.rstrip('\r\n').split(LEVEL_SEPARATOR)
+
+		try:
+			if item[0] == 'element':
+				element = Element(
+					id=int(item[1]), type=item[2], rotation=_parseInt(item[3]),
+					x=_parseInt(item[4]), y=_parseInt(item[5]), params=tuple(item[6:])
+				)
+				elements[element.id] = element
+
+				if element.type == 'CovertGate':
+					if element.params[0:1] == ('camouflaged',):
+						camouflage = True
+					else:
+						covert = True
+
+				elif element.type == 'Switch' and element.params[0:1] == ('random',):
+					randomSwitches.append(element.id)
+
+			elif item[0] == 'connection':
+				connections.setdefault(int(item[1]), []).extend(map(int, item[2:]))
+
+			elif item[0] == 'effectiveCovertGateConnection':
+				effectiveConnections[int(item[2])] = int(item[1])
+
+			elif item[0] == 'time':
+				time = max(0.0, float(item[1]))
+
+			elif item[0] != '':
+				logging.warning(f'Skipping unknown level file entry "{item[0]}" in line {lineNumber}')
+
+		except (ValueError, IndexError) as e:
+			raise ValueError(f'line {lineNumber}: {e}') from e
+
+	return LevelFile(
+		contentHash=contentHash,
+		time=time,
+		elements=MappingProxyType(elements),
+		connections=MappingProxyType({k: tuple(v) for k, v in connections.items()}),
+		effectiveConnections=MappingProxyType(effectiveConnections),
+		gateCovert=covert,
+		gateCamouflage=camouflage,
+		randomSwitches=tuple(randomSwitches)
+	)
+
+
+def _parseInt(value: str) -> int:
+	"""Like `parseInt()` in the game, which also accepts coordinates with decimals."""
+	return int(float(value))
@@ -1,10 +1,10 @@
 from abc import ABC, abstractmethod
 import logging
-import re
 from types import MappingProxyType
 from typing import Any
 
 from app.model.Level import KEY_CAMOUFLAGE, KEY_COVERT, CachedLevel, Level
+from app.model.LevelLoader.LevelFile import loadLevelFile
 from app.model.TutorialStatus import TutorialStatus
 from app.utilsGame import LevelType, PhaseType, safe_join
 
@@ -64,7 +64,7 @@ class LevelLoader(ABC):
 		thinkaloud = self._phaseConfig.get('thinkaloud', 'no') # "concurrent" | "retrospective" | "no"
 		insertTutorials = self._phaseConfig.get('insertTutorials', True)
 
-		# If level info is not found in cache, read the level file
+		# If level info is not found in cache, read the level file and solve the circuit
 		if slideType == LevelType.LEVEL and fileName not in Level.levelCache:
 			try: 
 				Level.levelCache[fileName] = self.generateCacheEntry(slideType, fileName)
@@ -72,6 +72,8 @@ class LevelLoader(ABC):
 			except Exception as e:
 				logging.error("Exception while generating level cache: " + str(e))
 
+			Level.getSolutions(fileName)
+
 		# Pre Insert Hook
 		self._preLevelInsert(
 			phaseName=self._phaseName,
@@ -144,16 +146,18 @@ class LevelLoader(ABC):
 	@staticmethod
 	def generateCacheEntry(type: str, name: str):
 		"""Read in the entire level file once to gather needed information about the level"""
-		covert = False
-		camouflage = False
-
-		# Look at the level to determine if a covert / camouflage gate is present
-		with open(safe_join(Level.getBasePath(type), name), 'r', encoding='UTF-8') as f:
-			txt = f.read()
-		covert = re.search("^element§[0-9]*§CovertGate§[0-9]§[0-9]*§[0-9]*§(?!camouflaged)", txt, re.MULTILINE) is not None
-		camouflage = re.search("^element§[0-9]*§CovertGate§[0-9]§[0-9]*§[0-9]*§(camouflaged)", txt, re.MULTILINE) is not None
-		
-		randomSwitches = re.findall("^element§([0-9]*)§Switch§[0-9]§[0-9]*§[0-9]*§random", txt, re.MULTILINE)
-		randomSwitches = list(map(int, randomSwitches))
+		return LevelLoader.parseLevelFile(safe_join(Level.getBasePath(type), name))
 
-		return CachedLevel(gateCamouflage = camouflage, gateCovert=covert, randomSwitches=randomSwitches)
+
+	@staticmethod
+	def parseLevelFile(path: str) -> CachedLevel:
+		"""Gather the cached information from the level file at `path`.
+		
+		Does not depend on the config, so it can be used in a worker process.
+		"""
+		levelFile = loadLevelFile(path)
+		return CachedLevel(
+			gateCamouflage=levelFile.gateCamouflage,
+			gateCovert=levelFile.gateCovert,
+			randomSwitches=list(levelFile.randomSwitches)
+		)
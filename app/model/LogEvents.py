@@ -1,9 +1,12 @@
+from collections import OrderedDict
 from datetime import datetime, timezone
 import logging
+import threading
 from typing import Annotated, Any, ClassVar, Optional
 
-from sqlalchemy import JSON, DateTime, Enum, ForeignKey, SmallInteger, String, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import JSON, DateTime, Enum, ForeignKey, SmallInteger, String, Text, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 
 from app.config import ALL_LEVEL_TYPES, PSEUDONYM_LENGTH
 from app.model.Level import Level
@@ -16,6 +19,7 @@ from app.storage.database import (
 	LEN_VERSION,
 	db,
 )
+from app.storage.eventBuffer import EventBuffer
 from app.utilsGame import ClickableObjects, EventType, LevelType, PhaseType
 
 LEN_EVENT_TYPE = 32
@@ -37,7 +41,10 @@ class PlayerContext(db.Model):
 	def createPlayer(pseudonym: str, loggingEnabled: bool):
 		p = PlayerContext(pseudonym, loggingEnabled)
 		db.session.add(p)
-		db.session.commit()
+		db.session.flush()
+
+		# Only cache the player once the transaction was committed, see `ContextCache.afterCommit()`
+		db.session.info.setdefault(SESSION_KEY_NEW_PLAYERS, {})[pseudonym] = loggingEnabled
 
 
 class PhaseContext(db.Model):
@@ -64,6 +71,122 @@ class LevelContext(db.Model):
 		self.levelName = levelName
 
 
+class ContextCache:
+	"""Process wide cache of the player, phase and level context rows that are known to
+	exist in the database.
+
+	The context tables are tiny and rows are never deleted, therefore the events can set
+	their foreign keys directly instead of loading the context rows. A missing phase/level
+	context is created with an upsert inside of the current transaction. The new key is only
+	added to the cache after the transaction was committed.
+
+	The events of a transaction are also only handed over to the `EventBuffer` after the
+	commit, so that a rolled back request does not write its events and the buffer never
+	writes events before their context rows.
+	"""
+	MAX_PLAYERS = 10000 # Least recently used players are evicted from the cache
+
+	players: 'OrderedDict[str, bool]' = OrderedDict() # pseudonym -> loggingEnabled
+	phases: set[str] = set()
+	levels: set[str] = set()
+	_lock = threading.Lock()
+
+
+	@classmethod
+	def addPlayer(cls, pseudonym: str, loggingEnabled: bool):
+		with cls._lock:
+			cls.players[pseudonym] = loggingEnabled
+			cls.players.move_to_end(pseudonym)
+			if len(cls.players) > cls.MAX_PLAYERS:
+				cls.players.popitem(last=False)
+
+
+	@classmethod
+	def isLoggingEnabled(cls, pseudonym: str) -> bool:
+		"""Get the logging setting of the player. Raises `NoResultFound` for unknown players."""
+		# The player was created in the current transaction and is not cached yet
+		newPlayers: dict[str, bool] = db.session.info.get(SESSION_KEY_NEW_PLAYERS, {})
+		if pseudonym in newPlayers:
+			return newPlayers[pseudonym]
+
+		with cls._lock:
+			loggingEnabled = cls.players.get(pseudonym, None)
+			if loggingEnabled is not None:
+				cls.players.move_to_end(pseudonym)
+				return loggingEnabled
+
+		stmt = select(PlayerContext.loggingEnabled).where(PlayerContext.pseudonym == pseudonym)
+		loggingEnabled = db.session.execute(stmt).scalar_one()
+		cls.addPlayer(pseudonym, loggingEnabled)
+		return loggingEnabled
+
+
+	@classmethod
+	def ensurePhase(cls, phaseName: str):
+		"""Create the phase context in the current transaction, if it is not known yet."""
+		newContexts: set[tuple[str, str]] = db.session.info.setdefault(SESSION_KEY_NEW_CONTEXTS, set())
+		if phaseName in cls.phases or (CONTEXT_PHASE, phaseName) in newContexts:
+			return
+
+		assert phaseName in PhaseType, f'Unknown Phase "{phaseName}"!'
+		stmt = sqlite_insert(PhaseContext).values(activePhase=phaseName).on_conflict_do_nothing()
+		if db.session.execute(stmt).rowcount > 0:
+			logging.info(f'Created phase "{phaseName}".')
+
+		newContexts.add((CONTEXT_PHASE, phaseName))
+
+
+	@classmethod
+	def ensureLevel(cls, levelType: LevelType, levelName: str):
+		"""Create the level context in the current transaction, if it is not known yet."""
+		newContexts: set[tuple[str, str]] = db.session.info.setdefault(SESSION_KEY_NEW_CONTEXTS, set())
+		if levelName in cls.levels or (CONTEXT_LEVEL, levelName) in newContexts:
+			return
+
+		assert levelType in LevelType, f'Unknown level type "{levelType}"!'
+		assert len(levelName) > 0, "An empty string is not a valid level name!"
+		stmt = sqlite_insert(LevelContext).values(levelType=levelType, levelName=levelName).on_conflict_do_nothing()
+		if db.session.execute(stmt).rowcount > 0:
+			logging.info(f'Created level "{levelName}" ({levelType}).')
+
+		newContexts.add((CONTEXT_LEVEL, levelName))
+
+
+	@staticmethod
+	def afterCommit(session: Session):
+		caches = {CONTEXT_PHASE: ContextCache.phases, CONTEXT_LEVEL: ContextCache.levels}
+		for kind, key in session.info.pop(SESSION_KEY_NEW_CONTEXTS, set()):
+			caches[kind].add(key)
+
+		for pseudonym, loggingEnabled in session.info.pop(SESSION_KEY_NEW_PLAYERS, {}).items():
+			ContextCache.addPlayer(pseudonym, loggingEnabled)
+
+		# The contexts of the events are committed now, let the buffer write the events
+		events: list[LogEvent] = session.info.pop(SESSION_KEY_PENDING_EVENTS, [])
+		if len(events) > 0:
+			EventBuffer.putAll(events)
+
+
+	@staticmethod
+	def afterRollback(session: Session):
+		session.info.pop(SESSION_KEY_NEW_CONTEXTS, None)
+		session.info.pop(SESSION_KEY_NEW_PLAYERS, None)
+		session.info.pop(SESSION_KEY_PENDING_EVENTS, None)
+
+
+# Key inside of `Session.info` for the contexts created in the current transaction, a set
+# of (CONTEXT_PHASE | CONTEXT_LEVEL, name)
+SESSION_KEY_NEW_CONTEXTS = 'reversimNewContexts'
+CONTEXT_PHASE = 'phase'
+CONTEXT_LEVEL = 'level'
+# Keys inside of `Session.info` for the players (pseudonym -> loggingEnabled) and the events
+# for the `EventBuffer` of the current transaction
+SESSION_KEY_NEW_PLAYERS = 'reversimNewPlayers'
+SESSION_KEY_PENDING_EVENTS = 'reversimPendingEvents'
+event.listen(Session, "after_commit", ContextCache.afterCommit)
+event.listen(Session, "after_rollback", ContextCache.afterRollback)
+
+
 class LevelState(db.Model):
 	__tablename__ = "level_state"
 	id: Mapped[primary_key] = mapped_column(primary_key=True, autoincrement=True)
@@ -140,13 +263,21 @@ class LogEvent(db.Model):
 
 	def setPlayerContext(self, pseudonym: str):
 		assert len(pseudonym) == PSEUDONYM_LENGTH, f"Expected a different pseudonym length, got {len(pseudonym)}"
-		self.player = db.session.get_one(PlayerContext, pseudonym)
+		self.loggingEnabled = ContextCache.isLoggingEnabled(pseudonym)
+		self.pseudonym = pseudonym
 
 
 	def commit(self) -> bool:
-		if not self.player.loggingEnabled:
+		if not self.loggingEnabled:
 			return False
 
+		# Hand the event over to the write-behind buffer once the request transaction was
+		# committed, if enabled in the config, see `ContextCache.afterCommit()`
+		if EventBuffer.enabled:
+			EventBuffer.detach(self)
+			db.session.info.setdefault(SESSION_KEY_PENDING_EVENTS, []).append(self)
+			return True
+
 		db.session.add(self)
 		#db.session.commit()
 		return True
@@ -179,13 +310,8 @@ class LogEventPhase(LogEvent):
 
 
 	def setPhaseContext(self, phaseName: str):
-		self.phase = db.session.get(PhaseContext, phaseName)
-
-		if self.phase is None:
-			logging.info(f'Created phase "{phaseName}".')
-			self.phase = PhaseContext(phaseName)
-			db.session.add(self.phase)
-			db.session.commit()
+		ContextCache.ensurePhase(phaseName)
+		self.phase_id = phaseName # type: ignore
 
 
 class LogEventLevel(LogEventPhase):
@@ -217,16 +343,9 @@ class LogEventLevel(LogEventPhase):
 
 
 	def setLevelContext(self, levelType: LevelType, levelName: str):
-		self.level = db.session.get(LevelContext, {
-			#"levelType": levelType, # TODO If there is an info screen and a level with the same name, things go wrong
-			"levelName": levelName
-		})
-
-		if self.level is None:
-			logging.info(f'Created level "{levelName}" ({levelType}).')
-			self.level = LevelContext(levelType=levelType, levelName=levelName)
-			db.session.add(self.level)
-			db.session.commit()
+		# TODO If there is an info screen and a level with the same name, things go wrong
+		ContextCache.ensureLevel(levelType, levelName)
+		self.level_name = levelName
 
 
 # --- Global Events ---
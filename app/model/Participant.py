@@ -1,12 +1,13 @@
 import logging
 import sys
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 
-from sqlalchemy import String
+from sqlalchemy import String, select
 from sqlalchemy.orm import (
 	Mapped,
 	attribute_keyed_dict,
+	joinedload,
 	mapped_column,
 	reconstructor, # type: ignore
 	relationship,
@@ -77,6 +78,9 @@ class Participant(db.Model, SanityVersion):
 	startedPostsurvey: Mapped[bool] = mapped_column(default=False)
 	pauseShown: Mapped[bool] = mapped_column(default=False)
 
+	# Provisioned in advance and not yet claimed by a player, see `ParticipantPool`
+	pooled: Mapped[bool] = mapped_column(default=False)
+
 	# Keep track of automatically inserted tutorial slides
 	introProgress: Mapped[int] = mapped_column(default=-1)
 	introPos: Mapped[int] = mapped_column(default=-1)
@@ -88,17 +92,24 @@ class Participant(db.Model, SanityVersion):
 	phases: Mapped[List[Phase]] = relationship(back_populates="participant")
 
 
-	def __init__(self, pseudonym: str, group: str, isDebug: bool) -> None:
+	def __init__(self, pseudonym: str, group: str, isDebug: bool, pooled: bool = False) -> None:
 		# Player Info
 		# Group will be set later by `self.setGroup()`
 		self.pseudonym = pseudonym
 		self.lastConnection = now()
 		self.isDebug = isDebug
+		self.pooled = pooled
 
 		# Check if logging is enabled (affects creation of screenshots and logfiles)
 		self.loggingEnabled = gameConfig.isLoggingEnabled(group)
 		self.init_on_load()
 
+		# A pooled participant is assigned to the group when it is claimed, so that the
+		# group assignment is logged with the time the player actually arrived
+		if pooled:
+			self.group, _ = Participant.createGroup(group)
+			return
+
 		# determine a level group. Use the lastConnection as timestamp for the log event
 		self.setGroup(group, self.lastConnection)
 
@@ -108,6 +119,27 @@ class Participant(db.Model, SanityVersion):
 		"""When the object is loaded from the database, the constructor is not run again!"""
 		self.logger = ParticipantLogger(self.pseudonym, self.loggingEnabled)
 
+		# The currently active phase, if it was loaded without the `phases` collection
+		self.activePhase: Optional[Phase] = None
+
+
+	def loadActivePhase(self):
+		"""Load only the currently active phase together with its levels and switch states.
+
+		The historical phases are not loaded, `getPhase()` will return this phase until
+		the next phase is loaded. Does nothing if the phases are already in memory.
+		"""
+		if self.activePhase is not None or 'phases' in self.__dict__:
+			return
+
+		stmt = (select(Phase)
+			.where(Phase.pseudonym == self.pseudonym)
+			.order_by(Phase.id.desc())
+			.limit(1)
+			.options(joinedload(Phase.levels).selectinload(Level.switchStates))
+		)
+		self.activePhase = db.session.execute(stmt).unique().scalar_one_or_none()
+
 
 	def nextPhase(self, timeStamp: int) -> str:
 		"""Proceed to the next phase"""
@@ -152,7 +184,7 @@ class Participant(db.Model, SanityVersion):
 		"""Load the scene specified by phaseIdx"""
 
 		# Get the next scene/phase
-		if self.phaseIdx >= len(gameConfig.getGroup(self.group)['phases']):
+		if self.phaseIdx >= len(self.getCompiledConfig().phases):
 			return 'finished' # No more scenes, reached the end of the game
 
 		# Get the next phase name from the group config if not passed as a parameter
@@ -161,8 +193,9 @@ class Participant(db.Model, SanityVersion):
 
 		phase = Phase(phaseName, len(self.phases), self.getConfig().get(phaseName, {}), self.logger)
 		self.phases.append(phase)
+		self.activePhase = phase
 		db.session.add(phase)
-		db.session.commit() # Otherwise parameters are not initialized/None
+		db.session.flush() # Otherwise parameters are not initialized/None
 
 		self.logger.logNewPhase(timeStamp, self.getPhaseName())
 		
@@ -203,7 +236,7 @@ class Participant(db.Model, SanityVersion):
 		"""Get the name of the currently active phase from the Phase model or return 'finished', 
 		if the player reached the end of the game (phaseIdx > num configured phases).
 		"""
-		if self.phaseIdx > len(gameConfig.getGroup(self.group)['phases']):
+		if self.phaseIdx > len(self.getCompiledConfig().phases):
 			return 'finished'
 
 		return self.getPhase().name
@@ -215,13 +248,16 @@ class Participant(db.Model, SanityVersion):
 		Even if the phase name (`getPhaseName()`) is equal for each player, the instances returned by this method 
 		are not because the phases store player specific data.
 		"""
+		if self.activePhase is not None:
+			return self.activePhase
+
 		assert len(self.phases) > 0, "The phase is still None, looks like `startGame()` or `self.loadPhase()` was never called!"
 		return self.phases[-1]
 
 
 	def isLastPhase(self) -> bool:
 		"""Return True, if this is the last phase configured for this group. Will return False otherwise."""
-		return self.phaseIdx >= len(gameConfig.getGroup(self.group)['phases'])-1
+		return self.phaseIdx >= len(self.getCompiledConfig().phases)-1
 
 
 	def getLevelContext(self) -> tuple[LevelType, str]:
@@ -265,22 +301,30 @@ class Participant(db.Model, SanityVersion):
 		return gameConfig.getGroup(self.group)
 
 
-	def getGamerules(self) -> Dict[str, Any]:
-		"""Get the gamerules for this group"""
-		return self.getConfig()['config']
+	def getCompiledConfig(self) -> gameConfig.CompiledGroup:
+		"""Return the precomputed config for the group this user is in, see `config.CompiledGroup`"""
+		if self.group is None: # type: ignore
+			raise ModelFormatError("Invalid state: The group is still None")
+		
+		return gameConfig.getCompiledGroup(self.group)
+
+
+	def getGamerules(self) -> Mapping[str, Any]:
+		"""Get the gamerules for this group (read only)"""
+		return self.getCompiledConfig().gamerules
 
 
-	def setGroup(self, newGroup: str, timeStamp: Union[str, int]):
+	def setGroup(self, newGroup: str, timeStamp: Union[str, int], writeLog: bool = True):
 		"""Assign this user to a specific group
 		
-		This method will add a logfile entry if logging is enabled.
+		This method will add a logfile entry if logging is enabled and `writeLog` is set.
 		"""
 		# Update the model
 		# Make sure we start at the beginning, especially when switching groups after the Skill Assessment
 		self.group, _ = Participant.createGroup(newGroup)
 
 		# Log the group assignment if configured
-		if self.loggingEnabled:
+		if self.loggingEnabled and writeLog:
 			msg = '§Group: ' + newGroup
 			self.logger.writeToLog(EventType.GroupAssignment, msg, timeStamp)
 
@@ -349,13 +393,14 @@ class Participant(db.Model, SanityVersion):
 			status['timerPhaseStart'] = phase.getStartTime()
 			status['timerPhaseDuration'] = phaseDuration
 
-		if self.getGlobalTimerDuration(gameConfig.TIMER_NAME_GLOBAL_LIMIT) > 0:
+		globalDuration = self.getGlobalTimerDuration(gameConfig.TIMER_NAME_GLOBAL_LIMIT)
+		if globalDuration > 0:
 			status['timerGlobalStart'] = self.getGlobalTimerStart(gameConfig.TIMER_NAME_GLOBAL_LIMIT)
-			status['timerGlobalDuration'] = self.getGlobalTimerDuration(gameConfig.TIMER_NAME_GLOBAL_LIMIT)
+			status['timerGlobalDuration'] = globalDuration
 
 		# If the global time limit has run out, show FinalScene
-		if self.getGlobalTimerEnd(gameConfig.TIMER_NAME_GLOBAL_LIMIT) > 0 and \
-				int(timeStamp) >= self.getGlobalTimerEnd(gameConfig.TIMER_NAME_GLOBAL_LIMIT):
+		globalEnd = self.getGlobalTimerEnd(gameConfig.TIMER_NAME_GLOBAL_LIMIT)
+		if globalEnd > 0 and int(timeStamp) >= globalEnd:
 			status["phase"] = PhaseType.FinalScene
 
 		# Return unlocked intro slides
@@ -433,7 +478,11 @@ class Participant(db.Model, SanityVersion):
 					phase.insertLevel(Level('special', path_pause_slide), phase.levelIdx)
 
 					self.pauseShown = True
-					db.session.commit() # We need to commit now, because otherwise Level attributes are not initialized
+
+					# Flush, because otherwise Level attributes are not initialized. Then reload the
+					# levels in database order, so that the pause slide comes after the current level
+					db.session.flush()
+					db.session.expire(phase, ['levels'])
 
 		# Start next Level if the phase got some and they are not finished
 		if levelsRemain:
@@ -691,10 +740,15 @@ class Participant(db.Model, SanityVersion):
 				oldMinSwitchClicks = level.minSwitchClicks # type: ignore
 				oldConfirmClicks = level.confirmClicks
 
+				# The server simulates the circuit, the value of the client is only a fallback
+				minSwitchClicks = level.calculateMinSwitchClicks()
 				level.switchClicks = int(a)
-				level.minSwitchClicks = int(b)
+				level.minSwitchClicks = minSwitchClicks if minSwitchClicks >= 0 else int(b)
 				level.confirmClicks = int(c)
 
+				if minSwitchClicks >= 0 and minSwitchClicks != int(b):
+					logging.debug(f'{self.pseudonym}: The client reported {int(b)} min switch clicks for "{level.fileName}", the server simulated {minSwitchClicks}')
+
 				# Safety checks: Alert when something seems off with the clicks
 				assert level.switchClicks >= level.minSwitchClicks, \
 					f"switchClicks >= minSwitchClicks ({level.switchClicks}, {level.minSwitchClicks})"
@@ -915,16 +969,13 @@ class Participant(db.Model, SanityVersion):
 		-2: Timer disabled
 		"""
 		# Return -2 if timer is not enabled
-		if configName not in self.getGamerules():
+		timer = self.getCompiledConfig().timers.get(configName, None)
+		if timer is None:
 			return -2
 		
-		# Use the Phase name specified in `startEvent` or default to the first Phase as the timer beginning.
-		TIMER_SETTINGS = self.getGamerules()[configName]
-		START_PHASE = self.getConfig()['phases'][0] if TIMER_SETTINGS['startEvent'] is None \
-			else TIMER_SETTINGS['startEvent']
-		
+		# The Phase name specified in `startEvent` or the first Phase marks the timer beginning.
 		# Find the first Phase where the start event matches the phase name or return -1 if none is found
-		return next((p.timeStarted for p in self.phases if p.name == START_PHASE), -1)
+		return next((p.timeStarted for p in self.phases if p.name == timer.startPhase), -1)
 
 
 	def getGlobalTimerDuration(self, configName: str) -> int:
@@ -939,16 +990,12 @@ class Participant(db.Model, SanityVersion):
 		-6: Duration too small
 		"""
 		# Return -2 if timer is not enabled
-		if configName not in self.getGamerules():
+		timer = self.getCompiledConfig().timers.get(configName, None)
+		if timer is None:
 			return -2
 		
-		TIMER_DURATION = self.getGamerules()[configName]['after']
-		
-		if TIMER_DURATION < 0.1:
-			return -6
-
-		# True if the timer since `startEvent` has run out, false otherwise
-		return TIMER_DURATION * 1000
+		# The duration is -6 if it is too small
+		return timer.duration
 	
 
 	def getGlobalTimerEnd(self, configName: str) -> int:
@@ -967,7 +1014,7 @@ class Participant(db.Model, SanityVersion):
 
 	@staticmethod
 	def convertPhaseIndex(groupName: str, phaseIdx: int) -> str:
-		return gameConfig.getGroup(groupName)['phases'][phaseIdx]
+		return gameConfig.getCompiledGroup(groupName).phases[phaseIdx]
 
 
 	@staticmethod
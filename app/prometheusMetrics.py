@@ -6,11 +6,16 @@ from flask import Flask
 
 # Prometheus Metrics
 from flask.ctx import AppContext
-from prometheus_flask_exporter import PrometheusMetrics, Gauge  # type: ignore
+from prometheus_flask_exporter import PrometheusMetrics, Gauge, Histogram  # type: ignore
 from prometheus_flask_exporter.multiprocess import UWsgiPrometheusMetrics  # type: ignore
 
 import app.config as gameConfig
 import app.storage.participantsDict as participantsDict
+from app.storage.database import readOnlyTransaction
+from app.storage.eventBuffer import EventBuffer
+from app.storage.ioExecutor import IOExecutor
+from app.storage.logfileWriter import LogfileWriter
+from app.storage.participantPool import ParticipantPool
 
 
 class ServerMetrics:
@@ -40,7 +45,7 @@ class ServerMetrics:
 	metrics: PrometheusMetrics|UWsgiPrometheusMetrics|None = None
 
 	# ReverSim Prometheus Metrics
-	#met_openLogs = Gauge("reversim_logfile_count", "The number of open logfiles") # type: ignore
+	met_openLogs: Gauge|None = None
 
 	met_playersConnected: Gauge|None = None
 	# NOTE Prometheus multi processing implementation prevents us from building the stats whenever requested.
@@ -49,6 +54,22 @@ class ServerMetrics:
 	
 	met_clientErrors: Gauge|None = None
 
+	met_eventQueueDepth: Gauge|None = None
+	met_eventFlushLatency: Gauge|None = None
+
+	met_ioQueueDepth: Gauge|None = None
+	met_ioLatency: Gauge|None = None
+
+	met_participantPool: Gauge|None = None
+
+	# Database usage per request (labeled by endpoint) and per JSON-RPC method, see `QueryStats`
+	met_requestQueries: Histogram|None = None
+	met_requestCommits: Histogram|None = None
+	met_requestDatabaseTime: Histogram|None = None
+	met_rpcQueries: Histogram|None = None
+	met_rpcCommits: Histogram|None = None
+	met_rpcDatabaseTime: Histogram|None = None
+
 	@classmethod
 	def createPrometheus(cls, app: Flask, auth_provider: Any):
 		"""Init Prometheus"""
@@ -71,6 +92,61 @@ class ServerMetrics:
 			multiprocess_mode='sum'
 		)
 
+		cls.met_openLogs: Gauge|None = cls.metrics.info( # type: ignore
+			name="reversim_logfile_count",
+			description="The number of open logfiles",
+			multiprocess_mode='sum'
+		)
+
+		cls.met_eventQueueDepth: Gauge|None = cls.metrics.info( # type: ignore
+			name="reversim_event_queue_depth",
+			description="Number of log events waiting in the write-behind buffer",
+			multiprocess_mode='sum'
+		)
+
+		cls.met_eventFlushLatency: Gauge|None = cls.metrics.info( # type: ignore
+			name="reversim_event_flush_latency_seconds",
+			description="Time it took to write the last batch of buffered log events",
+			multiprocess_mode='max'
+		)
+
+		cls.met_ioQueueDepth: Gauge|None = cls.metrics.info( # type: ignore
+			name="reversim_io_queue_depth",
+			description="Number of logfile, screenshot and crash report writes waiting in the I/O executor",
+			multiprocess_mode='sum'
+		)
+
+		cls.met_ioLatency: Gauge|None = cls.metrics.info( # type: ignore
+			name="reversim_io_latency_seconds",
+			description="Time between submitting and completing the last background write",
+			multiprocess_mode='max'
+		)
+
+		cls.met_participantPool: Gauge|None = cls.metrics.info( # type: ignore
+			name="reversim_participant_pool_size",
+			description="Number of provisioned participants that were not claimed yet",
+			multiprocess_mode='mostrecent'
+		)
+
+		QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, float('inf'))
+		COMMIT_BUCKETS = (0, 1, 2, 3, 5, 10, float('inf'))
+		TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, float('inf'))
+		registry = cls.metrics.registry # type: ignore
+
+		cls.met_requestQueries = Histogram("reversim_request_db_queries", "Number of SQL statements per request", 
+			['endpoint'], buckets=QUERY_BUCKETS, registry=registry)
+		cls.met_requestCommits = Histogram("reversim_request_db_commits", "Number of database commits per request", 
+			['endpoint'], buckets=COMMIT_BUCKETS, registry=registry)
+		cls.met_requestDatabaseTime = Histogram("reversim_request_db_seconds", "Time spent executing SQL statements per request", 
+			['endpoint'], buckets=TIME_BUCKETS, registry=registry)
+
+		cls.met_rpcQueries = Histogram("reversim_rpc_db_queries", "Number of SQL statements per JSON-RPC method call", 
+			['method'], buckets=QUERY_BUCKETS, registry=registry)
+		cls.met_rpcCommits = Histogram("reversim_rpc_db_commits", "Number of database commits per JSON-RPC method call", 
+			['method'], buckets=COMMIT_BUCKETS, registry=registry)
+		cls.met_rpcDatabaseTime = Histogram("reversim_rpc_db_seconds", "Time spent executing SQL statements per JSON-RPC method call", 
+			['method'], buckets=TIME_BUCKETS, registry=registry)
+
 		with app.app_context():
 			# https://github.com/rycus86/prometheus_flask_exporter/issues/31
 			if isinstance(cls.metrics, UWsgiPrometheusMetrics):
@@ -88,12 +164,26 @@ class ServerMetrics:
 		time.sleep(5) # [s]
 
 		while True:
-			with appContext:
+			with appContext, readOnlyTransaction():
 				if cls.met_playersConnected is None:
 					continue
 				
 				cls.met_playersConnected.set(participantsDict.getConnectedPlayers())
 
+				if LogfileWriter.enabled and cls.met_openLogs is not None:
+					cls.met_openLogs.set(LogfileWriter.openFiles())
+
+				if EventBuffer.enabled and cls.met_eventQueueDepth is not None and cls.met_eventFlushLatency is not None:
+					cls.met_eventQueueDepth.set(EventBuffer.depth())
+					cls.met_eventFlushLatency.set(EventBuffer.lastFlushLatency)
+
+				if IOExecutor.enabled and cls.met_ioQueueDepth is not None and cls.met_ioLatency is not None:
+					cls.met_ioQueueDepth.set(IOExecutor.depth())
+					cls.met_ioLatency.set(IOExecutor.lastLatency)
+
+				if ParticipantPool.enabled and cls.met_participantPool is not None:
+					cls.met_participantPool.set(ParticipantPool.available)
+
 			time.sleep(gameConfig.METRIC_UPDATE_INTERVAL) # [s]
 
 
@@ -107,3 +197,15 @@ class ServerMetrics:
 			cls.met_clientErrors.inc() # Increment the `reversim_client_errors` metric
 		except Exception as e:
 			logging.error('Unable to update crash metric: ' + str(e))
+
+
+	@classmethod
+	def decrementCrashMetrics(cls):
+		"""Undo `incrementCrashMetrics()`, if the crash report could not be written"""
+		try:
+			if cls.met_clientErrors is None:
+				return
+
+			cls.met_clientErrors.dec()
+		except Exception as e:
+			logging.error('Unable to update crash metric: ' + str(e))
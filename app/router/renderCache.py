@@ -0,0 +1,53 @@
+import threading
+from typing import Any, Callable, Hashable
+
+from flask import current_app, render_template
+
+import app.config as gameConfig
+
+
+class RenderCache:
+	"""Cache the HTML of pages that only depend on the config, like `/welcome` and `/index`.
+
+	The pages are rendered once per key (e.g. group and language) and then served from
+	memory, so a lot of players opening the link at the start of a study cost almost
+	nothing. The cache is cleared when the gameConfig is (re)loaded and it is bypassed if
+	Flask reloads changed templates (debug mode).
+
+	NOTE: Only cache pages without any player specific data!
+	"""
+
+	MAX_ENTRIES = 1024 # Safety net, the cache is cleared if exceeded
+
+	_pages: dict[Hashable, str] = {}
+	_configGeneration = -1
+	_lock = threading.Lock()
+
+
+	@classmethod
+	def render(cls, template: str, key: Hashable, context: Callable[[], dict[str, Any]]) -> str:
+		"""Render the template with the context returned by `context()` or return the cached page.
+
+		`key` must contain everything besides the config the page depends on, e.g. group and language.
+		"""
+		if current_app.jinja_env.auto_reload:
+			return render_template(template, **context())
+
+		cacheKey = (template, key, gameConfig.getGitHash())
+		with cls._lock:
+			if cls._configGeneration != gameConfig.getConfigGeneration():
+				cls._pages.clear()
+				cls._configGeneration = gameConfig.getConfigGeneration()
+
+			page = cls._pages.get(cacheKey, None)
+			if page is not None:
+				return page
+
+		page = render_template(template, **context())
+
+		with cls._lock:
+			if len(cls._pages) >= cls.MAX_ENTRIES:
+				cls._pages.clear()
+			cls._pages[cacheKey] = page
+
+		return page
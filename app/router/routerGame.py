@@ -11,16 +11,20 @@ from markupsafe import escape
 from app.model.Participant import Participant
 
 import app.config as gameConfig
+from app.router.renderCache import RenderCache
 from app.router.jsonRPC import JSONRPC_VERSION, JsonRPC_Errcode, JsonRPC_Error, JsonRPC_INTERNAL_ERROR, JsonRPC_INVALID_PARAMS, JsonRPC_INVALID_REQUEST, JsonRPC_METHOD_NOT_FOUND, JsonRPC_PARSE_ERROR
 from app.storage.ParticipantLogger import ParticipantLogger, PseudonymCollision
+from app.storage.participantPool import ParticipantPool
 from app.storage.crashReport import isCrashReporterEnabled, writeCrashReport
 from app.model.LogEvents import LogCreatedEvent, PlayerContext, ReconnectEvent, RedirectEvent
-from app.storage.participantScreenshots import ScreenshotWriter
+from app.storage.participantScreenshots import InvalidScreenshot, ScreenshotWriter
+from app.storage.presenceTable import PresenceTable
+from app.storage.queryStats import QueryStats
 from app.utilsGame import EventType, now, sanitizeString
 
 import app.storage.participantsDict as participantsDict
 
-from app.storage.database import db
+from app.storage.database import db, readOnlyTransaction
 
 routerGame = Blueprint('gameRoutes', __name__)
 
@@ -32,32 +36,41 @@ def index() -> Response:
 	return redirect(getDefaultUrl(request), 307) # type: ignore
 
 @routerGame.route('/welcome') # type: ignore
+@readOnlyTransaction()
 def welcomeUser():
-	group = request.args.get('group', default=participantsDict.getAutomaticGroup())
+	group = request.args.get('group', default=None)
+
+	# Only assign a group if none was requested, don't evaluate the default eagerly
+	if group is None:
+		group = participantsDict.getAutomaticGroup()
 	lang = sanitizeString(request.args.get('lang', default=gameConfig.getDefaultLang()))
 
 	group, _ = Participant.createGroup(group)
-	gamerules = gameConfig.getGroup(group)['config']
 
-	user: dict[str, str|int|dict[str, Any]] = {
+	user: Callable[[], dict[str, Any]] = lambda: {
 		'lang': lang,
 		'languages': gameConfig.get('languages'),
 		'group': group, 
 		'author': gameConfig.config('author', ''), # html head
 		'footer': gameConfig.getFooter(),
-		'gamerules': jinja2.utils.htmlsafe_json_dumps(gamerules),
+		'gamerules': gameConfig.getCompiledGroup(group).gamerulesJson,
 		'game_hash': gameConfig.getGitHash()
 	}
-	return render_template('welcome.html', **user)
+
+	# The page only depends on the group and language, cache it for the configured languages
+	if lang in gameConfig.get('languages'):
+		return RenderCache.render('welcome.html', (group, lang), user)
+	return render_template('welcome.html', **user())
 
 
 @routerGame.route('/game') # type: ignore
+@readOnlyTransaction()
 def redirectToGame():
 	"""Let the user play the actual HRE game. 
 
 	Sends back the game.html template. The GET parameters ui and lang need to be specified and ui must have been generated by pre_survey.
 	"""
-	ui = sanitizeString(request.args.get('ui'))
+	ui = participantsDict.validatePseudonym(request.args.get('ui'))
 	lang = sanitizeString(request.args.get('lang', default=gameConfig.getDefaultLang()))
 	
 	# If the pseudonym is invalid, ask the user to generate a new one
@@ -72,7 +85,7 @@ def redirectToGame():
 		'lang': lang, 
 		'group': participant.group, 
 		'author': gameConfig.config('author', ''),
-		'gamerules': jinja2.utils.htmlsafe_json_dumps(participant.getGamerules()),
+		'gamerules': participant.getCompiledConfig().gamerulesJson,
 		'game_hash': gameConfig.getGitHash(),
 		'crashReporterEnabled': isCrashReporterEnabled(participant.group),
 		'crashReportLevel': gameConfig.getInt('crashReportLevel')
@@ -98,11 +111,18 @@ def redirectToPreSurvey():
 
 	# Create prerequisites for the Participant
 	try:
-		for _ in range(0, 5):
-			tmpPseudonym = participantsDict.generatePseudonym(str(request.remote_addr))
-			if not participantsDict.exists(tmpPseudonym):
-				pseudonym = tmpPseudonym
-				break
+		# Take a participant that was provisioned in advance, if the pool is enabled
+		participant = ParticipantPool.claim(group, isDebug)
+		pooled = participant is not None
+
+		if participant is not None:
+			pseudonym = participant.pseudonym
+		else:
+			for _ in range(0, 5):
+				tmpPseudonym = participantsDict.generatePseudonym(str(request.remote_addr))
+				if not participantsDict.exists(tmpPseudonym):
+					pseudonym = tmpPseudonym
+					break
 
 		# Check that a valid pseudonym was generated
 		if pseudonym is None:
@@ -111,12 +131,15 @@ def redirectToPreSurvey():
 		
 		# Create entry in new database logger
 		loggingEnabled = gameConfig.isLoggingEnabled(group)
-		PlayerContext.createPlayer(pseudonym, loggingEnabled)
+		if not pooled:
+			PlayerContext.createPlayer(pseudonym, loggingEnabled)
 
 		try:
-			# If logging is enabled, create a log file
+			# If logging is enabled, create a log file (the pool already created an empty one,
+			# which is written after the claim was committed)
 			if loggingEnabled:
-				ParticipantLogger.createLogfile(pseudonym)
+				if not pooled:
+					ParticipantLogger.createLogfile(pseudonym)
 
 				event = LogCreatedEvent(
 					clientTime=None,
@@ -132,8 +155,13 @@ def redirectToPreSurvey():
 			return "The generated pseudonym already existed, please restart the game.", 500
 
 		# create and insert into the participantsDict
-		participant = Participant(pseudonym, group, isDebug=isDebug)
-		participantsDict.insertParticipant(participant)
+		if pooled:
+			assert participant is not None
+			participant.lastConnection = now()
+			participant.setGroup(group, participant.lastConnection, writeLog=False)
+		else:
+			participant = Participant(pseudonym, group, isDebug=isDebug)
+			participantsDict.insertParticipant(participant)
 
 		# presurvey link and params for the game link
 		presurveyLink = participant.getLink('urlPreSurvey', request.args)
@@ -147,7 +175,7 @@ def redirectToPreSurvey():
 			redirectLink = url_for("gameRoutes.redirectToGame", **{**request.args, **{'ui': pseudonym}}) # type: ignore
 
 		# Write the redirect to log (if logging is enabled)
-		if loggingEnabled:
+		if loggingEnabled and not pooled:
 			msg1 = '§Destination: ' + redirectLink
 			participant.logger.writeToLog(EventType.Redirect, msg1, now())
 
@@ -164,6 +192,9 @@ def redirectToPreSurvey():
 		# Flask-SQLAlchemy does not commit at the end of a session...
 		db.session.commit()
 
+		if pooled:
+			ParticipantPool.claimed(participant, redirectLink)
+
 	# Something went seriously wrong
 	except gameConfig.GroupNotFound as e:
 		print(str(e))
@@ -182,7 +213,7 @@ def redirectToPostSurvey():
 
 	The url for the post-survey can be changed with the variable urlPostSurvey.
 	"""
-	ui = sanitizeString(request.args['ui'])
+	ui = participantsDict.validatePseudonym(request.args['ui'])
 	lang = sanitizeString(request.args.get('lang', default=gameConfig.getDefaultLang()))
 	timeStamp = str(now()) # sanitizeString(request.args.get('timeStamp')) #DONE don't trust the client timestamp here
 
@@ -226,31 +257,29 @@ def saveCanvasImage():
 	
 	The Request params must contain the pseudonym of the player. The request body shall contain the Base64 encoded PNG snapshot of the players canvas. 
 	The pictures are stored under "statistics/<ui>/<phase>/<picNmbr>.png" for most phases and "statistics/<ui>/<phase>/<levelName>/<picNmbr>.png" for the quali and competition phase
+
+	NOTE: Kept for compatibility, new clients should use `/canvasImagePNG`.
 	"""
 	imgstring = escape(request.form['canvasImage'])
 	imgstring = imgstring.replace('data:image/png;base64,', '')
 	imgdata = base64.b64decode(imgstring)
 
-	pseudonym = sanitizeString(request.form['pseudonym'])
+	pseudonym = participantsDict.validatePseudonym(request.form['pseudonym'])
 
 	if not participantsDict.exists(pseudonym):
 		return 'Invalid pseudonym', 400
 
 	participant = participantsDict.get(pseudonym)
 	phase = participant.getPhase()
-	path = ScreenshotWriter.getPath(
-		pseudonym=participant.pseudonym, 
-		phaseName=phase.name, 
-		levelName=phase.getLevel().getName() if phase.hasLevels() else None,
-		phaseIdx=phase.index
-	)
+	path = getScreenshotPath(participant)
 
-	# Write the image file and increment the picNmbr stored in the phase
+	# Write the image file and increment the picNmbr stored in the phase. The OSError is
+	# only raised, if the file is not written in the background by the IOExecutor
 	try:
 		ScreenshotWriter.writeScreenshot(path, phase.picNmbr, imgdata)
 		phase.picNmbr += 1
 
-	except FileNotFoundError:
+	except OSError:
 		print('Path not found:'  + str(path))
 		return 'File or path not found'
 
@@ -259,11 +288,62 @@ def saveCanvasImage():
 	return 'image received'
 
 
+@routerGame.route('/canvasImagePNG', methods=['POST']) # type: ignore
+def saveCanvasImagePNG():
+	"""Receive a screenshot from the player canvas as a binary PNG file.
+
+	The pseudonym is passed as a request param. The request body is either the raw PNG file
+	(`Content-Type: image/png`) or a multipart upload with the file in the `canvasImage` field.
+	The body is streamed to disk in chunks, see `/canvasImage` for the storage location.
+	"""
+	pseudonym = participantsDict.validatePseudonym(request.args.get('pseudonym', ''))
+
+	if not participantsDict.exists(pseudonym):
+		return 'Invalid pseudonym', 400
+
+	if request.mimetype == 'image/png':
+		stream = request.stream
+	elif 'canvasImage' in request.files:
+		stream = request.files['canvasImage'].stream
+	else:
+		return 'Expected an image/png body or a multipart upload', 415
+
+	participant = participantsDict.get(pseudonym)
+	phase = participant.getPhase()
+	path = getScreenshotPath(participant)
+
+	# Write the image file and increment the picNmbr stored in the phase
+	try:
+		ScreenshotWriter.writeScreenshotStream(path, phase.picNmbr, stream)
+		phase.picNmbr += 1
+
+	except InvalidScreenshot as e:
+		return str(e), 400
+
+	except OSError:
+		print('Path not found:'  + str(path))
+		return 'File or path not found'
+
+	db.session.commit()
+	return 'image received'
+
+
+def getScreenshotPath(participant: Participant) -> str:
+	"""The folder for the screenshots of the current phase/level of the participant."""
+	phase = participant.getPhase()
+	return ScreenshotWriter.getPath(
+		pseudonym=participant.pseudonym, 
+		phaseName=phase.name, 
+		levelName=phase.getLevel().getName() if phase.hasLevels() else None,
+		phaseIdx=phase.index
+	)
+
+
 @routerGame.route('/action', methods=['POST']) # type: ignore
 def action():
 	try:
 		try:
-			pseudonym = sanitizeString(request.headers['ui'])
+			pseudonym = participantsDict.validatePseudonym(request.headers['ui'])
 			participant = participantsDict.get(pseudonym)
 			transmissionTime = int(request.headers['time'])
 			serverTime = now()
@@ -389,20 +469,20 @@ def handlePacket(participant: Participant, message: Dict[str, Any]) -> Dict[str,
 		if method not in METHODS:
 			raise JsonRPC_METHOD_NOT_FOUND(id=rawID)
 
-		# params where given as a List
-		if isinstance(params, list):
-			result: Any = METHODS[method](timeStamp, *params)
-			return {"jsonrpc": JSONRPC_VERSION, "result": result, "id": idx}
- 
-		# params where given as a Dict
-		elif isinstance(params, Mapping):
-			result: Any = METHODS[method](timeStamp, **params)
-			return {"jsonrpc": JSONRPC_VERSION, "result": result, "id": idx}
-
-		# params where omitted
-		else:
-			result: Any = METHODS[method](timeStamp) # type: ignore
-			return {"jsonrpc": JSONRPC_VERSION, "result": result, "id": idx}
+		with QueryStats.measure(method):
+			# params where given as a List
+			if isinstance(params, list):
+				result: Any = METHODS[method](timeStamp, *params)
+			
+			# params where given as a Dict
+			elif isinstance(params, Mapping):
+				result: Any = METHODS[method](timeStamp, **params)
+
+			# params where omitted
+			else:
+				result: Any = METHODS[method](timeStamp) # type: ignore
+
+		return {"jsonrpc": JSONRPC_VERSION, "result": result, "id": idx}
 
 	except (KeyError, TypeError, ValueError):
 		raise JsonRPC_INVALID_PARAMS(id=rawID)
@@ -422,13 +502,29 @@ def testConnection():
 	
 	The server keeps track of the players connection and creates a log entry if the player is reconnecting after an interruption.
 	"""
-	pseudonym = sanitizeString(request.form['pseudonym'])
+	pseudonym = participantsDict.validatePseudonym(request.form['pseudonym'])
 	timeStamp = sanitizeString(request.form['timeStamp'])
 	serverTime = now()
 
 	try:
-		participant = participantsDict.get(pseudonym)
-		t = participant.lastConnection
+		# Fast path: Only record the heartbeat in the shared presence table, if the player
+		# is still connected and the lastConnection in the database is recent enough
+		presence = PresenceTable.heartbeat(pseudonym, serverTime) if PresenceTable.enabled and len(pseudonym) > 0 else None
+		if presence is not None:
+			lastHeartbeat, lastPersisted = presence
+			if (serverTime - lastHeartbeat < gameConfig.BACK_ONLINE_THRESHOLD_S*1000
+				and serverTime - lastPersisted < PresenceTable.persistInterval*1000
+			):
+				return 'pong'
+
+		try:
+			participant = participantsDict.get(pseudonym)
+		except ValueError:
+			if presence is not None:
+				PresenceTable.remove(pseudonym)
+			raise
+
+		t = participant.lastConnection if presence is None else max(participant.lastConnection, presence[0])
 		elapsed = (serverTime - t) / 1000 
 
 		if elapsed >= gameConfig.BACK_ONLINE_THRESHOLD_S:
@@ -446,6 +542,12 @@ def testConnection():
 		# Flask-SQLAlchemy does not commit at the end of a session...
 		db.session.commit()
 
+		if PresenceTable.enabled:
+			if presence is None:
+				PresenceTable.insert(pseudonym, serverTime)
+			else:
+				PresenceTable.markPersisted(pseudonym, serverTime)
+
 		return 'pong'
 	except (KeyError, ValueError):
 		pass
@@ -1,8 +1,10 @@
 from datetime import datetime
 import re
-from flask import Blueprint, redirect, render_template, url_for
+from typing import Any
+from flask import Blueprint, redirect, url_for
 
 import app.config as gameConfig
+from app.router.renderCache import RenderCache
 from app.utilsGame import PhaseType
 
 routerStatic = Blueprint('staticRoutes', __name__)
@@ -33,6 +35,11 @@ def groupIndex():
 	if not bool(gameConfig.get('groupIndex').get('enabled', True)):
 		return 'Group Index disabled', 404
 
+	# The footer contains the current year
+	return RenderCache.render("index.html", datetime.today().year, groupIndexContext)
+
+
+def groupIndexContext() -> dict[str, Any]:
 	# Gather all attributes which are send to the view
 	groups = {}
 	editorGroups = {}
@@ -63,7 +70,7 @@ def groupIndex():
 	for key in configFooter:
 		indexFooter[' '.join(re.findall('[a-zA-Z][^A-Z]*', key))] = configFooter[key]
 
-	return render_template("index.html", **{
+	return {
 		'groups': groups,
 		'editorGroups': editorGroups,
 		'author': author,
@@ -71,7 +78,7 @@ def groupIndex():
 		'ingameFooter': indexFooter, # The footer from /game and /welcome
 		'showDebug': showDebug,
 		'game_hash': gameConfig.getGitHash()
-	})
+	}
 
 
 # send back log inspector
@@ -11,6 +11,7 @@ import urllib.request
 from flask import json
 
 from app.model.LevelLoader.JsonLevelList import JsonLevelList
+from app.model.LevelLoader.LevelFile import loadLevelFile
 from app.utilsGame import LevelType
 
 try:
@@ -435,6 +436,16 @@ def getLevelsFromPath(path: str):
 			level = level.removeprefix(DOT_SLASH)
 			parentFolder = os.path.relpath(path=folder, start=base_input_path)
 			levelPath = os.path.join(parentFolder, level)
+
+			# Skip files that do not contain a circuit, instead of waiting for the browser to fail
+			try:
+				if len(loadLevelFile(os.path.join(folder, level)).elements) < 1:
+					logging.info(f'Skipping "{levelPath}", it does not contain any elements')
+					continue
+			except Exception as e:
+				logging.warning(f'Skipping "{levelPath}": {e}')
+				continue
+
 			yield levelPath.removeprefix(DOT_SLASH)
 
 
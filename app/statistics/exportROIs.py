@@ -3,6 +3,7 @@ from typing import NamedTuple
 
 import app.config as gameConfig
 from app.model.Level import LEVEL_FILE_PATHS
+from app.model.LevelLoader.LevelFile import loadLevelFile
 from app.model.Phase import PHASES_WITH_LEVELS
 
 canvas_offset = (0, 167)
@@ -129,60 +130,48 @@ def screen_coord_to_level(sx: float, sy: float) -> tuple[float, float]:
 def build_bounding_boxes(level: str, mergeInputs: bool = True, expand: int = 0) -> list[ROI_Entry]:
 	boxes: list[ROI_Entry] = []
 
-	with open(LEVEL_FILE_PATHS['level'] + level, encoding=gameConfig.LEVEL_ENCODING) as file:
-		connections: dict[int, list[int]] = {}
-		powers: dict[int, ROI_Entry] = {}
-		switches: dict[int, ROI_Entry] = {}
-		splitter: dict[int, ROI_Entry] = {}
-
-		# Parse level file line by line
-		for line in file:
-			item = line.split('§')
-
-			if item[0] == "connection":
-				connections[int(item[1])] = list(map(int, item[2:]))
-
-			if item[0] != "element": continue
-			
-			(_element, item_id, item_type, _rotation, x, y) = item[0:6]
-			x, y = int(x), int(y)
-			item_id = int(item_id)
-			
-			(size_x, size_y) = ELEMENT_SIZES[item_type]
-			screen_x, screen_y = level_coord_to_screen(x, y)
-
-			screen_bbox_w, screen_bbox_h = (size_x + 2*expand, size_y + 2*expand)
-			screen_bbox_x, screen_bbox_y = (screen_x - screen_bbox_w/2, screen_y - screen_bbox_h/2)
-			
-			bounding_box = ROI_Entry(ELEMENT_TYPES[item_type], screen_bbox_x, screen_bbox_y, screen_bbox_w, screen_bbox_h, item_id)
-			boxes.append(bounding_box)
-			if item_type == 'VCC': powers[bounding_box.id] = bounding_box
-			if item_type == 'Switch': switches[bounding_box.id] = bounding_box
-			if item_type == 'Splitter': splitter[bounding_box.id] = bounding_box
-
-		# Remove all splitters that are hidden ingame
-		for x in splitter:
-			if x in connections and len(connections[x]) == 1:
-				boxes.remove(splitter[x])
-
-		# Merge VCCs and switches into single box if enabled
-		if mergeInputs:
-			for p in powers:
-				if p in connections and len(connections[p]) == 1:
-					power = powers[p]
-					switch = switches.get(connections[p][0])
-					if switch == None:
-						continue
-
-					boxes.remove(power)
-					boxes.remove(switch)
-					box_tl = (min(power.screen_tl_x, switch.screen_tl_x), min(power.screen_tl_y, switch.screen_tl_y))
-					box_br = (
-						max(power.screen_tl_x + power.width, switch.screen_tl_x + switch.width), 
-	       				max(power.screen_tl_y + power.height, switch.screen_tl_y + switch.height)
-					)
-					box_sz = (box_br[0] - box_tl[0], box_br[1] - box_tl[1])
-					boxes.append(ROI_Entry("IN", box_tl[0], box_tl[1], box_sz[0], box_sz[1], id=power.id))
+	levelFile = loadLevelFile(LEVEL_FILE_PATHS['level'] + level)
+	connections = levelFile.connections
+	powers: dict[int, ROI_Entry] = {}
+	switches: dict[int, ROI_Entry] = {}
+	splitter: dict[int, ROI_Entry] = {}
+
+	for element in levelFile.elements.values():
+		(size_x, size_y) = ELEMENT_SIZES[element.type]
+		screen_x, screen_y = level_coord_to_screen(element.x, element.y)
+
+		screen_bbox_w, screen_bbox_h = (size_x + 2*expand, size_y + 2*expand)
+		screen_bbox_x, screen_bbox_y = (screen_x - screen_bbox_w/2, screen_y - screen_bbox_h/2)
+		
+		bounding_box = ROI_Entry(ELEMENT_TYPES[element.type], screen_bbox_x, screen_bbox_y, screen_bbox_w, screen_bbox_h, element.id)
+		boxes.append(bounding_box)
+		if element.type == 'VCC': powers[bounding_box.id] = bounding_box
+		if element.type == 'Switch': switches[bounding_box.id] = bounding_box
+		if element.type == 'Splitter': splitter[bounding_box.id] = bounding_box
+
+	# Remove all splitters that are hidden ingame
+	for x in splitter:
+		if x in connections and len(connections[x]) == 1:
+			boxes.remove(splitter[x])
+
+	# Merge VCCs and switches into single box if enabled
+	if mergeInputs:
+		for p in powers:
+			if p in connections and len(connections[p]) == 1:
+				power = powers[p]
+				switch = switches.get(connections[p][0])
+				if switch == None:
+					continue
+
+				boxes.remove(power)
+				boxes.remove(switch)
+				box_tl = (min(power.screen_tl_x, switch.screen_tl_x), min(power.screen_tl_y, switch.screen_tl_y))
+				box_br = (
+					max(power.screen_tl_x + power.width, switch.screen_tl_x + switch.width), 
+					max(power.screen_tl_y + power.height, switch.screen_tl_y + switch.height)
+				)
+				box_sz = (box_br[0] - box_tl[0], box_br[1] - box_tl[1])
+				boxes.append(ROI_Entry("IN", box_tl[0], box_tl[1], box_sz[0], box_sz[1], id=power.id))
 
 	return boxes
 
@@ -26,7 +26,7 @@ app = initLogConverter()
 
 def getAllParticipantsFromDB() -> Iterable[str]:
 	with app.app_context():
-		return db.session.scalars(statement=select(Participant.pseudonym).where(Participant.loggingEnabled)).all()
+		return db.session.scalars(statement=select(Participant.pseudonym).where(Participant.loggingEnabled, ~Participant.pooled)).all()
 
 
 def getLogEntriesFromDB(pseudonym: str):
@@ -3,6 +3,7 @@ import os
 from typing import Dict, List, Tuple
 
 from app.statistics.statsParticipant import StatsParticipant
+from app.storage.screenshotArchive import INDEX_EXTENSION, ScreenshotArchive
 from app.utilsGame import PhaseType, getShortPseudo
 
 
@@ -12,12 +13,22 @@ def countScreenshotsOnDisk(screenshotFolder: str, pseudonym: str, subFolderName:
 	Returns a list of tuples `(<phaseName/levelName>, <picCount>)` with `levelName` being `.` if this screenshot is not
 	inside a level folder but in the root of the phase folder.
 
+	If the screenshots were appended to an archive (`screenshotStore.mode = "archive"`), the archive index
+	`../canvasPics/<pseudonym>.idx` is read instead of walking the folders (both are counted if both exist).
+
 	This method operates on files and does not catch the exceptions that might arise (resources are of cause cleaned up)
 	"""
 	folderUserPics = os.path.join(screenshotFolder, "..", subFolderName, pseudonym)
 
 	picCounts: Dict[str, int] = {}
 
+	indexPath = folderUserPics + INDEX_EXTENSION
+	if os.path.isfile(indexPath):
+		countScreenshotsInArchive(indexPath, picCounts)
+
+		if not os.path.isdir(folderUserPics):
+			return picCounts
+
 	# List contents of the User folder (should be one folder per Phase)
 	with os.scandir(folderUserPics) as userFolderIterator:
 		for folderPhase in userFolderIterator:
@@ -25,21 +36,21 @@ def countScreenshotsOnDisk(screenshotFolder: str, pseudonym: str, subFolderName:
 			phaseName = phaseName.replace('IntroDrawingTools', PhaseType.DrawTools) # Special case for old logfiles
 
 			picCount, levelFolders = countFiles(folderPhase)
-			picCounts[phaseName + "/."] = picCount
+			picCounts[phaseName + "/."] = picCounts.get(phaseName + "/.", 0) + picCount
 
 			# List contents of the Phase folder (should be one folder per level or some pics if the phase has no levels)
 			for level in levelFolders:
 				levelPicCount, secondRunFolders = countFiles(level)
 
 				LEVEL_NAME = phaseName + "/" + level.name
-				picCounts[LEVEL_NAME] = levelPicCount
+				picCounts[LEVEL_NAME] = picCounts.get(LEVEL_NAME, 0) + levelPicCount
 
 				# The second runs for the quali phase ended up inside the level folder, this is not intended but we
 				# have to work with it now
 				for secondLevelRun in secondRunFolders:
 					slrPicCount, otherDirs = countFiles(secondLevelRun)
 					SECOND_LEVEL_RUN_NAME = phaseName + "/" + level.name + secondLevelRun.name
-					picCounts[SECOND_LEVEL_RUN_NAME] = slrPicCount
+					picCounts[SECOND_LEVEL_RUN_NAME] = picCounts.get(SECOND_LEVEL_RUN_NAME, 0) + slrPicCount
 
 					if len(otherDirs) > 0:
 						logging.warning('Additional folder inside second level run folder: "' + secondLevelRun.path + '"')
@@ -47,6 +58,18 @@ def countScreenshotsOnDisk(screenshotFolder: str, pseudonym: str, subFolderName:
 	return picCounts
 
 
+def countScreenshotsInArchive(indexPath: str, picCounts: Dict[str, int]):
+	"""Add the screenshots listed in a screenshot archive index to `picCounts`, using the same keys as 
+	`countScreenshotsOnDisk()`"""
+	for entry in ScreenshotArchive.readIndex(indexPath):
+		phaseName, _, levelName = entry.folder.partition('/')
+		phaseName = phaseName.replace('IntroDrawingTools', PhaseType.DrawTools) # Special case for old logfiles
+
+		# Second level runs are nested inside of the level folder, see above
+		key = phaseName + "/" + (levelName.replace('/', '') if len(levelName) > 0 else '.')
+		picCounts[key] = picCounts.get(key, 0) + 1
+
+
 def countScreenshotsInLog(playerStats: StatsParticipant):
 	targets: Dict[str, int] = {}
 
@@ -85,7 +108,8 @@ def countFiles(path: os.DirEntry[str]) -> Tuple[int, List[os.DirEntry[str]]]:
 	with os.scandir(path) as it:
 		for picOrFolder in it:
 			if picOrFolder.is_file():
-				fileCount += 1
+				if not picOrFolder.name.startswith('.'): # Skip temporary files of the screenshot writer
+					fileCount += 1
 			elif picOrFolder.is_dir():
 				folderList.append(picOrFolder)
 
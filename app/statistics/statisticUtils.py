@@ -1,9 +1,13 @@
 from datetime import datetime, timezone
+import logging
 import math
 
 from typing import Any, Dict, Iterable, List, Optional
 
-from app.utilsGame import LogKeys
+from app.model.Level import OPTIONAL_LEVEL_SUFFIX, Level
+from app.model.LevelLoader.Circuit import getSolutions
+from app.model.LevelLoader.LevelFile import loadLevelFile
+from app.utilsGame import LogKeys, safe_join
 
 
 # Unresolved Bug in Python for Dates with no Timezone set which are close to 01.01.1970
@@ -53,6 +57,29 @@ def calculateIES(numSwitchClicks: int, minSwitchClicks: int, numConfirmClicks: i
 	return timeTakenSeconds / pc
 
 
+def getMinSwitchClicks(levelName: str) -> int:
+	"""Simulate the circuit of a level to get the minimum number of switch clicks. 
+
+	The rolled states of random switches are not logged, therefore -1 is returned for 
+	levels with random switches, levels without a solution or if the file is not found.
+	"""
+	# The logs only contain the uniform level name, which might be missing the file extension
+	for fileName in [levelName, levelName + OPTIONAL_LEVEL_SUFFIX]:
+		try:
+			path = safe_join(Level.getBasePath('level'), fileName)
+			if len(loadLevelFile(path).randomSwitches) > 0:
+				return -1
+
+			return getSolutions(path).minSwitchClicks()
+		except FileNotFoundError:
+			continue
+		except (OSError, ValueError) as e:
+			logging.warning(f'Unable to simulate the circuit of "{levelName}": {e}')
+			return -1
+
+	return -1
+
+
 def parseLogfile(fileLines: Iterable[str]) -> List[Dict[str, Any]]:
 	parsedFile: list[dict[str, Any]] = []
 	entry: dict[str, Any] = {}
@@ -149,10 +149,16 @@ def readLogfiles(folderPath: str, outputPath: str = "statistics.csv", groupFilte
 
 			try:
 				# Sanity check file size
-				if os.path.getsize(os.path.join(folderPath, filePath)) > MAX_LOGFILE_SIZE:
+				fileSize = os.path.getsize(os.path.join(folderPath, filePath))
+				if fileSize > MAX_LOGFILE_SIZE:
 					logging.error("Error: The file \"" + filePath + "\" is way too big!")
 					logStats["exceptionLogs"].append(filePath)
 					continue
+
+				# Skip the empty logfiles of pooled participants, that were never claimed
+				if fileSize == 0:
+					logging.info("Skipping empty \"" + filePath + "\".")
+					continue
 				
 				# Read a single file into a python array containing dict entries
 				logging.debug('')
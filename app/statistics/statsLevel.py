@@ -3,7 +3,7 @@ from typing import Any, Dict, List, Optional, Union, cast
 
 from app.model.Level import ALL_LEVEL_TYPES, LEVEL_FILETYPES_WITH_TASK, REMAP_LEVEL_TYPES
 from app.statistics.staticConfig import EVENT_T, LevelStatus
-from app.statistics.statisticUtils import TIME_NONE, LogSyntaxError, calculateDuration, calculateIES
+from app.statistics.statisticUtils import TIME_NONE, LogSyntaxError, calculateDuration, calculateIES, getMinSwitchClicks
 from app.statistics.staticConfig import ENABLE_SPECIAL_CASES
 from app.utilsGame import X_TRUE, X_FALSE
 
@@ -55,6 +55,12 @@ class StatsLevel():
 			assert isinstance(event['Time'], datetime)
 			self.stats['unloadTime'] = event['Time']
 
+		# The optimum is logged by the client with the level solved dialogue, simulate the 
+		# circuit if it is missing
+		if self.type == 'level' and self.stats['status'] == LevelStatus.SOLVED \
+				and self.stats['minSwitchClicks'] == -1:
+			self.stats['minSwitchClicks'] = getMinSwitchClicks(self.name)
+
 
 	def isTask(self) -> bool:
 		return self.type in LEVEL_FILETYPES_WITH_TASK
@@ -29,6 +29,8 @@ from app.model.LogEvents import (
 	StartSessionEvent,
 	SwitchClickEvent,
 )
+from app.storage.ioExecutor import IOExecutor
+from app.storage.logfileWriter import LOG_ENCODING, LogfileWriter
 from app.utilsGame import (
 	ClickableObjects,
 	EventType,
@@ -44,8 +46,6 @@ from app.utilsGame import (
 import app.config as gameConfig
 
 
-LOG_ENCODING = "UTF-8"
-
 
 class ParticipantLogger:
 	"""Legacy Logger that writes to plaintext files"""
@@ -420,7 +420,7 @@ class ParticipantLogger:
 
 		# Make sure, that even if the player where to send something, it is dropped
 		if self.loggingEnabled:
-			self.writeToDisk(message=message, logPath=self.logPath, create=False)
+			IOExecutor.submit(self.logPath, self.writeToDisk, message, self.logPath, False)
 		
 		return message
 	
@@ -440,6 +440,10 @@ class ParticipantLogger:
 
 	@staticmethod
 	def writeToDisk(message: str, logPath: str, create: bool):
+		# Reuse an open handle from the pool, if enabled
+		if not create and LogfileWriter.enabled:
+			return LogfileWriter.write(logPath, message)
+
 		with open(logPath, 'tx' if create else 'ta', encoding=LOG_ENCODING) as f:
 			return f.write(message)
 		
@@ -447,7 +451,13 @@ class ParticipantLogger:
 
 
 	def logNewPhase(self, timeStamp: Union[str, int], scene: str):
-		return self.writeToLog(EventType.PhaseRequested, '§Scene: ' + scene, timeStamp)
+		message = self.writeToLog(EventType.PhaseRequested, '§Scene: ' + scene, timeStamp)
+
+		# Write out the buffered events of the previous phase
+		if LogfileWriter.enabled:
+			IOExecutor.submit(self.logPath, LogfileWriter.flush, self.logPath)
+
+		return message
 
 
 	def logNewLevel(self, timeStamp: Union[str, int], levelTypeLog: str, fileName: str, randomSwitches: dict[str, int]):
@@ -469,6 +479,23 @@ class ParticipantLogger:
 		return safe_join(cls.baseFolder, "logFile_" + pseudonym + ".txt")
 
 
+	@staticmethod
+	def reserveLogfile(pseudonym: str) -> str:
+		"""Create an empty logfile for a pooled participant, see `ParticipantPool`.
+
+		The header is written when the participant is claimed. Returns the path of the file.
+		"""
+		logPath = ParticipantLogger.getLogfilePath(pseudonym)
+
+		try:
+			os.umask(0o002)
+			ParticipantLogger.writeToDisk(message='', logPath=logPath, create=True)
+			return logPath
+
+		except FileExistsError:
+			raise PseudonymCollision("The pseudonym " + pseudonym + " already exists!")
+
+
 	@staticmethod
 	def getLogfileHeader(pseudonym: str) -> str:
 		msg = "\n§Event: " + EventType.CreatedLog + "\n§Version: " + gameConfig.LOGFILE_VERSION + "\n§Pseudonym: " + pseudonym + \
@@ -479,8 +506,12 @@ class ParticipantLogger:
 
 
 	@staticmethod
-	def createLogfile(pseudonym: str, logPath: str|None = None) -> str:
-		"""Create a logfile for the specified pseudonym."""
+	def createLogfile(pseudonym: str, logPath: str|None = None, create: bool = True) -> str:
+		"""Create a logfile for the specified pseudonym.
+
+		If `create` is False, the header is written to the empty logfile that was reserved
+		with `reserveLogfile()`.
+		"""
 		if logPath is None:
 			logPath = ParticipantLogger.getLogfilePath(pseudonym)
 
@@ -492,7 +523,7 @@ class ParticipantLogger:
 			ParticipantLogger.writeToDisk(
 				message=message,
 				logPath=logPath,
-				create=True
+				create=create
 			)
 			return message
 
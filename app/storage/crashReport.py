@@ -5,7 +5,8 @@ from prometheus_client import Gauge
 
 from app.config import MAX_ERROR_LOGS_PER_PLAYER, PSEUDONYM_LENGTH
 from app.prometheusMetrics import ServerMetrics
-from app.storage.participantsDict import exists
+from app.storage.ioExecutor import IOExecutor
+from app.storage.participantsDict import exists, validatePseudonym
 from app.utilsGame import now
 
 crashReportFile: Optional[TextIOWrapper] = None
@@ -32,13 +33,21 @@ def openCrashReporterFile(filePath: str, p_groupBlacklist: list[str], errorLevel
 
 
 def writeCrashReport(pseudonym: str, group: str, timestamp: int, message: str, stackTrace: str) -> bool:
-	"""Write a crash report to the error log file. Returns true if successful, false otherwise."""
+	"""Write a crash report to the error log file. Returns true if the report was accepted, false otherwise.
+
+	If the `IOExecutor` is enabled, the report is written in the background. A failed write
+	is logged and removed from the crash counter and the Prometheus metric again.
+	"""
 	# Check if crash reports are enabled globally and that this group is no blacklisted
 	if not isCrashReporterEnabled(group):
 		return False
 	else:
 		assert crashReportFile is not None
 
+	# reject malformed pseudonyms, before they are parsed
+	if len(validatePseudonym(pseudonym[:PSEUDONYM_LENGTH])) == 0:
+		return False
+
 	ui_num = int(pseudonym[:PSEUDONYM_LENGTH], base=16)
 	san_pseudonym = hex(ui_num)[2:] # make sure string is a hex number, remove 0x prefix
 	san_timestamp = str(timestamp)
@@ -61,21 +70,31 @@ def writeCrashReport(pseudonym: str, group: str, timestamp: int, message: str, s
 	# Increase the logged errors counter and return success
 	crashCounts[int(pseudonym[:PSEUDONYM_LENGTH], base=16)] += 1
 
+	report = '\n[' + san_timestamp + '] ui=' + san_pseudonym + ':\n' + san_message
+	report += ''.join('\n\t' + l.strip() for l in san_trace) + '\n'
+
 	try:
-		crashReportFile.write('\n[' + san_timestamp + '] ui=' + san_pseudonym + ':\n')
-		crashReportFile.write(san_message)
+		IOExecutor.submit(crashReportFile.name, appendCrashReport, report, onError=lambda e: revokeCrashReport(ui_num, e))
+	except Exception as e:
+		revokeCrashReport(ui_num, e)
+		return False
 
-		for l in san_trace:
-			crashReportFile.write('\n\t' + l.strip())
+	return True
 
-		crashReportFile.write('\n')
-		crashReportFile.flush()
-		return True
 
-	except Exception as e:
-		print('Unable to write crash report: ' + str(e))
-		
-	return False
+def appendCrashReport(report: str):
+	"""Append the formatted report to the error log file (might be called by the `IOExecutor`)"""
+	assert crashReportFile is not None
+
+	crashReportFile.write(report)
+	crashReportFile.flush()
+
+
+def revokeCrashReport(ui_num: int, e: Exception):
+	"""Undo the counters of a crash report that could not be written."""
+	print('Unable to write crash report: ' + str(e))
+	crashCounts[ui_num] -= 1
+	ServerMetrics.decrementCrashMetrics()
 
 
 def isCrashReporterEnabled(groupName: str) -> bool:
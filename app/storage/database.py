@@ -2,22 +2,21 @@ import logging
 import os
 import sqlite3
 import uuid
-from typing import Any, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
 
-from flask import Flask
+from flask import Flask, has_request_context, request
 from flask_alembic import Alembic
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import event
 from sqlalchemy.engine.interfaces import DBAPIConnection
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
 from sqlalchemy.pool import QueuePool
 
+import app.config as gameConfig
 from app.utilsGame import safe_join
 
-# WAL doesn't really make sense since we want our database to be a single file. But the
-# option is there
-ENABLE_WAL = False
-
 # Enable the pysqlite dirty fixes. You might need to disable them to generate a new
 # Alembic revision/release
 SQLITE_HACKS = True
@@ -48,6 +47,31 @@ if SQLITE_HACKS:
 	}
 
 
+# Config key inside the gameConfig.json for the SQLite tuning options. Every option that is
+# not set (or `None`) will not be emitted, so the SQLite default is used. 
+# WAL doesn't really make sense since we want our database to be a single file. But the
+# option is there, see doc/Database.md
+CONFIG_KEY_DATABASE = 'database'
+SQLITE_PRAGMAS: dict[str, tuple[str, Any]] = {
+	# config key: (pragma, allowed values or type)
+	"journalMode": ("journal_mode", ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"]),
+	"synchronous": ("synchronous", ["OFF", "NORMAL", "FULL", "EXTRA"]),
+	"busyTimeout": ("busy_timeout", int), # [ms]
+	"cacheSize": ("cache_size", int), # pages if positive, KiB if negative
+	"mmapSize": ("mmap_size", int), # [bytes]
+}
+
+# The statement that is emitted to start a transaction. Writers acquire the RESERVED lock
+# immediately, so they queue up on the busy timeout instead of failing halfway through the
+# transaction. Read only transactions are deferred and only acquire a SHARED lock, they
+# do not block the players that are currently writing. See `readOnlyTransaction()`
+TRANSACTION_WRITE = "BEGIN IMMEDIATE"
+TRANSACTION_READ = "BEGIN DEFERRED"
+_transactionMode: ContextVar[str] = ContextVar('transactionMode', default=TRANSACTION_WRITE)
+
+# Key inside of `Session.info` to count the commits of the current request
+SESSION_KEY_COMMITS = 'reversimCommits'
+
 # Init the DB
 db: SQLAlchemy = SQLAlchemy(**_sqlalchemy_args)
 
@@ -60,6 +84,12 @@ class ReverSimDatabase:
 	_alembic: Alembic | None = None
 	sqlite_hacks_enabled = False
 
+	# The PRAGMA statements that are emitted for every new connection
+	pragmas: list[str] = []
+
+	# Assert that every request commits at most once (enabled in debug mode)
+	assertSingleCommit = False
+
 	@classmethod
 	def createDatabase(cls, app: Flask):
 		global _alembic, _app
@@ -81,6 +111,8 @@ class ReverSimDatabase:
 		except Exception:
 			logging.exception("Unable to create folder for database!")
 
+		cls.pragmas = cls.loadPragmas(gameConfig.config(CONFIG_KEY_DATABASE, {}))
+		cls.assertSingleCommit = app.debug
 		db.init_app(app)
 
 		try:
@@ -92,6 +124,9 @@ class ReverSimDatabase:
 		# Create or upgrade the database
 		with app.app_context():
 			event.listen(db.engine, "checkout", cls.checkout)
+			event.listen(db.engine, "connect", cls.applyPragmas)
+			event.listen(Session, "before_flush", cls.checkReadOnly)
+			event.listen(Session, "before_commit", cls.checkSingleCommit)
 			ReverSimDatabase.enableSQLiteHacks()
 			db.create_all()
 
@@ -109,6 +144,45 @@ class ReverSimDatabase:
 			dbapi_connection.isolation_level = None # type: ignore
 
 
+	@classmethod
+	def applyPragmas(cls, dbapi_connection: DBAPIConnection, connection_record: Any):
+		"""Apply the SQLite tuning options from the gameConfig to a new connection."""
+		if not isinstance(dbapi_connection, sqlite3.Connection) or len(cls.pragmas) < 1:
+			return
+
+		cursor = dbapi_connection.cursor()
+		for pragma in cls.pragmas:
+			cursor.execute(pragma)
+		cursor.close()
+
+
+	@staticmethod
+	def loadPragmas(settings: dict[str, Any]) -> list[str]:
+		"""Validate the SQLite tuning options and convert them to PRAGMA statements."""
+		pragmas: list[str] = []
+		for key, value in settings.items():
+			if key not in SQLITE_PRAGMAS:
+				logging.warning(f'Unknown database option "{key}" in the gameConfig, ignoring it.')
+				continue
+
+			if value is None:
+				continue
+
+			pragma, allowed = SQLITE_PRAGMAS[key]
+			if isinstance(allowed, list):
+				value = str(value).upper()
+				assert value in allowed, f'Invalid value for database option "{key}", expected one of {allowed}'
+			else:
+				value = allowed(value)
+
+			pragmas.append(f'PRAGMA {pragma}={value}')
+
+		if len(pragmas) > 0:
+			logging.info('SQLite options: ' + ', '.join(pragmas))
+
+		return pragmas
+
+
 	@staticmethod
 	def do_begin(conn: Any):
 		if SQLITE_HACKS:
@@ -116,12 +190,38 @@ class ReverSimDatabase:
 					"Expected the isolation_level to be None, since we are manually emitting our begin" # type: ignore
 
 			# emit our own BEGIN
-			# NOTE: When not in EXCLUSIVE mode, a transaction can later be upgraded to a
-			# write, in which case multiple reads are no longer possible as the other 
+			# NOTE: A deferred transaction that is later upgraded to a write will not wait
+			# for the busy timeout but immediately throws an SQLITE_BUSY error, as the other
 			# transaction might have performed a dirty read and the ACID principle would
-			# be violated. This is probably the reason, why this will not timeout other
-			# transactions but instead immediately throws an SQLITE_BUSY error.
-			conn.exec_driver_sql("BEGIN EXCLUSIVE")
+			# be violated. Therefore everything that might write uses BEGIN IMMEDIATE and
+			# only transactions marked with `readOnlyTransaction()` are deferred.
+			conn.exec_driver_sql(_transactionMode.get())
+
+
+	@staticmethod
+	def checkReadOnly(session: Session, flush_context: Any, instances: Any):
+		"""Catch writes inside of a transaction that was started as read only."""
+		if _transactionMode.get() != TRANSACTION_READ:
+			return
+
+		assert not (session.new or session.dirty or session.deleted), \
+				"Tried to write inside of a read only transaction, remove the readOnlyTransaction() marker"
+
+
+	@classmethod
+	def checkSingleCommit(cls, session: Session):
+		"""Catch stray commits in the middle of a request.
+
+		All changes of a request shall be written with a single commit at the end of the
+		route (use `db.session.flush()` if ids or default values are needed before), so that
+		every request only acquires the write lock and syncs the database file once.
+		"""
+		if not cls.assertSingleCommit or not has_request_context():
+			return
+
+		commits = session.info.get(SESSION_KEY_COMMITS, 0) + 1
+		session.info[SESSION_KEY_COMMITS] = commits
+		assert commits <= 1, f'The request "{request.path}" committed {commits} times, use db.session.flush() instead'
 
 
 	@staticmethod
@@ -203,21 +303,32 @@ class ReverSimDatabase:
 				("There is a long standing bug in the Pysqlite driver, which violates SQLites"
 				"ability to enforce the ACID principles. While it is fixed in theory with "
 				"Python 3.12, we still have to resort to the legacy transaction control, as"
-				"there is no way with the new `autocommit=False` settings to enforce "
-				"`BEGIN EXCLUSIVE`...")
+				"there is no way with the new `autocommit=False` settings to choose "
+				"between `BEGIN IMMEDIATE` and `BEGIN DEFERRED`...")
 			dbapi_connection.isolation_level = None # type: ignore
 			
 		cls.sqlite_hacks_enabled = True
 
 
-	@classmethod
-	def pre_db_connect(cls, dbapi_connection: DBAPIConnection, connection_record: Any):
-		""""""
-		# Turn on Write Ahead Logging
-		if ENABLE_WAL:
-			cursor = dbapi_connection.cursor()
-			cursor.execute("PRAGMA journal_mode=WAL")
-			cursor.close()
+@contextmanager
+def readOnlyTransaction() -> Iterator[None]:
+	"""Start all transactions inside of this block as deferred (read only) transactions.
+
+	Can be used as a context manager or as a decorator for routes that only read from the
+	database. The mode must be set before the first query, since the transaction is started
+	lazily by SQLAlchemy and lasts until the end of the request/app context.
+
+	```python
+	@routerGame.route('/game')
+	@readOnlyTransaction()
+	def redirectToGame():
+	```
+	"""
+	token = _transactionMode.set(TRANSACTION_READ)
+	try:
+		yield
+	finally:
+		_transactionMode.reset(token)
 
 
 class SanityVersion:
@@ -0,0 +1,259 @@
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Client, Connection, Listener
+from typing import TYPE_CHECKING, Any, Optional
+
+from flask import Flask
+
+import app.config as gameConfig
+from app.storage.database import db
+from app.utilsGame import safe_join
+
+if TYPE_CHECKING:
+	from app.model.LogEvents import LogEvent
+
+
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_DATABASE_WRITER = 'databaseWriter'
+DEFAULT_SOCKET = 'statistics/dbwriter.sock' # relative to the instance folder
+DEFAULT_GROUP_COMMIT_WINDOW = 0.005 # [s] Time to wait for other workers to join a commit
+DEFAULT_MAX_GROUP_SIZE = 1024 # Max number of events written in a single transaction
+DEFAULT_ACK_TIMEOUT = 10.0 # [s] How long a worker waits for the writer to commit a batch
+
+# The writer remembers the ids of this many committed batches, to ignore batches that are sent again
+MAX_COMMITTED_BATCHES = 65536
+
+AUTHKEY_FILE = 'dbwriter.key' # Stored inside the secrets folder
+
+# A batch and the connection of the worker that sent it
+Pending = tuple[Connection, str, list['LogEvent']]
+
+
+class BatchInDoubt(Exception):
+	"""The batch was sent to the writer, but the writer did not acknowledge it in time.
+
+	The batch might already be committed. It must be sent again with the same id and must
+	not be written by the worker itself.
+	"""
+
+
+class DatabaseWriter:
+	"""Optional single writer process for the log events.
+
+	When enabled, the uWSGI workers do not insert their buffered events (see `EventBuffer`)
+	themselves, but send them over a local Unix socket to one dedicated writer process.
+	The writer collects the batches of all workers for `groupCommitWindow` seconds and
+	writes them in one transaction (group commit), so many requests share one exclusive
+	lock and one fsync. A worker will only continue after its batch was committed.
+
+	Every batch is tagged with an id. The writer remembers the ids of the committed batches
+	and only acknowledges a batch that is sent again, so a batch whose acknowledgement was
+	lost can safely be retried. The workers only write the events themselves, if the batch
+	could not be sent or the writer reported that the commit failed.
+
+	NOTE: The committed ids are kept in memory. A batch that was committed right before the
+	writer was restarted and is sent again afterwards will be written twice.
+
+	Start the writer with `flask --app gameServer db-writer`.
+	"""
+
+	enabled = False
+	socketPath = DEFAULT_SOCKET
+	groupCommitWindow = DEFAULT_GROUP_COMMIT_WINDOW
+	maxGroupSize = DEFAULT_MAX_GROUP_SIZE
+	ackTimeout = DEFAULT_ACK_TIMEOUT
+	authkeyPath = ''
+
+	# Client side connection, one per worker process
+	_connection: Optional[Connection] = None
+	_connectionPid: int = -1
+	_connectionLock = threading.Lock()
+
+
+	@classmethod
+	def init(cls, app: Flask):
+		"""Read the settings from the gameConfig."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_DATABASE_WRITER, {})
+		cls.enabled = bool(settings.get('enabled', False))
+
+		cls.socketPath = safe_join(app.instance_path, settings.get('socket', DEFAULT_SOCKET))
+		cls.groupCommitWindow = float(settings.get('groupCommitWindow', DEFAULT_GROUP_COMMIT_WINDOW))
+		cls.maxGroupSize = int(settings.get('maxGroupSize', DEFAULT_MAX_GROUP_SIZE))
+		cls.ackTimeout = float(settings.get('ackTimeout', DEFAULT_ACK_TIMEOUT))
+		cls.authkeyPath = safe_join(app.instance_path, 'secrets', AUTHKEY_FILE)
+		assert cls.groupCommitWindow >= 0, "databaseWriter.groupCommitWindow must not be negative"
+		assert cls.maxGroupSize > 0, "databaseWriter.maxGroupSize must be greater than 0"
+		assert cls.ackTimeout > 0, "databaseWriter.ackTimeout must be greater than 0"
+
+		if cls.enabled:
+			logging.info(f'Sending the buffered events to the database writer at "{cls.socketPath}"')
+
+
+	# +----------------------------+
+	# |        Worker side         |
+	# +----------------------------+
+
+	@classmethod
+	def send(cls, events: list['LogEvent'], batchID: str) -> bool:
+		"""Send a batch of events to the writer process and wait until they are committed.
+
+		Returns `False` if the batch could not be sent or the writer failed to write the
+		events, in which case the caller is responsible for writing the events. Raises
+		`BatchInDoubt` if the writer did not answer within `ackTimeout` seconds.
+		"""
+		with cls._connectionLock:
+			try:
+				conn = cls._connect()
+				conn.send((batchID, events))
+			except Exception as e:
+				logging.warning(f'Database writer unavailable, writing events locally: "{e}"')
+				cls._disconnect()
+				return False
+
+			try:
+				if not conn.poll(cls.ackTimeout):
+					raise TimeoutError(f'No answer within {cls.ackTimeout}s')
+				success = conn.recv()
+			except Exception as e:
+				# The answer of a late writer must not be mistaken for the answer to the next batch
+				cls._disconnect()
+				raise BatchInDoubt(f'The database writer did not acknowledge batch {batchID}: "{e}"') from e
+
+			if not success:
+				logging.warning("The database writer failed to commit the events, writing them locally.")
+
+			return success
+
+
+	@classmethod
+	def _connect(cls) -> Connection:
+		"""Get the connection to the writer, (re)connect if this process was forked."""
+		if cls._connection is None or cls._connectionPid != os.getpid():
+			with open(cls.authkeyPath, 'rb') as f:
+				authkey = f.read()
+
+			cls._connection = Client(cls.socketPath, family='AF_UNIX', authkey=authkey)
+			cls._connectionPid = os.getpid()
+
+		return cls._connection
+
+
+	@classmethod
+	def _disconnect(cls):
+		if cls._connection is not None and cls._connectionPid == os.getpid():
+			try:
+				cls._connection.close()
+			except Exception:
+				pass
+
+		cls._connection = None
+
+
+	# +----------------------------+
+	# |        Writer side         |
+	# +----------------------------+
+
+	@classmethod
+	def serve(cls, app: Flask):
+		"""Run the writer process. This will block forever."""
+		# Create a new key on every start, the workers will read it when they (re)connect
+		os.makedirs(os.path.dirname(cls.authkeyPath), exist_ok=True)
+		authkey = secrets.token_bytes(32)
+		with open(cls.authkeyPath, 'wb') as f:
+			f.write(authkey)
+		os.chmod(cls.authkeyPath, 0o600)
+
+		# Remove the socket of a previous run
+		if os.path.exists(cls.socketPath):
+			os.remove(cls.socketPath)
+
+		pending: 'queue.Queue[Pending]' = queue.Queue()
+		committed: OrderedDict[str, None] = OrderedDict()
+		listener = Listener(cls.socketPath, family='AF_UNIX', authkey=authkey)
+		logging.info(f'Database writer listening on "{cls.socketPath}"')
+
+		thread = threading.Thread(target=cls._accept, args=(listener, pending), name="DatabaseWriterAccept")
+		thread.daemon = True
+		thread.start()
+
+		while True:
+			cls._groupCommit(app, pending, committed)
+
+
+	@staticmethod
+	def _accept(listener: Listener, pending: 'queue.Queue[Pending]'):
+		"""Accept new worker connections and start a receiver thread for each of them."""
+		while True:
+			try:
+				conn = listener.accept()
+			except Exception as e:
+				logging.error(f'Database writer rejected a connection: "{e}"')
+				continue
+
+			thread = threading.Thread(target=DatabaseWriter._receive, args=(conn, pending))
+			thread.daemon = True
+			thread.start()
+
+
+	@staticmethod
+	def _receive(conn: Connection, pending: 'queue.Queue[Pending]'):
+		"""Forward all batches of one worker to the commit loop."""
+		try:
+			while True:
+				batchID, events = conn.recv()
+				pending.put((conn, batchID, events))
+		except (EOFError, OSError):
+			conn.close()
+
+
+	@classmethod
+	def _groupCommit(cls, app: Flask, pending: 'queue.Queue[Pending]', committed: OrderedDict[str, None]):
+		"""Wait for the first batch, collect all batches that arrive within the group commit
+		window and write them in one transaction. Afterwards notify every sender.
+
+		Batches that were already committed are only acknowledged, `committed` holds their ids.
+		"""
+		group = [pending.get()]
+		numEvents = len(group[0][2])
+		deadline = time.perf_counter() + cls.groupCommitWindow
+
+		while numEvents < cls.maxGroupSize:
+			try:
+				group.append(pending.get(timeout=max(0, deadline - time.perf_counter())))
+				numEvents += len(group[-1][2])
+			except queue.Empty:
+				break
+
+		newBatches: dict[str, list['LogEvent']] = {}
+		for _, batchID, events in group:
+			if batchID not in committed:
+				newBatches.setdefault(batchID, events)
+
+		success = True
+		with app.app_context():
+			try:
+				for events in newBatches.values():
+					db.session.add_all(events)
+				db.session.commit()
+
+			except Exception as e:
+				db.session.rollback()
+				logging.exception(f'Database writer failed to write {numEvents} events: "{e}"')
+				success = False
+
+		if success:
+			for batchID in newBatches:
+				committed[batchID] = None
+			while len(committed) > MAX_COMMITTED_BATCHES:
+				committed.popitem(last=False)
+
+		for conn, batchID, _ in group:
+			try:
+				conn.send(batchID in committed)
+			except Exception as e:
+				logging.error(f'Database writer could not acknowledge a batch: "{e}"')
@@ -0,0 +1,258 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Optional
+
+from flask import Flask
+from flask.ctx import AppContext
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+import app.config as gameConfig
+from app.storage.database import db
+from app.storage.databaseWriter import BatchInDoubt, DatabaseWriter
+
+if TYPE_CHECKING:
+	from app.model.LogEvents import LogEvent
+
+
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_EVENT_BUFFER = 'eventBuffer'
+DEFAULT_BATCH_SIZE = 64 # Flush after this many events have been queued
+DEFAULT_FLUSH_INTERVAL = 1.0 # [s] Flush at least this often, if events are queued
+DEFAULT_MAX_QUEUE_SIZE = 4096 # Upper bound for the number of events held in memory
+DEFAULT_BLOCK_TIMEOUT = 0.5 # [s] How long a request waits for a free slot in a full queue
+
+
+class EventBuffer:
+	"""Opt-in write-behind buffer for `LogEvent` rows.
+
+	Instead of adding every event to the request session (and therefore to the request
+	transaction, which holds the database write lock), the events are queued in memory
+	and bulk inserted in batches by a background thread. The events of a request are only
+	queued after the request transaction was committed, see `ContextCache.afterCommit()`.
+	A batch is written when `batchSize` events are queued or `flushInterval` seconds have
+	passed, whatever comes first. All remaining events are written when the process exits.
+
+	The queue is bounded by `maxQueueSize`. When it is full, the request wakes the flush
+	thread and waits up to `blockTimeout` seconds for a free slot. Afterwards the remaining
+	events of the request are written right away in their own transaction, as if the buffer
+	was disabled. The request never flushes the queue itself.
+
+	A batch that could not be written is kept and written before all other events on the
+	next flush, so no events are dropped if the database is busy.
+
+	NOTE: The buffer is per process. Every uWSGI worker will run its own flush thread. If
+	the `DatabaseWriter` is enabled, the batches are send to the writer process instead.
+	"""
+
+	enabled = False
+	batchSize = DEFAULT_BATCH_SIZE
+	flushInterval = DEFAULT_FLUSH_INTERVAL
+	blockTimeout = DEFAULT_BLOCK_TIMEOUT
+
+	# Statistics for the Prometheus metrics, see `ServerMetrics.threaded_task()`
+	lastFlushLatency: float = 0.0 # [s]
+
+	_queue: 'queue.Queue[LogEvent]' = queue.Queue()
+	_retry: list['LogEvent'] = [] # The last batch, if it could not be written
+	_retryID: Optional[str] = None # Id of the batch for the `DatabaseWriter`
+	_retryInDoubt = False # The batch might have been committed by the `DatabaseWriter`
+	_wakeup = threading.Event()
+	_flushLock = threading.Lock()
+	_appContext: Optional[AppContext] = None
+
+
+	@classmethod
+	def init(cls, app: Flask):
+		"""Read the settings from the gameConfig and start the flush thread, if enabled."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_EVENT_BUFFER, {})
+		cls.enabled = bool(settings.get('enabled', False)) or DatabaseWriter.enabled
+		if not cls.enabled:
+			return
+
+		cls.batchSize = int(settings.get('batchSize', DEFAULT_BATCH_SIZE))
+		cls.flushInterval = float(settings.get('flushInterval', DEFAULT_FLUSH_INTERVAL))
+		maxQueueSize = int(settings.get('maxQueueSize', DEFAULT_MAX_QUEUE_SIZE))
+		cls.blockTimeout = float(settings.get('blockTimeout', DEFAULT_BLOCK_TIMEOUT))
+		assert cls.batchSize > 0, "eventBuffer.batchSize must be greater than 0"
+		assert cls.flushInterval > 0, "eventBuffer.flushInterval must be greater than 0"
+		assert maxQueueSize >= cls.batchSize, "eventBuffer.maxQueueSize must be at least batchSize"
+		assert cls.blockTimeout >= 0, "eventBuffer.blockTimeout must not be negative"
+
+		cls._queue = queue.Queue(maxsize=maxQueueSize)
+		cls._appContext = app.app_context()
+
+		thread = threading.Thread(target=cls.threaded_task, name="EventBuffer")
+		thread.daemon = True
+		thread.start()
+
+		# Write all pending events to the database, when the worker is stopped
+		atexit.register(cls.flush)
+
+		logging.info(f'Event buffer enabled (batch size: {cls.batchSize}, interval: {cls.flushInterval}s, max queue: {maxQueueSize})')
+
+
+	@classmethod
+	def putAll(cls, events: list['LogEvent']):
+		"""Queue the events of a committed transaction for insertion into the database.
+
+		The events must be detached with `detach()` before the commit. If the queue is full,
+		the remaining events are written in a new transaction.
+		"""
+		for i, event in enumerate(events):
+			if not cls.put(event):
+				cls.write(events[i:])
+				return
+
+
+	@classmethod
+	def put(cls, event: 'LogEvent') -> bool:
+		"""Queue a detached event for insertion into the database.
+
+		Returns `False` if the queue is still full after `blockTimeout` seconds.
+		"""
+		try:
+			cls._queue.put_nowait(event)
+		except queue.Full:
+			# Backpressure: Let the flush thread make room and wait for it
+			cls._wakeup.set()
+			try:
+				cls._queue.put(event, timeout=cls.blockTimeout)
+			except queue.Full:
+				return False
+
+		if cls._queue.qsize() >= cls.batchSize:
+			cls._wakeup.set()
+
+		return True
+
+
+	@staticmethod
+	def write(events: list['LogEvent']):
+		"""Write the events in a new transaction, bypassing the full queue.
+
+		Called after the request transaction was committed, when the request session can
+		no longer be used.
+		"""
+		logging.warning(f'Event buffer is full, writing {len(events)} events with a separate transaction.')
+		try:
+			with Session(db.engine) as session:
+				session.add_all(events)
+				session.commit()
+		except Exception as e:
+			logging.exception(f'Unable to write {len(events)} events to the database: "{e}"')
+
+
+	@staticmethod
+	def detach(event: 'LogEvent'):
+		"""Replace the player/phase/level relationships with their primary keys, so that the
+		event can be inserted with another session after the request session was closed.
+
+		`set_committed_value()` does not create any history, therefore SQLAlchemy will
+		not overwrite the foreign key columns when the event is flushed.
+		"""
+		for relation, foreignKey, primaryKey in [
+			('player', 'pseudonym', 'pseudonym'),
+			('phase', 'phase_id', 'activePhase'),
+			('level', 'level_name', 'levelName'),
+		]:
+			context = event.__dict__.get(relation, None)
+			if context is None:
+				continue
+
+			setattr(event, foreignKey, getattr(context, primaryKey))
+			set_committed_value(event, relation, None)
+
+
+	@classmethod
+	def depth(cls) -> int:
+		"""The number of events that are waiting to be written to the database."""
+		return cls._queue.qsize() + len(cls._retry)
+
+
+	@classmethod
+	def threaded_task(cls):
+		while True:
+			cls._wakeup.wait(timeout=cls.flushInterval)
+			cls._wakeup.clear()
+
+			try:
+				cls.flush()
+			except Exception as e:
+				logging.exception(f'Failed to flush the event buffer: "{e}"')
+
+
+	@classmethod
+	def flush(cls):
+		"""Write all queued events to the database, `batchSize` events per transaction.
+
+		If a batch can not be written, it is kept for the next flush and the error is raised.
+		"""
+		assert cls._appContext is not None, "The event buffer was never initialized"
+
+		with cls._flushLock:
+			while len(cls._retry) > 0 or not cls._queue.empty():
+				# Write the batch that failed last time first and unchanged, to keep the events
+				# in order and so that the `DatabaseWriter` can recognize it
+				batch = cls._retry
+				if cls._retryID is None:
+					while len(batch) < cls.batchSize:
+						try:
+							batch.append(cls._queue.get_nowait())
+						except queue.Empty:
+							break
+
+					cls._retry = batch
+					cls._retryID = uuid.uuid4().hex
+
+				start = time.perf_counter()
+
+				# Let the single writer process do the insert, if enabled
+				if DatabaseWriter.enabled:
+					try:
+						written = DatabaseWriter.send(batch, cls._retryID)
+					except BatchInDoubt:
+						cls._retryInDoubt = True
+						raise
+
+					if written:
+						cls.resetBatch()
+						cls.lastFlushLatency = time.perf_counter() - start
+						continue
+
+					# Only the writer knows, if a batch in doubt was committed. Resend it later
+					if cls._retryInDoubt:
+						raise BatchInDoubt(f'Unable to resend batch {cls._retryID} to the database writer')
+
+				with cls._appContext:
+					try:
+						db.session.add_all(batch)
+						db.session.commit()
+					except Exception:
+						db.session.rollback()
+						cls.resetPrimaryKeys(batch)
+						logging.error(f'Unable to write {len(batch)} buffered events to the database, retrying on the next flush.')
+						raise
+
+				cls.resetBatch()
+				cls.lastFlushLatency = time.perf_counter() - start
+
+
+	@classmethod
+	def resetBatch(cls):
+		"""The batch was written, the next flush takes a new batch from the queue."""
+		cls._retry = []
+		cls._retryID = None
+		cls._retryInDoubt = False
+
+
+	@staticmethod
+	def resetPrimaryKeys(batch: list['LogEvent']):
+		"""The rollback keeps the ids that were assigned by the failed insert. They might be
+		taken by other events in the meantime, so let the database assign new ones."""
+		for event in batch:
+			event.id = None # type: ignore
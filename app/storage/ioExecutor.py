@@ -0,0 +1,186 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Optional
+
+import app.config as gameConfig
+
+
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_IO_EXECUTOR = 'ioExecutor'
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE_SIZE = 1024 # Max number of pending writes per worker
+DEFAULT_BLOCK_TIMEOUT = 0.5 # [s] How long a request waits for a free slot in a full queue
+
+# Max time to wait for the pending writes when the process exits or forks
+DRAIN_TIMEOUT = 10 # [s]
+
+# A task is the callable, its arguments, the error callback and the time it was submitted
+ErrorCallback = Callable[[Exception], None]
+Task = tuple[Callable[..., Any], tuple[Any, ...], Optional[ErrorCallback], float]
+
+
+class IOExecutor:
+	"""Opt-in background threads for the legacy logfile, screenshot and crash report I/O.
+
+	The writers submit their file operations instead of executing them on the request
+	thread. Every file is assigned to one of `workers` threads by hashing its path, so all
+	writes to the same file are executed in the order they were submitted.
+
+	Each worker has a bounded queue of `maxQueueSize` tasks. If the queue is full, the
+	request waits for up to `blockTimeout` seconds and then writes the file itself, so the
+	memory usage stays bounded and no event is dropped. The pending writes are drained
+	when the process exits or before it forks.
+
+	NOTE: Errors can no longer be reported to the client. A writer can pass an `onError`
+	callback to log the failure and undo its bookkeeping, otherwise the error is only logged.
+	"""
+
+	enabled = False
+	workers = DEFAULT_WORKERS
+	maxQueueSize = DEFAULT_MAX_QUEUE_SIZE
+	blockTimeout = DEFAULT_BLOCK_TIMEOUT
+
+	# Time between submit and completion of the last task, for the Prometheus metrics
+	lastLatency = 0.0 # [s]
+
+	_queues: list['queue.Queue[Optional[Task]]'] = []
+	_lock = threading.Lock()
+	_pid = -1 # The process that owns the worker threads
+
+
+	@classmethod
+	def init(cls):
+		"""Read the settings from the gameConfig."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_IO_EXECUTOR, {})
+		cls.enabled = bool(settings.get('enabled', False))
+		if not cls.enabled:
+			return
+
+		cls.workers = int(settings.get('workers', DEFAULT_WORKERS))
+		cls.maxQueueSize = int(settings.get('maxQueueSize', DEFAULT_MAX_QUEUE_SIZE))
+		cls.blockTimeout = float(settings.get('blockTimeout', DEFAULT_BLOCK_TIMEOUT))
+		assert cls.workers > 0, "ioExecutor.workers must be greater than 0"
+		assert cls.maxQueueSize > 0, "ioExecutor.maxQueueSize must be greater than 0"
+		assert cls.blockTimeout >= 0, "ioExecutor.blockTimeout must not be negative"
+
+		if hasattr(os, 'register_at_fork'): # Not available on Windows
+			os.register_at_fork(before=cls.drain, after_in_child=cls._resetAfterFork)
+		atexit.register(cls.drain)
+
+		logging.info(f'I/O executor enabled (workers: {cls.workers}, max queue size: {cls.maxQueueSize})')
+
+
+	@classmethod
+	def submit(cls, path: str, fn: Callable[..., Any], *args: Any, onError: Optional[ErrorCallback] = None):
+		"""Execute `fn(*args)` on the worker thread that is responsible for `path`.
+
+		The function is executed immediately, if the executor is disabled or the queue of
+		the worker is still full after `blockTimeout` seconds. In this case an exception is
+		raised to the caller. If `fn` fails on the worker thread, `onError` is called with
+		the exception on the worker thread.
+		"""
+		if not cls.enabled:
+			fn(*args)
+			return
+
+		cls._checkProcess()
+		lane = cls._queues[zlib.crc32(path.encode()) % len(cls._queues)]
+
+		try:
+			lane.put((fn, args, onError, time.monotonic()), timeout=cls.blockTimeout)
+		except queue.Full:
+			logging.warning(f'The I/O queue is full, writing "{path}" on the request thread')
+			cls._waitForLane(lane)
+			fn(*args)
+
+
+	@classmethod
+	def depth(cls) -> int:
+		"""The number of writes that are waiting to be executed in this process."""
+		return sum(q.qsize() for q in cls._queues)
+
+
+	@classmethod
+	def drain(cls):
+		"""Block until all pending writes of this process are executed."""
+		if cls._pid != os.getpid():
+			return
+
+		deadline = time.monotonic() + DRAIN_TIMEOUT
+		for lane in cls._queues:
+			if not cls._waitForLane(lane, deadline - time.monotonic()):
+				logging.error(f'Timeout while waiting for {lane.qsize()} pending writes')
+
+
+	@classmethod
+	def threaded_task(cls, lane: 'queue.Queue[Optional[Task]]'):
+		while True:
+			task = lane.get()
+			if task is None:
+				lane.task_done()
+				return
+
+			fn, args, onError, submitted = task
+			try:
+				fn(*args)
+			except Exception as e:
+				logging.exception(f'Background write "{getattr(fn, "__qualname__", fn)}" failed')
+				if onError is not None:
+					cls._callSafe(onError, e)
+			finally:
+				cls.lastLatency = time.monotonic() - submitted
+				lane.task_done()
+
+
+	@staticmethod
+	def _callSafe(onError: ErrorCallback, e: Exception):
+		try:
+			onError(e)
+		except Exception:
+			logging.exception('The error callback of a background write failed')
+
+
+	@classmethod
+	def _waitForLane(cls, lane: 'queue.Queue[Optional[Task]]', timeout: float = DRAIN_TIMEOUT) -> bool:
+		"""Wait until the lane is empty, so that the following writes stay in order."""
+		deadline = time.monotonic() + timeout
+		with lane.all_tasks_done:
+			while lane.unfinished_tasks > 0:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					return False
+				lane.all_tasks_done.wait(remaining)
+
+		return True
+
+
+	@classmethod
+	def _checkProcess(cls):
+		"""Start the worker threads on the first write of this process."""
+		if cls._pid == os.getpid():
+			return
+
+		with cls._lock:
+			if cls._pid == os.getpid():
+				return
+
+			# The tasks of the parent process are executed by the parent
+			cls._queues = [queue.Queue(maxsize=cls.maxQueueSize) for _ in range(cls.workers)]
+			for i, lane in enumerate(cls._queues):
+				thread = threading.Thread(target=cls.threaded_task, args=(lane,), name=f"IOExecutor-{i}")
+				thread.daemon = True
+				thread.start()
+
+			cls._pid = os.getpid()
+
+
+	@classmethod
+	def _resetAfterFork(cls):
+		cls._lock = threading.Lock()
+		cls._queues = []
+		cls._pid = -1
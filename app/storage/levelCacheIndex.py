@@ -0,0 +1,191 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterator, Optional
+
+from flask import Flask
+
+import app.config as gameConfig
+from app.model.Level import CachedLevel, Level
+from app.model.LevelLoader.JsonLevelList import JsonLevelList, LeanSlide
+from app.model.LevelLoader.LevelFile import PARSER_VERSION
+from app.model.LevelLoader.LevelLoader import LevelLoader
+from app.utilsGame import LevelType, safe_join
+
+try:
+	import fcntl
+except ImportError: # Windows
+	fcntl = None
+
+
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_LEVEL_CACHE = 'levelCache'
+DEFAULT_FILE = 'statistics/levelCache.json' # relative to the instance folder
+DEFAULT_PROCESSES = None # Number of CPUs
+
+# Parse the level files in a process pool, if more than this number of files changed
+MIN_FILES_PROCESS_POOL = 32
+
+# The index is discarded when the format, the parser or the cached fields change
+INDEX_VERSION = f'2:{PARSER_VERSION}:{",".join(CachedLevel._fields)}'
+
+
+class LevelCacheIndex:
+	"""Opt-in warm-up of `Level.levelCache` when the server starts.
+
+	By default, the first player that reaches a level has to read and parse the level
+	file, and every server worker repeats this. If enabled, all levels referenced by
+	the level lists are parsed at startup, in a process pool if many files changed, and
+	their circuits are solved.
+	The results are stored in an index file keyed by the level file name, mtime and size,
+	so the next start (and every other worker) only parses files that were changed.
+
+	If the index is loaded before the workers are forked, they inherit the cache.
+	"""
+
+	enabled = False
+	processes: Optional[int] = DEFAULT_PROCESSES
+
+
+	@classmethod
+	def init(cls, app: Flask):
+		"""Read the settings from the gameConfig and fill the level cache, if enabled."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_LEVEL_CACHE, {})
+		cls.enabled = bool(settings.get('warmUp', False))
+		if not cls.enabled:
+			return
+
+		processes = settings.get('processes', DEFAULT_PROCESSES)
+		cls.processes = int(processes) if processes is not None else None
+		assert cls.processes is None or cls.processes > 0, "levelCache.processes must be greater than 0"
+
+		path = safe_join(app.instance_path, settings.get('file', DEFAULT_FILE))
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+
+		try:
+			cls.warmUp(path)
+		except Exception as e:
+			logging.exception(f'Unable to warm up the level cache: {e}')
+
+
+	@classmethod
+	def warmUp(cls, indexPath: str):
+		"""Load the index, parse all new or changed level files and write the index back."""
+		start = time.perf_counter()
+		basePath = Level.getBasePath(LevelType.LEVEL)
+
+		# Only one worker shall parse the levels, the others wait and read the updated index
+		with open(indexPath + '.lock', 'a') as lock:
+			if fcntl is not None:
+				fcntl.flock(lock.fileno(), fcntl.LOCK_EX) # Released on close
+
+			index = cls.loadIndex(indexPath)
+			changed: dict[str, list[int]] = {}
+
+			for fileName in sorted(set(cls.referencedLevels())):
+				try:
+					stat = os.stat(safe_join(basePath, fileName))
+				except OSError as e:
+					logging.debug(f'Level "{fileName}" is referenced by a level list, but can not be read: {e}')
+					continue
+
+				level = cls.cachedEntry(index.get(fileName, None), stat)
+				if level is not None:
+					Level.levelCache[fileName] = level
+				else:
+					changed[fileName] = [stat.st_mtime_ns, stat.st_size]
+
+			for fileName, level in zip(changed.keys(), cls.parse([safe_join(basePath, f) for f in changed])):
+				if level is None:
+					continue
+
+				Level.levelCache[fileName] = level
+				index[fileName] = {
+					'mtime': changed[fileName][0],
+					'size': changed[fileName][1],
+					**level._asdict()
+				}
+
+			if len(changed) > 0:
+				cls.writeIndex(indexPath, index)
+
+		# Solve the circuits as well, so that finishing a level does not read the level file
+		for fileName in Level.levelCache:
+			Level.getSolutions(fileName)
+
+		logging.info(f'Level cache: {len(Level.levelCache)} levels, {len(changed)} parsed ({(time.perf_counter() - start)*1000:.0f} ms)')
+
+
+	@staticmethod
+	def cachedEntry(entry: Optional[dict[str, Any]], stat: os.stat_result) -> Optional[CachedLevel]:
+		"""The cached level of an index entry, or `None` if the file changed or the entry is incomplete."""
+		try:
+			if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+				return None
+
+			return CachedLevel(**{k: entry[k] for k in CachedLevel._fields})
+		except (KeyError, TypeError):
+			return None
+
+
+	@classmethod
+	def parse(cls, paths: list[str]) -> list[Optional[CachedLevel]]:
+		"""Parse the level files, using a process pool if there are many."""
+		if len(paths) < MIN_FILES_PROCESS_POOL or 'fork' not in multiprocessing.get_all_start_methods():
+			return [cls._parseSafe(p) for p in paths]
+
+		# Fork the pool, since spawning would import the server (or uWSGI) again
+		ctx = multiprocessing.get_context('fork')
+		with ProcessPoolExecutor(max_workers=cls.processes, mp_context=ctx) as pool:
+			return list(pool.map(cls._parseSafe, paths, chunksize=8))
+
+
+	@staticmethod
+	def _parseSafe(path: str) -> Optional[CachedLevel]:
+		try:
+			return LevelLoader.parseLevelFile(path)
+		except Exception as e:
+			logging.error(f'Exception while generating level cache for "{path}": {e}')
+			return None
+
+
+	@staticmethod
+	def referencedLevels() -> Iterator[str]:
+		"""Yield the file names of all levels in all level lists of `levelList.json`."""
+		assert isinstance(JsonLevelList.singleton, dict), "The JsonLevelList cache was not populated"
+
+		for levelList in JsonLevelList.singleton.values():
+			for entry in levelList.levels:
+				for slide in entry.values() if not isinstance(entry, LeanSlide) else [entry]:
+					if slide.slideType == LevelType.LEVEL:
+						yield slide.fileName
+
+
+	@staticmethod
+	def loadIndex(indexPath: str) -> dict[str, Any]:
+		try:
+			with open(indexPath, 'r', encoding='UTF-8') as f:
+				index = json.load(f)
+
+			if index.get('version') == INDEX_VERSION:
+				return index['levels']
+
+		except FileNotFoundError:
+			pass
+		except Exception as e:
+			logging.warning(f'Ignoring the invalid level cache index "{indexPath}": {e}')
+
+		return {}
+
+
+	@staticmethod
+	def writeIndex(indexPath: str, levels: dict[str, Any]):
+		"""Replace the index atomically, so a crash never leaves a partial file."""
+		tmpPath = indexPath + '.tmp'
+		with open(tmpPath, 'w', encoding='UTF-8') as f:
+			json.dump({'version': INDEX_VERSION, 'levels': levels}, f)
+
+		os.replace(tmpPath, indexPath)
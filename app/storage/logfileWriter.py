@@ -0,0 +1,213 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import IO, Any
+
+import app.config as gameConfig
+
+
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_LOGFILE_WRITER = 'logfileWriter'
+DEFAULT_MAX_OPEN_FILES = 256 # The least recently used logfile is closed if exceeded
+DEFAULT_FLUSH_INTERVAL = 1.0 # [s]
+DEFAULT_DURABILITY = 'flush'
+
+# How far an event is written before `write()` returns, see doc/GameConfig.md
+DURABILITY_BUFFERED = 'buffered' # Python buffer, flushed every `flushInterval` and on phase change
+DURABILITY_FLUSH = 'flush' # Handed to the operating system after every event
+DURABILITY_FSYNC = 'fsync' # Synced to the disk after every event
+DURABILITY_MODES = [DURABILITY_BUFFERED, DURABILITY_FLUSH, DURABILITY_FSYNC]
+
+LOG_ENCODING = "UTF-8"
+
+
+class LogfileWriter:
+	"""Opt-in pool of open append handles for the legacy logfiles.
+
+	Instead of opening and closing `logFile_<pseudonym>.txt` for every event, the handles
+	are kept open in a LRU pool of at most `maxOpenFiles` files. A background thread flushes
+	the buffered events every `flushInterval` seconds and closes the files that have not
+	been written for `STALE_LOGFILE_TIME`.
+
+	The pool is per process. All buffers are flushed before the process forks and the
+	child drops the inherited handles without writing their buffers, so an event is never
+	written twice.
+
+	NOTE: Multiple workers might append to the logfile of the same player. With the
+	`buffered` durability, events are only guaranteed to be in order per worker.
+	"""
+
+	enabled = False
+	maxOpenFiles = DEFAULT_MAX_OPEN_FILES
+	flushInterval = DEFAULT_FLUSH_INTERVAL
+	durability = DEFAULT_DURABILITY
+
+	_files: 'OrderedDict[str, tuple[IO[str], float]]' = OrderedDict() # path -> (file, last write)
+	_lock = threading.RLock()
+	_pid = -1 # The process that owns the pool and the flush thread
+
+
+	@classmethod
+	def init(cls):
+		"""Read the settings from the gameConfig."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_LOGFILE_WRITER, {})
+		cls.enabled = bool(settings.get('enabled', False))
+		if not cls.enabled:
+			return
+
+		cls.maxOpenFiles = int(settings.get('maxOpenFiles', DEFAULT_MAX_OPEN_FILES))
+		cls.flushInterval = float(settings.get('flushInterval', DEFAULT_FLUSH_INTERVAL))
+		cls.durability = str(settings.get('durability', DEFAULT_DURABILITY))
+		assert cls.maxOpenFiles > 0, "logfileWriter.maxOpenFiles must be greater than 0"
+		assert cls.flushInterval > 0, "logfileWriter.flushInterval must be greater than 0"
+		assert cls.durability in DURABILITY_MODES, f"logfileWriter.durability must be one of {DURABILITY_MODES}"
+
+		if hasattr(os, 'register_at_fork'): # Not available on Windows
+			os.register_at_fork(before=cls.flushAll, after_in_child=cls._resetAfterFork)
+		atexit.register(cls.closeAll)
+
+		logging.info(f'Logfile writer enabled (max open files: {cls.maxOpenFiles}, durability: {cls.durability})')
+
+
+	@classmethod
+	def write(cls, logPath: str, message: str) -> int:
+		"""Append the message to the logfile, reusing an already open handle."""
+		with cls._lock:
+			cls._checkProcess()
+
+			f = cls._open(logPath)
+			written = f.write(message)
+			cls._files[logPath] = (f, time.monotonic())
+
+			if cls.durability != DURABILITY_BUFFERED:
+				f.flush()
+			if cls.durability == DURABILITY_FSYNC:
+				os.fsync(f.fileno())
+
+			return written
+
+
+	@classmethod
+	def flush(cls, logPath: str):
+		"""Flush the buffered events of a single logfile, e.g. on phase change."""
+		with cls._lock:
+			entry = cls._files.get(logPath, None)
+			if entry is not None and cls._pid == os.getpid():
+				entry[0].flush()
+
+
+	@classmethod
+	def flushAll(cls):
+		with cls._lock:
+			if cls._pid != os.getpid():
+				return
+
+			for path, (f, _) in list(cls._files.items()):
+				try:
+					f.flush()
+				except Exception as e:
+					logging.error(f'Unable to flush logfile "{path}": {e}')
+
+
+	@classmethod
+	def closeAll(cls):
+		with cls._lock:
+			if cls._pid != os.getpid():
+				cls._dropInheritedFiles()
+				return
+
+			for path in list(cls._files.keys()):
+				cls._close(path)
+
+
+	@classmethod
+	def openFiles(cls) -> int:
+		"""The number of logfiles that are currently open in this process."""
+		return len(cls._files)
+
+
+	@classmethod
+	def threaded_task(cls):
+		while True:
+			time.sleep(cls.flushInterval)
+
+			with cls._lock:
+				if cls._pid != os.getpid():
+					return # This thread was started by the parent process
+
+				cls.flushAll()
+
+				# Close the logfiles of players that are gone
+				staleTime = time.monotonic() - gameConfig.STALE_LOGFILE_TIME
+				for path, (_, lastWrite) in list(cls._files.items()):
+					if lastWrite < staleTime:
+						cls._close(path)
+
+
+	@classmethod
+	def _open(cls, logPath: str) -> IO[str]:
+		entry = cls._files.get(logPath, None)
+		if entry is not None:
+			cls._files.move_to_end(logPath)
+			return entry[0]
+
+		# Close the least recently used file
+		while len(cls._files) >= cls.maxOpenFiles:
+			cls._close(next(iter(cls._files)))
+
+		f = open(logPath, 'ta', encoding=LOG_ENCODING)
+		cls._files[logPath] = (f, time.monotonic())
+		return f
+
+
+	@classmethod
+	def _close(cls, logPath: str):
+		f, _ = cls._files.pop(logPath)
+		try:
+			f.close()
+		except Exception as e:
+			logging.error(f'Unable to close logfile "{logPath}": {e}')
+
+
+	@classmethod
+	def _checkProcess(cls):
+		"""Start the flush thread on the first write of this process."""
+		if cls._pid == os.getpid():
+			return
+
+		# The fork hooks are not run if the process was forked outside of Python
+		cls._dropInheritedFiles()
+		cls._pid = os.getpid()
+
+		thread = threading.Thread(target=cls.threaded_task, name="LogfileWriter")
+		thread.daemon = True
+		thread.start()
+
+
+	@classmethod
+	def _resetAfterFork(cls):
+		cls._lock = threading.RLock()
+		cls._dropInheritedFiles()
+		cls._pid = -1
+
+
+	@classmethod
+	def _dropInheritedFiles(cls):
+		"""Close the handles inherited from the parent without writing their buffers.
+
+		The buffers belong to the parent process, therefore the file descriptors are
+		redirected to /dev/null before the handles are closed.
+		"""
+		for path, (f, _) in cls._files.items():
+			try:
+				devNull = os.open(os.devnull, os.O_WRONLY)
+				os.dup2(devNull, f.fileno())
+				os.close(devNull)
+				f.close()
+			except Exception as e:
+				logging.error(f'Unable to drop inherited logfile "{path}": {e}')
+
+		cls._files = OrderedDict()
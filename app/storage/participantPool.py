@@ -0,0 +1,234 @@
+import logging
+import os
+import threading
+from typing import Any, Optional
+
+from flask import Flask
+from flask.ctx import AppContext
+from sqlalchemy import func, select, update
+
+import app.config as gameConfig
+from app.model.LogEvents import ContextCache, PlayerContext
+from app.model.Participant import Participant
+from app.storage.database import db
+from app.storage.ParticipantLogger import ParticipantLogger, PseudonymCollision
+from app.utilsGame import EventType, now
+
+import app.storage.participantsDict as participantsDict
+
+
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_PARTICIPANT_POOL = 'participantPool'
+DEFAULT_SIZE = 32 # Number of unclaimed participants kept per group
+DEFAULT_BATCH_SIZE = 8 # Max number of participants created per transaction
+DEFAULT_REFILL_INTERVAL = 5.0 # [s] Check the pool at least this often
+
+
+class ParticipantPool:
+	"""Opt-in pool of participants that are provisioned before the players arrive.
+
+	When a lecturer asks the whole audience to open the link at once, every `/pre_survey`
+	request generates a pseudonym, checks it against the database and creates the player
+	context, the participant and the logfile while holding the database write lock. If
+	enabled, a background thread keeps `size` unclaimed participants per group ready, with
+	their database rows and an empty logfile. `/pre_survey` claims one with a single
+	`UPDATE ... RETURNING` statement and only writes the logfile header, the group
+	assignment and the redirect, all with the time the player actually arrived. The
+	logfile is written after the claim was committed, since a rolled back claim returns
+	the participant to the pool.
+
+	The pool is refilled in transactions of at most `batchSize` participants, so that the
+	provisioner never holds the write lock for long. Every worker runs its own provisioner,
+	but the pool size is counted in the same transaction that creates the participants,
+	therefore the pool never grows beyond `size`.
+
+	NOTE: Unclaimed participants stay in the database (with `pooled` set) and are reused
+	after a restart, as long as the group and its logging setting did not change.
+	"""
+
+	enabled = False
+	size = DEFAULT_SIZE
+	batchSize = DEFAULT_BATCH_SIZE
+	refillInterval = DEFAULT_REFILL_INTERVAL
+	groups: list[str] = []
+
+	# Statistics for the Prometheus metrics, see `ServerMetrics.threaded_task()`
+	available: int = 0 # Unclaimed participants after the last refill
+
+	_wakeup = threading.Event()
+	_refillLock = threading.Lock()
+	_appContext: Optional[AppContext] = None
+	_warnedEmpty: set[str] = set() # Groups whose pool ran empty since it was last full
+
+
+	@classmethod
+	def init(cls, app: Flask):
+		"""Read the settings from the gameConfig, the provisioner is started by `start()`."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_PARTICIPANT_POOL, {})
+		cls.enabled = bool(settings.get('enabled', False))
+		if not cls.enabled:
+			return
+
+		cls.size = int(settings.get('size', DEFAULT_SIZE))
+		cls.batchSize = int(settings.get('batchSize', DEFAULT_BATCH_SIZE))
+		cls.refillInterval = float(settings.get('refillInterval', DEFAULT_REFILL_INTERVAL))
+		groups = settings.get('groups', None)
+		cls.groups = [str(g).casefold() for g in (groups if groups is not None else gameConfig.groups().keys())]
+		assert cls.size > 0, "participantPool.size must be greater than 0"
+		assert cls.batchSize > 0, "participantPool.batchSize must be greater than 0"
+		assert cls.refillInterval > 0, "participantPool.refillInterval must be greater than 0"
+		for group in cls.groups:
+			assert group in gameConfig.groups(), f'participantPool.groups: The group "{group}" is unknown'
+
+		cls._appContext = app.app_context()
+
+
+	@classmethod
+	def start(cls):
+		"""Start the provisioner, if enabled.
+
+		Must not be called in `createApp()`, since the provisioner depends on the database,
+		which is not yet upgraded when running e.g. `flask db upgrade`, see `post_flask_init()`.
+		"""
+		if not cls.enabled:
+			return
+
+		thread = threading.Thread(target=cls.threaded_task, name="ParticipantPool")
+		thread.daemon = True
+		thread.start()
+
+		logging.info(f'Participant pool enabled (size: {cls.size}, groups: {", ".join(cls.groups)})')
+
+
+	@classmethod
+	def claim(cls, group: str, isDebug: bool) -> Optional[Participant]:
+		"""Take an unclaimed participant of this group out of the pool.
+
+		Returns the participant, or `None` if the pool is disabled or empty. Must be called
+		inside of the request transaction, the claim is rolled back with the request. The
+		caller has to assign the group and call `claimed()` after the commit, see `/pre_survey`.
+		"""
+		if not cls.enabled or isDebug or group not in cls.groups:
+			return None
+
+		loggingEnabled = gameConfig.isLoggingEnabled(group)
+		candidate = (select(Participant.pseudonym)
+			.where(Participant.pooled, Participant.group == group, Participant.loggingEnabled == loggingEnabled)
+			.limit(1)
+			.scalar_subquery()
+		)
+		stmt = (update(Participant)
+			.where(Participant.pseudonym == candidate, Participant.pooled)
+			.values(pooled=False)
+			.returning(Participant)
+			.execution_options(synchronize_session=False)
+		)
+		participant = db.session.scalars(stmt).one_or_none()
+
+		# Refill the pool in the background
+		cls._wakeup.set()
+
+		if participant is None:
+			if group not in cls._warnedEmpty:
+				logging.warning(f'The participant pool of group "{group}" is empty, increase participantPool.size!')
+				cls._warnedEmpty.add(group)
+			return None
+
+		return participant
+
+
+	@staticmethod
+	def claimed(participant: Participant, redirectLink: str):
+		"""Cache the player and write the logfile, after the claim was committed.
+
+		Writes the logfile header, the group assignment and the redirect to the reserved
+		logfile, like `/pre_survey` does for a participant that was not pooled.
+		"""
+		ContextCache.addPlayer(participant.pseudonym, participant.loggingEnabled)
+		if not participant.loggingEnabled:
+			return
+
+		assert participant.group is not None
+		ParticipantLogger.createLogfile(participant.pseudonym, create=False)
+		participant.logger.writeToLog(EventType.GroupAssignment, '§Group: ' + participant.group, now())
+		participant.logger.writeToLog(EventType.Redirect, '§Destination: ' + redirectLink, now())
+
+
+	@classmethod
+	def threaded_task(cls):
+		# Fill the pool right away and then whenever a participant was claimed
+		while True:
+			try:
+				cls.refill()
+			except Exception as e:
+				logging.exception(f'Failed to refill the participant pool: "{e}"')
+
+			cls._wakeup.wait(timeout=cls.refillInterval)
+			cls._wakeup.clear()
+
+
+	@classmethod
+	def refill(cls):
+		"""Create participants until the pool of every group is full."""
+		assert cls._appContext is not None, "The participant pool was never initialized"
+
+		with cls._refillLock, cls._appContext:
+			available = 0
+			for group in cls.groups:
+				while True:
+					created, poolSize = cls.provision(group)
+					if created == 0:
+						available += poolSize
+						break
+
+				# Warn again, the next time this pool runs empty
+				if poolSize >= cls.size:
+					cls._warnedEmpty.discard(group)
+
+			cls.available = available
+
+
+	@classmethod
+	def provision(cls, group: str) -> tuple[int, int]:
+		"""Create up to `batchSize` participants for the pool of this group in one transaction.
+
+		Returns the number of created participants and the new pool size.
+		"""
+		loggingEnabled = gameConfig.isLoggingEnabled(group)
+		logPaths: list[str] = []
+		created = 0
+
+		try:
+			stmt = (select(func.count())
+				.select_from(Participant)
+				.where(Participant.pooled, Participant.group == group, Participant.loggingEnabled == loggingEnabled)
+			)
+			poolSize: int = db.session.execute(stmt).scalar_one()
+
+			for _ in range(min(cls.size - poolSize, cls.batchSize)):
+				pseudonym = participantsDict.generatePseudonym('participantPool')
+				if db.session.get(Participant, pseudonym) is not None:
+					continue
+
+				if loggingEnabled:
+					try:
+						logPaths.append(ParticipantLogger.reserveLogfile(pseudonym))
+					except PseudonymCollision as e:
+						logging.warning(f'Participant pool: {e}')
+						continue
+
+				PlayerContext.createPlayer(pseudonym, loggingEnabled)
+				db.session.add(Participant(pseudonym, group, isDebug=False, pooled=True))
+				created += 1
+
+			db.session.commit()
+
+		except Exception:
+			db.session.rollback()
+
+			# Do not leave logfiles behind, that have no participant in the database
+			for path in logPaths:
+				os.remove(path)
+			raise
+
+		return created, poolSize + created
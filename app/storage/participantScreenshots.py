@@ -1,12 +1,73 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import errno
+import hashlib
+import logging
 from math import isnan
 import os
-from typing import Optional
+import tempfile
+import threading
+from typing import IO, Any, Iterator, Optional
 
+import app.config as gameConfig
+from app.storage.ioExecutor import IOExecutor
+from app.storage.screenshotArchive import ScreenshotArchive
 from app.utilsGame import safe_join
 
+# Every PNG file starts with this signature
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+MAX_SCREENSHOT_SIZE = 2 * 1024 * 1024 # [bytes] Same as the Flask MAX_CONTENT_LENGTH
+CHUNK_SIZE = 64 * 1024 # [bytes]
+
+# Screenshots are written to a hidden temporary file first, which is ignored by the statistics
+TEMP_PREFIX = '.tmp_'
+
+# Max number of folders whose next free picture number is cached (per process)
+MAX_CACHED_FOLDERS = 4096
+
+# Config key inside the gameConfig.json
+CONFIG_KEY_SCREENSHOT_STORE = 'screenshotStore'
+
+# Folder of the content addressed store, relative to the screenshot folder
+OBJECTS_FOLDER = '.objects'
+
+# Store every screenshot in its own file or append them to one archive per participant
+MODE_FILES = 'files'
+MODE_ARCHIVE = 'archive'
+STORAGE_MODES = [MODE_FILES, MODE_ARCHIVE]
+
+
+class InvalidScreenshot(ValueError):
+	"""The uploaded file is not a PNG image or exceeds the size limit."""
+	pass
+
+
 class ScreenshotWriter:
 	screenshotFolder = "instance/statistics/canvasPics"
 
+	mode = MODE_FILES
+
+	# Store every distinct image once and hard link the numbered screenshots to it
+	deduplicate = False
+
+	# Next free picture number per screenshot folder, seeded by a single scan of the folder
+	_nextIndex: 'OrderedDict[str, int]' = OrderedDict()
+	_lock = threading.Lock()
+
+
+	@classmethod
+	def init(cls):
+		"""Read the settings from the gameConfig."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_SCREENSHOT_STORE, {})
+		cls.mode = str(settings.get('mode', MODE_FILES))
+		cls.deduplicate = bool(settings.get('deduplicate', False))
+		assert cls.mode in STORAGE_MODES, f"screenshotStore.mode must be one of {STORAGE_MODES}"
+
+		if cls.mode == MODE_ARCHIVE:
+			logging.info('Screenshots are appended to one archive per participant')
+		elif cls.deduplicate:
+			logging.info('Screenshot deduplication enabled')
+
 	@classmethod
 	def getPath(cls, pseudonym: str, phaseName: str, levelName: Optional[str], phaseIdx: int) -> str:
 		"""Generate the screenshot path for the specified player, phase and level combination.
@@ -33,20 +94,162 @@ class ScreenshotWriter:
 		"""Write an image file to `screenshotFolder`. All necessary subfolders will be created.
 		
 		Will automatically increment the picNmbr if a file with that name already exists.
+		The file is written by the `IOExecutor`, if enabled. Raises an `OSError` only if the
+		file is written on the request thread. A failed background write is logged and the
+		picNmbr is skipped, since it was already committed.
 		"""
 		assert not isnan(picNmbr) and picNmbr >= 0, "Assertion Failed: Invalid pic number"
+
+		def onError(e: Exception):
+			logging.error(f'Screenshot {picNmbr} was not written to "{screenshotFolder}": {e}')
+
+		IOExecutor.submit(screenshotFolder, cls._writeScreenshot, screenshotFolder, picNmbr, imgData, onError=onError)
+
+
+	@classmethod
+	def writeScreenshotStream(cls, screenshotFolder: str, picNmbr: int, stream: IO[bytes]):
+		"""Copy a PNG image from the request body to `screenshotFolder` in chunks.
 		
-		os.makedirs(screenshotFolder, exist_ok=True) # Passing a path that is too long might be undefined behavior
-		imagePath: Optional[str] = None
+		Only the PNG signature and the size are validated. The file is written on the request
+		thread, since the request body can't be read after the request has ended. Raises
+		`InvalidScreenshot` if the validation fails, a partially written file is removed.
+		"""
+		assert not isnan(picNmbr) and picNmbr >= 0, "Assertion Failed: Invalid pic number"
 
-		for i in range(0, 99):
-			imagePath = safe_join(screenshotFolder, str(picNmbr + i) + '.png')
+		chunk = stream.read(CHUNK_SIZE)
+		if not chunk.startswith(PNG_SIGNATURE):
+			raise InvalidScreenshot("The upload is not a PNG image")
 
-			# If filename already exists, continue to increment
-			if os.path.exists(imagePath):
-				continue
-			
-			# At this point we are sure there is no file with that name, so we can write our image
-			with open(imagePath, 'xb') as f:
-				f.write(imgData)
+		size = 0
+		with cls._createFile(screenshotFolder, picNmbr) as f:
+			while len(chunk) > 0:
+				size += len(chunk)
+				if size > MAX_SCREENSHOT_SIZE:
+					raise InvalidScreenshot(f"The upload exceeds {MAX_SCREENSHOT_SIZE} bytes")
+
+				f.write(chunk)
+				chunk = stream.read(CHUNK_SIZE)
+
+
+	@classmethod
+	def _writeScreenshot(cls, screenshotFolder: str, picNmbr: int, imgData: bytes):
+		with cls._createFile(screenshotFolder, picNmbr) as f:
+			f.write(imgData)
+
+
+	@classmethod
+	@contextmanager
+	def _createFile(cls, screenshotFolder: str, picNmbr: int) -> Iterator['_ScreenshotFile']:
+		"""Write the next free image file `<picNmbr>.png` in the folder.
+
+		The image is written to a hidden temporary file, which is linked to its final name once
+		it is complete. Therefore a screenshot is either missing or complete, but never partial.
+		In the `archive` mode, the image is buffered and appended to the participant archive.
+		"""
+		if cls.mode == MODE_ARCHIVE:
+			with tempfile.SpooledTemporaryFile(max_size=MAX_SCREENSHOT_SIZE) as f:
+				yield _ScreenshotFile(f)
+				ScreenshotArchive.append(cls.screenshotFolder, screenshotFolder, picNmbr, f)
 			return
+
+		cls._seedFolder(screenshotFolder)
+		fd, tmpPath = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=screenshotFolder)
+
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				screenshot = _ScreenshotFile(f)
+				yield screenshot
+
+			source = tmpPath
+			if cls.deduplicate:
+				source = cls._storeObject(tmpPath, screenshot.hash.hexdigest())
+
+			cls._publish(screenshotFolder, picNmbr, source, fallback=tmpPath)
+
+		finally:
+			os.remove(tmpPath)
+
+
+	@classmethod
+	def _publish(cls, screenshotFolder: str, picNmbr: int, source: str, fallback: str):
+		"""Link the image file to the next free number, that is not less than `picNmbr`.
+		
+		If the source can't be linked anymore (too many links), the `fallback` is linked instead.
+		"""
+		for _ in range(0, 99):
+			with cls._lock:
+				index = max(picNmbr, cls._nextIndex.get(screenshotFolder, 0))
+				cls._nextIndex[screenshotFolder] = index + 1
+
+			# Unlike a rename, the link fails if another worker already created this file
+			try:
+				os.link(source, safe_join(screenshotFolder, str(index) + '.png'))
+				return
+			except FileExistsError:
+				continue
+			except OSError as e:
+				if e.errno != errno.EMLINK or source == fallback:
+					raise
+
+				# Roll back the number, it is still free
+				with cls._lock:
+					cls._nextIndex[screenshotFolder] = index
+				source = fallback
+
+		raise FileExistsError(f'No free screenshot number in "{screenshotFolder}"')
+
+
+	@classmethod
+	def _storeObject(cls, tmpPath: str, digest: str) -> str:
+		"""Add the image to the content addressed store, if it is not already in there.
+
+		Returns the path of the stored image or `tmpPath`, if the store is not usable.
+		"""
+		objectPath = os.path.join(cls.screenshotFolder, OBJECTS_FOLDER, digest[:2], digest + '.png')
+
+		try:
+			os.makedirs(os.path.dirname(objectPath), exist_ok=True)
+			os.link(tmpPath, objectPath)
+		except FileExistsError:
+			pass # The same image was stored before
+		except OSError as e:
+			logging.warning(f'Unable to deduplicate the screenshot "{digest}": {e}')
+			return tmpPath
+
+		return objectPath
+
+
+	@classmethod
+	def _seedFolder(cls, screenshotFolder: str):
+		"""Create the folder and scan it for the highest picture number, once per folder."""
+		with cls._lock:
+			if screenshotFolder in cls._nextIndex:
+				cls._nextIndex.move_to_end(screenshotFolder)
+				return
+
+		os.makedirs(screenshotFolder, exist_ok=True) # Passing a path that is too long might be undefined behavior
+
+		nextIndex = 0
+		with os.scandir(screenshotFolder) as it:
+			for entry in it:
+				name, ext = os.path.splitext(entry.name)
+				if ext == '.png' and name.isdigit():
+					nextIndex = max(nextIndex, int(name) + 1)
+
+		with cls._lock:
+			cls._nextIndex[screenshotFolder] = max(nextIndex, cls._nextIndex.get(screenshotFolder, 0))
+			while len(cls._nextIndex) > MAX_CACHED_FOLDERS:
+				cls._nextIndex.popitem(last=False)
+
+
+class _ScreenshotFile:
+	"""The temporary screenshot file, the content is hashed while it is written."""
+
+	def __init__(self, file: IO[bytes]):
+		self.file = file
+		self.hash = hashlib.sha256()
+
+
+	def write(self, data: bytes) -> int:
+		self.hash.update(data)
+		return self.file.write(data)
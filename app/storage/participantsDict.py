@@ -1,22 +1,94 @@
 import hashlib
 import logging
+import re
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from typing import Any
 
+from sqlalchemy import select
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import joinedload
 
 import app.config as gameConfig
 from app.model.GroupStats import GroupStats
 from app.model.Participant import Participant
 from app.storage.database import db
+from app.storage.presenceTable import PresenceTable
 from app.model.LogEvents import GameOverEvent
 from app.utilsGame import EventType, now
 
 
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_PARTICIPANT_LOADER = 'participantLoader'
+DEFAULT_EAGER_LOAD = True
+
+# Load the tutorial status and the active phase with all levels and switch states when the
+# participant is requested, instead of lazy loading every relationship on first access
+eagerLoad = DEFAULT_EAGER_LOAD
+
+# Pseudonyms are always generated as a hex string by `generatePseudonym()`
+PSEUDONYM_PATTERN = re.compile(f'[0-9a-fA-F]{{{gameConfig.PSEUDONYM_LENGTH}}}')
+
+# Pseudonyms that were not found in the database and when they were looked up
+_unknownPseudonyms: 'OrderedDict[str, float]' = OrderedDict()
+_unknownLock = threading.Lock()
+
+
+def init():
+	"""Read the participant loader settings from the gameConfig."""
+	global eagerLoad
+	settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_PARTICIPANT_LOADER, {})
+	eagerLoad = bool(settings.get('eagerLoad', DEFAULT_EAGER_LOAD))
+
+
+def validatePseudonym(unsafeText: Any) -> str:
+	"""Return the pseudonym send by the client, or an empty string if it is malformed.
+
+	Replaces `sanitizeString()` for pseudonyms, a valid pseudonym needs no escaping.
+	"""
+	if isinstance(unsafeText, str) and PSEUDONYM_PATTERN.fullmatch(unsafeText):
+		return unsafeText
+	return ''
+
+
+def isKnownUnknown(pseudonym: str) -> bool:
+	"""True, if the pseudonym is malformed or was recently looked up without success."""
+	if not PSEUDONYM_PATTERN.fullmatch(pseudonym):
+		return True
+
+	with _unknownLock:
+		lookupTime = _unknownPseudonyms.get(pseudonym, None)
+		if lookupTime is None:
+			return False
+
+		if time.monotonic() - lookupTime < gameConfig.UNKNOWN_PSEUDONYM_CACHE_TIME:
+			return True
+
+		del _unknownPseudonyms[pseudonym]
+		return False
+
+
+def rememberUnknown(pseudonym: str):
+	with _unknownLock:
+		_unknownPseudonyms[pseudonym] = time.monotonic()
+		_unknownPseudonyms.move_to_end(pseudonym)
+		while len(_unknownPseudonyms) > gameConfig.UNKNOWN_PSEUDONYM_CACHE_SIZE:
+			_unknownPseudonyms.popitem(last=False)
+
+
 def insertParticipant(participant: Participant):
-	"""Store the participant in the participantsDict. Assumes a Flask App context is active!"""
+	"""Store the participant in the participantsDict. Assumes a Flask App context is active!
+	
+	The participant is only flushed, the route has to commit at the end of the request.
+	"""
 	db.session.add(participant)
-	db.session.commit()
+	db.session.flush()
+
+	with _unknownLock:
+		_unknownPseudonyms.pop(participant.pseudonym, None)
 
 
 def existsInMemory(pseudonym: str) -> bool:
@@ -27,8 +99,19 @@ def existsInMemory(pseudonym: str) -> bool:
 
 def exists(pseudonym: str) -> bool:
 	"""Check if an entry for this participant exists.	
+	
+	Malformed and recently unknown pseudonyms are rejected without a database query.
 	"""
-	return db.session.get(Participant, pseudonym) is not None
+	if isKnownUnknown(pseudonym):
+		return False
+
+	participant = db.session.get(Participant, pseudonym)
+	if participant is None:
+		rememberUnknown(pseudonym)
+		return False
+
+	# Participants from the pool are unknown until they are claimed, see `ParticipantPool`
+	return not participant.pooled
 
 
 def get(pseudonym: str) -> Participant:
@@ -38,9 +121,25 @@ def get(pseudonym: str) -> Participant:
 
 	Raises a ValueError, if the participant does not exist. Also see the participantsDict.exist()
 	"""
+	if isKnownUnknown(pseudonym):
+		raise ValueError("No participant with pseudonym/ui \"" + pseudonym + "\"found.")
+
 	try:
-		return db.session.get_one(Participant, pseudonym)
+		if not eagerLoad:
+			return db.session.get_one(Participant, pseudonym)
+
+		# Load the participant with the tutorial status and the active phase graph in a fixed
+		# number of queries, instead of a lazy load for every relationship
+		stmt = (select(Participant)
+			.where(Participant.pseudonym == pseudonym)
+			.options(joinedload(Participant.tutorialStatus))
+		)
+		participant = db.session.execute(stmt).unique().scalar_one()
+		participant.loadActivePhase()
+		return participant
+
 	except NoResultFound:
+		rememberUnknown(pseudonym)
 		raise ValueError("No participant with pseudonym/ui \"" + pseudonym + "\"found.")
 
 
@@ -56,8 +155,8 @@ def increaseGroupCounter(participant: Participant, timeStamp: str) -> None:
 	group = participant.group
 
 	if not participant.startedPostsurvey and participant.isLastPhase():
-		GroupStats.increasePlayersPostSurvey(group, participant.isDebug)
-		logging.info(f'PostSurvey incremented {group}: {GroupStats.getPlayerCountPostSurvey(group)}')
+		playersPostSurvey = GroupStats.increasePlayersPostSurvey(group, participant.isDebug)
+		logging.info(f'PostSurvey incremented {group}: {playersPostSurvey}')
 	
 	participant.logger.writeToLog(EventType.GameOver, '', timeStamp)
 
@@ -83,6 +182,11 @@ def getConnectedPlayers() -> int:
 	# All lastConnection timestamps greater than this are considered connected
 	lastConsideredOnline = now() - gameConfig.BACK_ONLINE_THRESHOLD_S*1000 # [ms]
 
+	# The lastConnection in the database is only updated periodically, if the heartbeats
+	# are recorded in the presence table
+	if PresenceTable.enabled:
+		return PresenceTable.countConnected(lastConsideredOnline)
+
 	playersConnected = (db.session.query(Participant)
 		.filter(Participant.lastConnection > lastConsideredOnline)
 		.count()
@@ -0,0 +1,208 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Optional
+
+from flask import Flask
+
+import app.config as gameConfig
+from app.utilsGame import safe_join
+
+try:
+	import fcntl
+except ImportError: # Windows
+	fcntl = None
+
+
+# Config key inside the gameConfig.json and the default values for all settings
+CONFIG_KEY_PRESENCE = 'presenceTable'
+DEFAULT_FILE = 'statistics/presence.bin' # relative to the instance folder
+DEFAULT_CAPACITY = 4096 # Max number of players tracked at the same time
+DEFAULT_PERSIST_INTERVAL = 60 # [s] Write the lastConnection to the database at least this often
+
+# A slot can be reused by another player, if it received no heartbeat for this long
+SLOT_STALE_TIME = 2 * 60 * 60 * 1000 # [ms]
+
+# File layout: header (magic, capacity) followed by `capacity` slots of
+# (pseudonym, last heartbeat [ms], last time the heartbeat was written to the database [ms])
+MAGIC = b'RSPRES01'
+HEADER = struct.Struct('<8sQ')
+SLOT = struct.Struct(f'<{gameConfig.PSEUDONYM_LENGTH}sqq')
+OFFSET_HEARTBEAT = gameConfig.PSEUDONYM_LENGTH
+EMPTY_KEY = bytes(gameConfig.PSEUDONYM_LENGTH)
+
+
+class PresenceTable:
+	"""Opt-in shared memory table for the `/testConnection` heartbeats.
+
+	Every connected client sends a heartbeat once per second. Instead of updating the
+	`lastConnection` column of the participant with a write transaction each time, the
+	heartbeat is recorded in a memory mapped file that is shared by all uWSGI workers.
+	The database is only touched when the player reconnects after an interruption (to log
+	the `ReconnectEvent`) or when the stored `lastConnection` is older than
+	`persistInterval` seconds.
+
+	The table is an open addressing hash table with linear probing, keyed by the
+	pseudonym. Slots are never emptied, but a slot whose last heartbeat is older than
+	`SLOT_STALE_TIME` can be taken over by another player. Inserts are serialized with a
+	file lock, heartbeats of known players are written without any lock.
+
+	NOTE: On platforms without `fcntl` (Windows), the table is not shared between processes,
+	which is fine for the single process Flask debug server.
+	"""
+
+	enabled = False
+	capacity = DEFAULT_CAPACITY
+	persistInterval = DEFAULT_PERSIST_INTERVAL
+
+	_file: Any = None
+	_map: Optional[mmap.mmap] = None
+	_lock = threading.Lock()
+	_warnedFull = False
+
+
+	@classmethod
+	def init(cls, app: Flask):
+		"""Read the settings from the gameConfig and map the presence file, if enabled."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_PRESENCE, {})
+		cls.enabled = bool(settings.get('enabled', False))
+		if not cls.enabled:
+			return
+
+		cls.capacity = int(settings.get('capacity', DEFAULT_CAPACITY))
+		cls.persistInterval = int(settings.get('persistInterval', DEFAULT_PERSIST_INTERVAL))
+		assert cls.capacity > 0, "presenceTable.capacity must be greater than 0"
+		assert cls.persistInterval >= 0, "presenceTable.persistInterval must not be negative"
+
+		path = safe_join(app.instance_path, settings.get('file', DEFAULT_FILE))
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		size = HEADER.size + cls.capacity*SLOT.size
+
+		cls._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b')
+		with cls._fileLock():
+			# (Re)create the table, if the file is new or the capacity was changed
+			cls._file.seek(0)
+			header = cls._file.read(HEADER.size)
+			if len(header) != HEADER.size or HEADER.unpack(header) != (MAGIC, cls.capacity):
+				cls._file.truncate(0)
+				cls._file.truncate(size)
+				cls._file.seek(0)
+				cls._file.write(HEADER.pack(MAGIC, cls.capacity))
+				cls._file.flush()
+
+		cls._map = mmap.mmap(cls._file.fileno(), size)
+		logging.info(f'Presence table enabled (capacity: {cls.capacity}, persist interval: {cls.persistInterval}s)')
+
+
+	@classmethod
+	def heartbeat(cls, pseudonym: str, serverTime: int) -> Optional[tuple[int, int]]:
+		"""Record a heartbeat for a player that is already in the table.
+
+		Returns the previous heartbeat and the time it was last written to the database,
+		or `None` if the player is not in the table (use `insert()` in this case).
+		"""
+		slot = cls._find(pseudonym.encode())
+		if slot is None:
+			return None
+
+		assert cls._map is not None
+		_, lastHeartbeat, lastPersisted = SLOT.unpack_from(cls._map, slot)
+		struct.pack_into('<q', cls._map, slot + OFFSET_HEARTBEAT, serverTime)
+		return lastHeartbeat, lastPersisted
+
+
+	@classmethod
+	def insert(cls, pseudonym: str, serverTime: int) -> bool:
+		"""Add a player to the table, after the pseudonym was validated against the database.
+
+		The heartbeat is marked as persisted. Returns `False` if the table is full.
+		"""
+		assert cls._map is not None
+		key = pseudonym.encode()
+		assert len(key) == gameConfig.PSEUDONYM_LENGTH, "Invalid pseudonym length"
+
+		with cls._lock, cls._fileLock():
+			slot = cls._find(key, forInsert=serverTime)
+			if slot is None:
+				if not cls._warnedFull:
+					logging.warning("The presence table is full, increase presenceTable.capacity!")
+					cls._warnedFull = True
+				return False
+
+			SLOT.pack_into(cls._map, slot, key, serverTime, serverTime)
+			return True
+
+
+	@classmethod
+	def markPersisted(cls, pseudonym: str, serverTime: int):
+		"""Remember that the heartbeat was written to the database."""
+		slot = cls._find(pseudonym.encode())
+		if slot is not None:
+			assert cls._map is not None
+			struct.pack_into('<q', cls._map, slot + OFFSET_HEARTBEAT + 8, serverTime)
+
+
+	@classmethod
+	def remove(cls, pseudonym: str):
+		"""Mark the slot as stale, e.g. when the participant does not exist anymore."""
+		slot = cls._find(pseudonym.encode())
+		if slot is not None:
+			assert cls._map is not None
+			struct.pack_into('<qq', cls._map, slot + OFFSET_HEARTBEAT, 0, 0)
+
+
+	@classmethod
+	def countConnected(cls, since: int) -> int:
+		"""Count all players with a heartbeat newer than `since` [ms]."""
+		assert cls._map is not None
+		return sum(1 for _, lastHeartbeat, _ in SLOT.iter_unpack(cls._map[HEADER.size:]) if lastHeartbeat > since)
+
+
+	@classmethod
+	def _find(cls, key: bytes, forInsert: Optional[int] = None) -> Optional[int]:
+		"""Return the byte offset of the slot for this key.
+
+		If `forInsert` is set to the current time, the offset of the key or of the first
+		free/stale slot in the probe sequence is returned instead. `None` if no slot was found.
+		"""
+		assert cls._map is not None
+		start = zlib.crc32(key) % cls.capacity
+		free = None
+
+		for i in range(cls.capacity):
+			slot = HEADER.size + ((start + i) % cls.capacity)*SLOT.size
+			slotKey, lastHeartbeat, _ = SLOT.unpack_from(cls._map, slot)
+
+			if slotKey == key:
+				return slot
+
+			if slotKey == EMPTY_KEY:
+				return (free if free is not None else slot) if forInsert is not None else None
+
+			if forInsert is not None and free is None and forInsert - lastHeartbeat > SLOT_STALE_TIME:
+				free = slot
+
+		return free
+
+
+	@classmethod
+	def _fileLock(cls):
+		return _FileLock(cls._file)
+
+
+class _FileLock:
+	"""Exclusive lock on the presence file, to serialize inserts across all workers."""
+
+	def __init__(self, file: Any):
+		self.file = file
+
+	def __enter__(self):
+		if fcntl is not None:
+			fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+	def __exit__(self, *args: Any):
+		if fcntl is not None:
+			fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
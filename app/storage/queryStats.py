@@ -0,0 +1,145 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from flask import Flask, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import app.config as gameConfig
+from app.prometheusMetrics import ServerMetrics
+
+
+# Config key inside the gameConfig.json. Requests/JSON-RPC methods exceeding one of the
+# thresholds are logged, a threshold of `None` disables the log message
+CONFIG_KEY_QUERY_STATS = 'queryStats'
+
+
+class QueryCounter:
+	"""The number of SQL statements, commits and the time spent in the database."""
+
+	def __init__(self, name: str):
+		self.name = name
+		self.queries = 0
+		self.commits = 0
+		self.duration = 0.0 # [s]
+		self.statements: dict[str, int] = {}
+
+
+	def __str__(self) -> str:
+		return f'{self.name}: {self.queries} queries, {self.commits} commits, {self.duration*1000:.1f} ms'
+
+
+# All counters of the current request, the request counter is followed by the counter of
+# the JSON-RPC method that is currently executed
+_activeCounters: ContextVar[tuple[QueryCounter, ...]] = ContextVar('activeCounters', default=())
+
+
+class QueryStats:
+	"""Count the SQL statements, commits and the database time per request and per JSON-RPC
+	method and expose them as Prometheus histograms.
+
+	Counting the statements per request makes N+1 query patterns visible, e.g. a lazy load
+	of `Level.switchStates` inside of a loop. If a request or method exceeds the configured
+	thresholds, the counters and the most frequent statements are logged.
+	"""
+
+	thresholdQueries: Optional[int] = None
+	thresholdTime: Optional[float] = None # [s]
+
+
+	@classmethod
+	def init(cls, app: Flask):
+		"""Read the settings from the gameConfig and register the database and request hooks."""
+		settings: dict[str, Any] = gameConfig.config(CONFIG_KEY_QUERY_STATS, {})
+		thresholdQueries = settings.get('logThresholdQueries', None)
+		thresholdTime = settings.get('logThresholdTime', None)
+		cls.thresholdQueries = int(thresholdQueries) if thresholdQueries is not None else None
+		cls.thresholdTime = float(thresholdTime) if thresholdTime is not None else None
+
+		event.listen(Engine, "before_cursor_execute", cls.beforeExecute)
+		event.listen(Engine, "after_cursor_execute", cls.afterExecute)
+		event.listen(Engine, "commit", cls.onCommit)
+
+		app.before_request(cls.beforeRequest)
+		app.teardown_request(cls.teardownRequest)
+
+
+	@staticmethod
+	def beforeExecute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool):
+		context._reversimQueryStart = time.perf_counter()
+
+
+	@staticmethod
+	def afterExecute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool):
+		duration = time.perf_counter() - getattr(context, '_reversimQueryStart', time.perf_counter())
+		for counter in _activeCounters.get():
+			counter.queries += 1
+			counter.duration += duration
+			counter.statements[statement] = counter.statements.get(statement, 0) + 1
+
+
+	@staticmethod
+	def onCommit(conn: Any):
+		for counter in _activeCounters.get():
+			counter.commits += 1
+
+
+	@staticmethod
+	def beforeRequest():
+		_activeCounters.set((QueryCounter(str(request.endpoint)),))
+
+
+	@classmethod
+	def teardownRequest(cls, exception: Optional[BaseException] = None):
+		counters = _activeCounters.get()
+		_activeCounters.set(())
+		if len(counters) < 1:
+			return
+
+		counter = counters[0]
+		cls.observe(counter, ServerMetrics.met_requestQueries, ServerMetrics.met_requestCommits, ServerMetrics.met_requestDatabaseTime)
+		cls.logThreshold(counter, 'Request')
+
+
+	@classmethod
+	@contextmanager
+	def measure(cls, method: str) -> Iterator[QueryCounter]:
+		"""Count the database usage of a single JSON-RPC method (in addition to the request)."""
+		counter = QueryCounter(method)
+		token = _activeCounters.set(_activeCounters.get() + (counter,))
+		try:
+			yield counter
+		finally:
+			_activeCounters.reset(token)
+			cls.observe(counter, ServerMetrics.met_rpcQueries, ServerMetrics.met_rpcCommits, ServerMetrics.met_rpcDatabaseTime)
+			cls.logThreshold(counter, 'JSON-RPC method')
+
+
+	@staticmethod
+	def observe(counter: QueryCounter, queries: Any, commits: Any, duration: Any):
+		"""Record the counters in the Prometheus histograms (if Prometheus is enabled)"""
+		try:
+			if queries is None or commits is None or duration is None:
+				return
+
+			queries.labels(counter.name).observe(counter.queries)
+			commits.labels(counter.name).observe(counter.commits)
+			duration.labels(counter.name).observe(counter.duration)
+		except Exception as e:
+			logging.error('Unable to update the query metrics: ' + str(e))
+
+
+	@classmethod
+	def logThreshold(cls, counter: QueryCounter, kind: str):
+		"""Log the counter and the most frequent statements, if a threshold was exceeded."""
+		if not (
+			(cls.thresholdQueries is not None and counter.queries > cls.thresholdQueries) or
+			(cls.thresholdTime is not None and counter.duration > cls.thresholdTime)
+		):
+			return
+
+		mostFrequent = sorted(counter.statements.items(), key=lambda s: s[1], reverse=True)[:3]
+		logging.warning(f'{kind} {counter} ' + ''.join(f'\n  {n}x {s}' for s, n in mostFrequent))
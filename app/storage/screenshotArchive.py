@@ -0,0 +1,86 @@
+import os
+import tarfile
+import threading
+import time
+from typing import IO, Iterator, NamedTuple
+
+try:
+	import fcntl
+except ImportError: # Windows
+	fcntl = None
+
+
+# File extensions of the archive and the index, next to the screenshot folder of the participant
+ARCHIVE_EXTENSION = '.tar'
+INDEX_EXTENSION = '.idx'
+INDEX_SEPARATOR = '\t'
+INDEX_ENCODING = 'UTF-8'
+
+
+class ArchiveEntry(NamedTuple):
+	"""A line of the archive index: the screenshot folder relative to the participant folder
+	(`<phaseIdx>_<phaseName>/<levelName>` or `<phaseIdx>_<phaseName>`), the picNmbr and the
+	position of the PNG data inside of the archive [bytes]."""
+	folder: str
+	picNmbr: int
+	offset: int
+	size: int
+
+
+class ScreenshotArchive:
+	"""Append-only tar archive with all screenshots of a participant.
+
+	Instead of one file per screenshot, the images are appended to
+	`canvasPics/<pseudonym>.tar`. The member names are the paths the screenshots would have
+	in the `files` mode, so `tar -xf` restores the usual folder structure. After the image is
+	written, a line with the folder, picNmbr, data offset and size is appended to
+	`canvasPics/<pseudonym>.idx`. The statistics read this index instead of the archive.
+
+	A crash while the image is written leaves an incomplete member at the end of the archive,
+	which is not referenced by the index. The archive has no end-of-archive marker, which
+	`tar` and Python's `tarfile` accept.
+	"""
+
+	_lock = threading.Lock()
+
+
+	@classmethod
+	def append(cls, rootFolder: str, screenshotFolder: str, picNmbr: int, image: IO[bytes]):
+		"""Append the image to the archive of the participant owning `screenshotFolder`."""
+		pseudonym, _, folder = os.path.relpath(screenshotFolder, rootFolder).replace(os.sep, '/').partition('/')
+		assert len(pseudonym) > 0 and not pseudonym.startswith('.'), "The screenshot folder is not inside of the root folder"
+
+		size = image.seek(0, os.SEEK_END)
+		image.seek(0)
+
+		member = tarfile.TarInfo(f'{folder}/{picNmbr}.png' if len(folder) > 0 else f'{picNmbr}.png')
+		member.size = size
+		member.mtime = int(time.time())
+		header = member.tobuf(format=tarfile.GNU_FORMAT)
+		padding = (tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE) % tarfile.BLOCKSIZE
+
+		basePath = os.path.join(rootFolder, pseudonym)
+		with cls._lock, open(basePath + ARCHIVE_EXTENSION, 'ab') as archive:
+			if fcntl is not None:
+				fcntl.flock(archive.fileno(), fcntl.LOCK_EX) # Released on close
+
+			offset = archive.seek(0, os.SEEK_END) + len(header)
+			archive.write(header)
+			while chunk := image.read(tarfile.RECORDSIZE):
+				archive.write(chunk)
+			archive.write(tarfile.NUL * padding)
+			archive.flush()
+
+			# Only reference the image once it is completely written
+			entry = ArchiveEntry(folder if len(folder) > 0 else '.', picNmbr, offset, size)
+			with open(basePath + INDEX_EXTENSION, 'ta', encoding=INDEX_ENCODING, newline='\n') as index:
+				index.write(INDEX_SEPARATOR.join(str(v) for v in entry) + '\n')
+
+
+	@staticmethod
+	def readIndex(indexPath: str) -> Iterator[ArchiveEntry]:
+		"""Read all entries of an archive index."""
+		with open(indexPath, 'tr', encoding=INDEX_ENCODING) as index:
+			for line in index:
+				folder, picNmbr, offset, size = line.rstrip('\n').split(INDEX_SEPARATOR)
+				yield ArchiveEntry(folder, int(picNmbr), int(offset), int(size))
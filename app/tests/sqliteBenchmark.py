@@ -0,0 +1,145 @@
+"""Benchmark the SQLite tuning options from the `database` section of the gameConfig.
+
+For every combination of journal mode and synchronous setting, a fresh instance folder
+is created and multiple worker processes (like the uWSGI workers) replay a typical
+player session against the Flask app: `/pre_survey`, `startGame` and then a mix of
+switch clicks, slide navigation, status requests and `/testConnection` heartbeats.
+
+Usage: `python -m app.tests.sqliteBenchmark --workers 4 --requests 500`
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+INSTANCE_CONF = os.path.abspath("instance/conf")
+BENCHMARK_GROUP = "debugpaper" # The debug prefix skips the pre survey redirect
+
+
+def createInstance(baseFolder: str, options: dict[str, Any]) -> str:
+	"""Create a new instance folder with a gameConfig containing the database options."""
+	instanceFolder = tempfile.mkdtemp(prefix="reversim_bench_", dir=baseFolder)
+	os.makedirs(os.path.join(instanceFolder, "conf"))
+
+	with open(os.path.join(INSTANCE_CONF, "gameConfig.json"), "r", encoding="UTF-8") as f:
+		conf = json.load(f)
+
+	conf["database"] = options
+	with open(os.path.join(instanceFolder, "conf", "gameConfig.json"), "w", encoding="UTF-8") as f:
+		json.dump(conf, f)
+
+	# Share the level list and all assets with the default instance folder
+	for name in ["levelList.json", "assets"]:
+		os.symlink(os.path.join(INSTANCE_CONF, name), os.path.join(instanceFolder, "conf", name))
+
+	return instanceFolder
+
+
+def loadApp(instanceFolder: str):
+	"""Import the game server inside of a worker process. The import will create the app."""
+	os.environ["REVERSIM_INSTANCE"] = instanceFolder
+	logging.disable(logging.WARNING)
+	import gameServer
+	return gameServer.flaskInstance
+
+
+def createDatabase(instanceFolder: str) -> None:
+	"""Create the database upfront, so the workers don't race during the schema creation"""
+	loadApp(instanceFolder)
+
+
+def rpc(client: Any, pseudonym: str, idx: int, session: str, method: str, params: Any = None):
+	timeStamp = int(time.time()*1000)
+	message = {"jsonrpc": "2.0", "method": method, "params": params, "id": idx, "session": session, "time": timeStamp}
+	return client.post("/action", json=message, headers={"ui": pseudonym, "time": str(timeStamp)})
+
+
+def replayWorkload(instanceFolder: str, numRequests: int) -> tuple[list[float], int]:
+	"""Play a single session and return the latency of every request and the number of errors."""
+	app = loadApp(instanceFolder)
+	client = app.test_client()
+
+	redirect = client.get("/pre_survey", query_string={"group": BENCHMARK_GROUP})
+	pseudonym = parse_qs(urlparse(redirect.headers["Location"]).query)["ui"][0]
+	session = "%08x" % random.getrandbits(32)
+
+	latencies: list[float] = []
+	errors = 0
+	idx = 0
+
+	def measure(request: Any):
+		nonlocal errors
+		start = time.perf_counter()
+		response = request()
+		latencies.append(time.perf_counter() - start)
+		if response.status_code != 200 or b'"error"' in response.data:
+			errors += 1
+
+	measure(lambda: rpc(client, pseudonym, 0, session, "startGame"))
+	while len(latencies) < numRequests:
+		idx += 1
+		action = random.choices(["switch", "slide", "status", "heartbeat"], weights=[6, 2, 1, 3])[0]
+
+		if action == "switch":
+			measure(lambda: rpc(client, pseudonym, idx, session, "switch", {"id": random.randint(0, 8), "solved": 0}))
+		elif action == "slide":
+			measure(lambda: rpc(client, pseudonym, idx, session, "slide", ["Description", "batteryDesc", 0]))
+		elif action == "status":
+			measure(lambda: rpc(client, pseudonym, idx, session, "status"))
+		else:
+			idx -= 1 # Heartbeats are not part of the JsonRPC packet order
+			measure(lambda: client.post("/testConnection", data={"pseudonym": pseudonym, "timeStamp": int(time.time()*1000)}))
+
+	return latencies, errors
+
+
+def runCombination(baseFolder: str, options: dict[str, Any], numWorkers: int, numRequests: int):
+	instanceFolder = createInstance(baseFolder, options)
+	ctx = multiprocessing.get_context("spawn")
+
+	with ctx.Pool(1) as pool:
+		pool.apply(createDatabase, (instanceFolder,))
+
+	start = time.perf_counter()
+	with ctx.Pool(numWorkers) as pool:
+		results = pool.starmap(replayWorkload, [(instanceFolder, numRequests)]*numWorkers)
+	duration = time.perf_counter() - start
+
+	latencies = sorted(itertools.chain.from_iterable(r[0] for r in results))
+	errors = sum(r[1] for r in results)
+	p50 = latencies[int(len(latencies)*0.50)] * 1000
+	p99 = latencies[min(len(latencies)-1, int(len(latencies)*0.99))] * 1000
+	return len(latencies)/duration, p50, p99, errors
+
+
+if __name__ == "__main__":
+	logging.basicConfig(level=logging.INFO)
+
+	parser = argparse.ArgumentParser(description="Compare the throughput of different SQLite options")
+	parser.add_argument("--workers", type=int, default=4, help="number of concurrent worker processes")
+	parser.add_argument("--requests", type=int, default=500, help="number of requests per worker")
+	parser.add_argument("--journal", nargs="+", default=["DELETE", "WAL"], help="journal modes to test")
+	parser.add_argument("--synchronous", nargs="+", default=["FULL", "NORMAL"], help="synchronous settings to test")
+	parser.add_argument("--cacheSize", type=int, default=None, help="PRAGMA cache_size for all runs")
+	parser.add_argument("--mmapSize", type=int, default=None, help="PRAGMA mmap_size for all runs")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as baseFolder:
+		print(f'{"journalMode":<12} {"synchronous":<12} {"req/s":>10} {"p50 [ms]":>10} {"p99 [ms]":>10} {"errors":>8}')
+		for journalMode, synchronous in itertools.product(args.journal, args.synchronous):
+			options = {
+				"journalMode": journalMode,
+				"synchronous": synchronous,
+				"cacheSize": args.cacheSize,
+				"mmapSize": args.mmapSize,
+			}
+			throughput, p50, p99, errors = runCombination(baseFolder, options, args.workers, args.requests)
+			print(f'{journalMode:<12} {synchronous:<12} {throughput:>10.1f} {p50:>10.2f} {p99:>10.2f} {errors:>8}', flush=True)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+import itertools
+import os
+import unittest
+
+from app.model.LevelLoader.Circuit import CircuitError, _switchPattern, solveLevel
+from app.model.LevelLoader.LevelFile import LEVEL_SEPARATOR, LevelFile, loadLevelFile, parseLevel
+
+# Unit tests for the level file parser and the circuit solver
+
+LEVEL_LOCATION = "instance/conf/assets/levels"
+LEVEL_FOLDERS = ["elementIntroduction", "differentComplexityLevels"]
+
+# The brute-force solver evaluates the circuit once per switch combination
+MAX_BRUTE_FORCE_SWITCHES = 12
+
+
+def shippedLevels() -> list[str]:
+	paths = []
+	for folder in LEVEL_FOLDERS:
+		folderPath = os.path.join(LEVEL_LOCATION, folder)
+		if not os.path.isdir(folderPath):
+			continue
+
+		for fileName in sorted(os.listdir(folderPath)):
+			path = os.path.join(folderPath, fileName)
+			if os.path.isfile(path) and len(loadLevelFile(path).elements) > 0:
+				paths.append(path)
+
+	return paths
+
+
+def bruteForceMinSwitchClicks(levelFile: LevelFile, initialStates: dict[int, int] = {}) -> int:
+	"""Evaluate the circuit for every switch combination, one gate at a time."""
+	switches = list(levelFile.elementsOfType('Switch'))
+	inputs: dict[int, set[int]] = {}
+	for source, targets in levelFile.connections.items():
+		for target in targets:
+			inputs.setdefault(target, set()).add(source)
+	for gate, source in levelFile.effectiveConnections.items():
+		inputs.setdefault(gate, set()).add(source)
+
+	initial = [initialStates.get(s.id, 1 if s.params[0:1] == ('true',) else 0) for s in switches]
+	best = -1
+
+	for combination in itertools.product([0, 1], repeat=len(switches)):
+		states = {s.id: state for s, state in zip(switches, combination)}
+		values: dict[int, bool] = {}
+
+		def value(id: int) -> bool:
+			if id not in values:
+				element = levelFile.elements[id]
+				ins = [value(i) for i in sorted(inputs.get(id, []))]
+				gate = element.params[1] if element.type == 'CovertGate' else element.type
+
+				if gate == 'VCC':
+					values[id] = True
+				elif gate == 'GND':
+					values[id] = False
+				elif gate == 'Switch':
+					values[id] = ins[0] and states[id] == 1
+				elif gate in ('Inverter', 'inverter'):
+					values[id] = not (ins[0] if element.type == 'Inverter' else value(levelFile.effectiveConnections[id]))
+				elif gate == 'identity':
+					values[id] = value(levelFile.effectiveConnections[id])
+				elif gate in ('AndGate', 'and'):
+					values[id] = all(ins)
+				elif gate in ('OrGate', 'or'):
+					values[id] = any(ins)
+				else:
+					values[id] = ins[0]
+
+			return values[id]
+
+		bulbs = all(value(e.id) for e in levelFile.elementsOfType('LightBulb'))
+		dangerSigns = any(value(e.id) for e in levelFile.elementsOfType('DangerSign'))
+		if bulbs and not dangerSigns:
+			clicks = sum(a != b for a, b in zip(combination, initial))
+			best = clicks if best < 0 else min(best, clicks)
+
+	return best
+
+
+def writeLevel(levelFile: LevelFile) -> list[str]:
+	"""Serialize a parsed level file back into the lines of a level file."""
+	lines = [LEVEL_SEPARATOR.join(['time', str(int(levelFile.time))])]
+	for e in levelFile.elements.values():
+		lines.append(LEVEL_SEPARATOR.join(['element', str(e.id), e.type, str(e.rotation), str(e.x), str(e.y), *e.params]))
+	for source, targets in levelFile.connections.items():
+		lines.append(LEVEL_SEPARATOR.join(map(str, ['connection', source, *targets])))
+	for gate, source in levelFile.effectiveConnections.items():
+		lines.append(LEVEL_SEPARATOR.join(map(str, ['effectiveCovertGateConnection', source, gate])))
+
+	return lines
+
+
+class TestCircuit(unittest.TestCase):
+
+	def test_switchPattern(self):
+		"""Bit k of the pattern of switch i must be set, if switch i is closed in combination k"""
+		for numSwitches in range(0, 6):
+			for i in range(numSwitches):
+				pattern = _switchPattern(i, numSwitches)
+				for k in range(1 << numSwitches):
+					self.assertEqual(bool(pattern & (1 << k)), bool(k & (1 << i)))
+
+				self.assertLess(pattern, 1 << (1 << numSwitches))
+
+
+	def test_minSwitchClicks(self):
+		"""Compare the bit-parallel solver and the Hamming distance with the brute-force solver"""
+		levels = shippedLevels()
+		if len(levels) < 1:
+			self.skipTest(f'No level files found in "{LEVEL_LOCATION}"')
+
+		for path in levels:
+			with self.subTest(level=path):
+				levelFile = loadLevelFile(path)
+				try:
+					solutions = solveLevel(levelFile)
+				except CircuitError:
+					continue
+
+				if len(solutions.switchIDs) > MAX_BRUTE_FORCE_SWITCHES:
+					continue
+
+				self.assertEqual(solutions.minSwitchClicks(), bruteForceMinSwitchClicks(levelFile))
+
+				# Flip every other switch, like the rolled random switches
+				initialStates = {id: 1 - ((solutions.initialStates >> i) & 1) for i, id in enumerate(solutions.switchIDs) if i % 2 == 0}
+				self.assertEqual(solutions.minSwitchClicks(initialStates), bruteForceMinSwitchClicks(levelFile, initialStates))
+
+
+	def test_minSwitchClicksHandmade(self):
+		"""A circuit with a covert inverter, an and gate and a danger sign"""
+		lines = [
+			'element§0§VCC§0§0§0', 'element§1§Switch§0§0§0§true', 'element§2§Switch§0§0§0§false',
+			'element§3§Switch§0§0§0§random', 'element§4§AndGate§0§0§0', 'element§5§CovertGate§0§0§0§and§inverter',
+			'element§6§LightBulb§0§0§0', 'element§7§DangerSign§0§0§0', 'element§8§Splitter§0§0§0',
+			'connection§0§8', 'connection§8§1§2§3', 'connection§1§4', 'connection§2§4§5',
+			'connection§3§5', 'connection§4§6', 'connection§5§7', 'effectiveCovertGateConnection§2§5',
+		]
+		levelFile = parseLevel(lines)
+		solutions = solveLevel(levelFile)
+
+		self.assertEqual(solutions.switchIDs, (1, 2, 3))
+		self.assertEqual(solutions.numSolutions(), 2)
+		self.assertEqual(solutions.minSwitchClicks(), 1)
+		self.assertEqual(solutions.minSwitchClicks({1: 0}), 2)
+		self.assertEqual(solutions.minSwitchClicks({1: 0}), bruteForceMinSwitchClicks(levelFile, {1: 0}))
+
+
+	def test_unsolvable(self):
+		levelFile = parseLevel(['element§0§GND§0§0§0', 'element§1§Switch§0§0§0§false', 'element§2§LightBulb§0§0§0', 'connection§0§1', 'connection§1§2'])
+		self.assertEqual(solveLevel(levelFile).minSwitchClicks(), -1)
+
+
+	def test_loop(self):
+		levelFile = parseLevel(['element§0§AndGate§0§0§0', 'element§1§LightBulb§0§0§0', 'connection§0§0§1'])
+		with self.assertRaises(CircuitError):
+			solveLevel(levelFile)
+
+
+class TestLevelFile(unittest.TestCase):
+
+	def test_roundTrip(self):
+		"""Writing a parsed level file and parsing it again must give the same level"""
+		levels = shippedLevels()
+		if len(levels) < 1:
+			self.skipTest(f'No level files found in "{LEVEL_LOCATION}"')
+
+		for path in levels:
+			with self.subTest(level=path):
+				levelFile = loadLevelFile(path)
+				self.assertEqual(parseLevel(writeLevel(levelFile), levelFile.contentHash), levelFile)
+
+
+	def test_parser(self):
+		lines = [
+			'time§30', '', 'element§1§Switch§0§1.5§2§random', 'element§2§CovertGate§0§0§0§camouflaged§or',
+			'element§3§LightBulb§0§0§0', 'connection§1§2', 'connection§1§3', 'unknownEntry§1',
+		]
+		levelFile = parseLevel(lines)
+
+		self.assertEqual(levelFile.time, 30.0)
+		self.assertEqual(levelFile.elements[1].x, 1)
+		self.assertEqual(levelFile.connections[1], (2, 3))
+		self.assertEqual(levelFile.randomSwitches, (1,))
+		self.assertTrue(levelFile.gateCamouflage)
+		self.assertFalse(levelFile.gateCovert)
+
+
+	def test_malformedLine(self):
+		with self.assertRaises(ValueError):
+			parseLevel(['element§1§Switch§0'])
+
+		with self.assertRaises(ValueError):
+			parseLevel(['connection§a§1'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -20,8 +20,17 @@ from app.prometheusMetrics import ServerMetrics
 from app.storage.ParticipantLogger import ParticipantLogger
 from app.storage.crashReport import openCrashReporterFile
 from app.storage.database import ReverSimDatabase
+from app.storage.databaseWriter import DatabaseWriter
+from app.storage.eventBuffer import EventBuffer
+from app.storage.ioExecutor import IOExecutor
+from app.storage.levelCacheIndex import LevelCacheIndex
+from app.storage.logfileWriter import LogfileWriter
 from app.storage.modelFormatError import ModelFormatError
+from app.storage.participantPool import ParticipantPool
 from app.storage.participantScreenshots import ScreenshotWriter
+from app.storage.presenceTable import PresenceTable
+from app.storage.queryStats import QueryStats
+import app.storage.participantsDict as participantsDict
 from app.utilsGame import safe_join
 
 # Fix mime type on Windows https://github.com/pallets/flask/issues/1045
@@ -79,6 +88,13 @@ def initLegacyLogFile(app: Flask):
 	except Exception:
 		logging.exception(f'Unable to create folder "{ParticipantLogger.baseFolder}"')
 
+	# Keep the logfiles open instead of reopening them for every event, if enabled
+	LogfileWriter.init()
+
+	# Move the logfile, screenshot and crash report I/O off the request thread, if enabled.
+	# NOTE: Must be initialized after the LogfileWriter, so the queue is drained before the files are closed
+	IOExecutor.init()
+
 
 def initScreenshotWriter(app: Flask):
 	"""Init the Screenshot writer, create the necessary folder structure"""
@@ -92,6 +108,9 @@ def initScreenshotWriter(app: Flask):
 	except Exception:
 		logging.exception(f'Unable to create folder "{ScreenshotWriter.screenshotFolder}"')
 
+	# Store identical screenshots only once, if enabled
+	ScreenshotWriter.init()
+
 
 def createMinimalApp():
 	""""""
@@ -137,8 +156,13 @@ def createApp():
 
 	logging.info(f'Instance path: {app.instance_path}')
 
+	# Parse all level files upfront instead of on the first request, if enabled (before any
+	# background thread is started, since the level files might be parsed in a process pool)
+	LevelCacheIndex.init(app)
+
 	# Init the Database
 	ReverSimDatabase.createDatabase(app)
+	participantsDict.init()
 
 	# Generate the default Bearer token for the /metrics endpoint
 	with app.app_context():
@@ -148,6 +172,18 @@ def createApp():
 	initScreenshotWriter(app)
 	initLegacyLogFile(app)
 
+	# Init the optional write-behind buffer for the database events (the buffer is always
+	# enabled, if the events shall be send to the single writer process)
+	DatabaseWriter.init(app)
+	EventBuffer.init(app)
+
+	# Init the optional shared memory table for the /testConnection heartbeats
+	PresenceTable.init(app)
+
+	# Init the optional pool of participants that are provisioned before the players arrive
+	# (the provisioner is started in post_flask_init(), once the database is upgraded)
+	ParticipantPool.init(app)
+
 	# Init Prometheus (must be done before Flask context is created)
 	try:
 		ServerMetrics.createPrometheus(app, auth_provider=auth.login_required) # type: ignore
@@ -155,6 +191,9 @@ def createApp():
 		logging.warning(f'The Prometheus metrics failed to initialize: "{e}"')
 		logging.warning('This can be safely ignored when not in production')
 
+	# Count the SQL statements per request and JSON-RPC method (depends on Prometheus)
+	QueryStats.init(app)
+
 	return app
 
 
@@ -178,11 +217,20 @@ def post_flask_init():
 	# GroupStats depends on database, so upgrades must be done by now
 	with flaskInstance.app_context():
 		GroupStats.createGroupCounters()
+
+	# The participant pool provisioner writes to the database
+	ParticipantPool.start()
 	
 	# Init Crash reporter (depends on Prometheus)
 	createCrashReporter(flaskInstance)
 
 
+@flaskInstance.cli.command('db-writer')
+def runDatabaseWriter():
+	"""Run the single writer process for the log events, see `databaseWriter` in doc/GameConfig.md"""
+	DatabaseWriter.serve(flaskInstance)
+
+
 # set response headers
 @flaskInstance.after_request # type: ignore
 def apply_caching(response: Response) -> Response:
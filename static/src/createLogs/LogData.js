@@ -38,14 +38,17 @@ class LogData
 		// get canvas as image
 		var htmlCollection = document.getElementsByTagName('canvas');
 		var canvas = htmlCollection[0];
-		var imgData = canvas.toDataURL("image/png", 1.0);
+		let timeStamp = Rq.now();
 
-		let data = {
-			canvasImage: imgData,
-			'pseudonym': pseudonym,
-			'timeStamp': Rq.now()
-		};
+		// Capture the canvas synchronously, the screenshot must be sent before the next event, since
+		// the server stores it in the folder of the level/phase the player is in when it arrives.
+		// The binary PNG file is sent, the Base64 encoded form upload is much larger
+		var imgData = atob(canvas.toDataURL("image/png", 1.0).split(',')[1]);
+		var bytes = new Uint8Array(imgData.length);
+		for(let i = 0; i < imgData.length; i++)
+			bytes[i] = imgData.charCodeAt(i);
 
-		Rq.post('/canvasImage', () => {}, data, "application/x-www-form-urlencoded; charset=UTF-8");
+		let params = $.param({'pseudonym': pseudonym, 'timeStamp': timeStamp});
+		Rq.post('/canvasImagePNG?' + params, () => {}, new Blob([bytes], {type: "image/png"}), "image/png");
 	}
 }
\ No newline at end of file
@@ -32,6 +32,7 @@ class Rq
 				type: method,
 				url: url,
 				data: reqData,
+				processData: !(reqData instanceof Blob), // Send binary data as is
 				contentType: requestMimeType,
 				success: function (respData, textStatus, request)
 				{